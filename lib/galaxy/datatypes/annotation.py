@@ -13,6 +13,7 @@ log = logging.getLogger(__name__)
 class SnapHmm(Text):
     file_ext = "snaphmm"
     edam_data = "data_1364"
+    sniff_magic = (b'zoeHMM',)
 
     def set_peek(self, dataset, is_multi_byte=False):
         if not dataset.dataset.purged:
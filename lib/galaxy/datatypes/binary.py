@@ -91,6 +91,7 @@ class Idat(Binary):
     file_ext = "idat"
     edam_format = "format_2058"
     edam_data = "data_2603"
+    sniff_magic = (b'IDAT',)
 
     def sniff(self, filename):
         try:
@@ -665,6 +666,7 @@ class CRAM(Binary):
     file_ext = "cram"
     edam_format = "format_3462"
     edam_data = "format_0863"
+    sniff_magic = (b'CRAM',)
 
     MetadataElement(name="cram_version", default=None, desc="CRAM Version", param=MetadataParameter, readonly=True, visible=False, optional=False, no_value=None)
     MetadataElement(name="cram_index", desc="CRAM Index File", param=metadata.FileParameter, file_ext="crai", readonly=True, no_value=None, visible=False, optional=True)
@@ -1269,6 +1271,7 @@ class Sff(Binary):
     edam_format = "format_3284"
     edam_data = "data_0924"
     file_ext = "sff"
+    sniff_magic = (b'.sff',)
 
     def sniff(self, filename):
         # The first 4 bytes of any sff file is '.sff', and the file is binary. For details
@@ -1391,6 +1394,7 @@ class SQlite(Binary):
     MetadataElement(name="table_row_count", default={}, param=DictParameter, desc="Database Table Row Count", readonly=True, visible=True, no_value={})
     file_ext = "sqlite"
     edam_format = "format_3621"
+    sniff_magic = (b'SQLite format 3\0',)
 
     def init_meta(self, dataset, copy_from=None):
         Binary.init_meta(self, dataset, copy_from=copy_from)
@@ -1930,6 +1934,7 @@ class ExcelXls(Binary):
 class Sra(Binary):
     """ Sequence Read Archive (SRA) datatype originally from mdshw5/sra-tools-galaxy"""
     file_ext = 'sra'
+    sniff_magic = (b'NCBI.sra',)
 
     def sniff(self, filename):
         """ The first 8 bytes of any NCBI sra file is 'NCBI.sra', and the file is binary.
@@ -1978,6 +1983,7 @@ class RData(Binary):
 
 
 class OxliBinary(Binary):
+    sniff_magic = (b'OXLI',)
 
     @staticmethod
     def _sniff(filename, oxlitype):
@@ -2344,6 +2350,7 @@ class NetCDF(Binary):
     file_ext = "netcdf"
     edam_format = "format_3650"
     edam_data = "data_0943"
+    sniff_magic = (b'CDF',)
 
     def set_peek(self, dataset, is_multi_byte=False):
         if not dataset.dataset.purged:
@@ -18,6 +18,10 @@ from markupsafe import escape
 from galaxy import util
 from galaxy.datatypes.metadata import MetadataElement  # import directly to maintain ease of use in Datatype class definitions
 from galaxy.datatypes.sniff import build_sniff_from_prefix
+from galaxy.datatypes.util.line_scan import (
+    DataLineCounter,
+    scan_lines,
+)
 from galaxy.util import (
     compression_utils,
     FILENAME_VALID_CHARS,
@@ -139,6 +143,11 @@ class Data(object):
     # Trackster track type.
     track_type = None
 
+    # Optional tuple of byte strings, files of this type start with one of them.
+    # Sniffing skips this datatype's sniffer for other files without calling it,
+    # so a subclass overriding the sniffer must reset this if it no longer holds.
+    sniff_magic = None
+
     # Data sources.
     data_sources = {}
 
@@ -860,23 +869,15 @@ class Text(Data):
         Count the number of lines of data in dataset,
         skipping all blank lines and comments.
         """
-        CHUNK_SIZE = 2 ** 15  # 32Kb
-        data_lines = 0
-        with compression_utils.get_fileobj(dataset.file_name) as in_file:
-            # FIXME: Potential encoding issue can prevent the ability to iterate over lines
-            # causing set_meta process to fail otherwise OK jobs. A better solution than
-            # a silent try/except is desirable.
-            try:
-                while True:
-                    line = in_file.readline(CHUNK_SIZE)
-                    if not line:
-                        break
-                    line = line.strip()
-                    if line and not line.startswith('#'):
-                        data_lines += 1
-            except Exception:
-                pass
-        return data_lines
+        counter = DataLineCounter()
+        # FIXME: Potential encoding issue can prevent the ability to iterate over lines
+        # causing set_meta process to fail otherwise OK jobs. A better solution than
+        # a silent try/except is desirable.
+        try:
+            scan_lines(dataset.file_name, [counter])
+        except Exception:
+            pass
+        return counter.data_lines
 
     def set_peek(self, dataset, line_count=None, is_multi_byte=False, WIDTH=256, skipchars=None, line_wrap=True):
         """
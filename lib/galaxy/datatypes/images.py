@@ -163,6 +163,7 @@ class Rast(Image):
 class Pdf(Image):
     edam_format = "format_3508"
     file_ext = "pdf"
+    sniff_magic = (b"%PDF",)
 
     def sniff(self, filename):
         """Determine if the file is in pdf format."""
@@ -20,6 +20,7 @@ from galaxy.datatypes.sniff import (
 )
 from galaxy.datatypes.tabular import Tabular
 from galaxy.datatypes.util.gff_util import parse_gff3_attributes, parse_gff_attributes
+from galaxy.datatypes.util.line_scan import LineAccumulator
 from galaxy.util import compression_utils
 from . import (
     data,
@@ -51,6 +52,39 @@ VIEWPORT_READLINE_BUFFER_SIZE = 1048576  # 1MB
 VIEWPORT_MAX_READS_PER_LINE = 10
 
 
+class FirstIntervalLineAccumulator(LineAccumulator):
+    """
+    Find the header line, or else the first line with more than 2 columns,
+    within the first 100 non empty lines. Used to guess interval columns.
+    """
+    num_check_lines = 100  # only check up to this many non empty lines
+
+    def __init__(self, first_line_is_header=False):
+        self.first_line_is_header = first_line_is_header
+        self.header = None
+        self.fields = None
+        self.line_count = 0
+        self.empty_line_count = 0
+
+    def feed(self, line):
+        i = self.line_count
+        self.line_count += 1
+        line = line.rstrip('\r\n')
+        if line:
+            if (self.first_line_is_header or line[0] == '#'):
+                self.header = line.strip('#').split('\t')
+                self.done = True
+            else:
+                elems = line.split('\t')
+                if len(elems) > 2:
+                    self.fields = elems
+                    self.done = True
+                elif (i - self.empty_line_count) > self.num_check_lines:
+                    self.done = True  # we examined 100 non-empty lines
+        else:
+            self.empty_line_count += 1
+
+
 @dataproviders.decorators.has_dataproviders
 @build_sniff_from_prefix
 class Interval(Tabular):
@@ -80,63 +114,50 @@ class Interval(Tabular):
 
     def set_meta(self, dataset, overwrite=True, first_line_is_header=False, **kwd):
         """Tries to guess from the line the location number of the column for the chromosome, region start-end and strand"""
-        Tabular.set_meta(self, dataset, overwrite=overwrite, skip=0)
+        first_line = FirstIntervalLineAccumulator(first_line_is_header=first_line_is_header)
+        Tabular.set_meta(self, dataset, overwrite=overwrite, skip=0, line_accumulators=[first_line])
         if dataset.has_data():
-            empty_line_count = 0
-            num_check_lines = 100  # only check up to this many non empty lines
-            with compression_utils.get_fileobj(dataset.file_name) as in_fh:
-                for i, line in enumerate(in_fh):
-                    line = line.rstrip('\r\n')
-                    if line:
-                        if (first_line_is_header or line[0] == '#'):
-                            self.init_meta(dataset)
-                            line = line.strip('#')
-                            elems = line.split('\t')
-                            for meta_name, header_list in alias_spec.items():
-                                for header_val in header_list:
-                                    if header_val in elems:
-                                        # found highest priority header to meta_name
-                                        setattr(dataset.metadata, meta_name, elems.index(header_val) + 1)
-                                        break  # next meta_name
-                            break  # Our metadata is set, so break out of the outer loop
-                        else:
-                            # Header lines in Interval files are optional. For example, BED is Interval but has no header.
-                            # We'll make a best guess at the location of the metadata columns.
-                            elems = line.split('\t')
-                            if len(elems) > 2:
-                                if overwrite or not dataset.metadata.element_is_set('chromCol'):
-                                    dataset.metadata.chromCol = 1
-                                try:
-                                    int(elems[1])
-                                    if overwrite or not dataset.metadata.element_is_set('startCol'):
-                                        dataset.metadata.startCol = 2
-                                except Exception:
-                                    pass  # Metadata default will be used
-                                try:
-                                    int(elems[2])
-                                    if overwrite or not dataset.metadata.element_is_set('endCol'):
-                                        dataset.metadata.endCol = 3
-                                except Exception:
-                                    pass  # Metadata default will be used
-                                # we no longer want to guess that this column is the 'name', name must now be set manually for interval files
-                                # we will still guess at the strand, as we can make a more educated guess
-                                # if len( elems ) > 3:
-                                #    try:
-                                #        int( elems[3] )
-                                #    except Exception:
-                                #        if overwrite or not dataset.metadata.element_is_set( 'nameCol' ):
-                                #            dataset.metadata.nameCol = 4
-                                if len(elems) < 6 or elems[5] not in data.valid_strand:
-                                    if overwrite or not dataset.metadata.element_is_set('strandCol'):
-                                        dataset.metadata.strandCol = 0
-                                else:
-                                    if overwrite or not dataset.metadata.element_is_set('strandCol'):
-                                        dataset.metadata.strandCol = 6
-                                break
-                            if (i - empty_line_count) > num_check_lines:
-                                break  # Our metadata is set or we examined 100 non-empty lines, so break out of the outer loop
-                    else:
-                        empty_line_count += 1
+            if first_line.header is not None:
+                self.init_meta(dataset)
+                elems = first_line.header
+                for meta_name, header_list in alias_spec.items():
+                    for header_val in header_list:
+                        if header_val in elems:
+                            # found highest priority header to meta_name
+                            setattr(dataset.metadata, meta_name, elems.index(header_val) + 1)
+                            break  # next meta_name
+            elif first_line.fields is not None:
+                # Header lines in Interval files are optional. For example, BED is Interval but has no header.
+                # We'll make a best guess at the location of the metadata columns.
+                elems = first_line.fields
+                if overwrite or not dataset.metadata.element_is_set('chromCol'):
+                    dataset.metadata.chromCol = 1
+                try:
+                    int(elems[1])
+                    if overwrite or not dataset.metadata.element_is_set('startCol'):
+                        dataset.metadata.startCol = 2
+                except Exception:
+                    pass  # Metadata default will be used
+                try:
+                    int(elems[2])
+                    if overwrite or not dataset.metadata.element_is_set('endCol'):
+                        dataset.metadata.endCol = 3
+                except Exception:
+                    pass  # Metadata default will be used
+                # we no longer want to guess that this column is the 'name', name must now be set manually for interval files
+                # we will still guess at the strand, as we can make a more educated guess
+                # if len( elems ) > 3:
+                #    try:
+                #        int( elems[3] )
+                #    except Exception:
+                #        if overwrite or not dataset.metadata.element_is_set( 'nameCol' ):
+                #            dataset.metadata.nameCol = 4
+                if len(elems) < 6 or elems[5] not in data.valid_strand:
+                    if overwrite or not dataset.metadata.element_is_set('strandCol'):
+                        dataset.metadata.strandCol = 0
+                else:
+                    if overwrite or not dataset.metadata.element_is_set('strandCol'):
+                        dataset.metadata.strandCol = 6
 
     def displayable(self, dataset):
         try:
@@ -90,6 +90,7 @@ class Hmmer(Text):
 class Hmmer2(Hmmer):
     edam_format = "format_3328"
     file_ext = "hmm2"
+    sniff_magic = (b'HMMER2.0',)
 
     def sniff_prefix(self, file_prefix):
         """HMMER2 files start with HMMER2.0
@@ -100,6 +101,7 @@ class Hmmer2(Hmmer):
 class Hmmer3(Hmmer):
     edam_format = "format_3329"
     file_ext = "hmm3"
+    sniff_magic = (b'HMMER3/f',)
 
     def sniff_prefix(self, file_prefix):
         """HMMER3 files start with HMMER3/f
@@ -225,6 +227,7 @@ class Stockholm_1_0(Text):
 @build_sniff_from_prefix
 class MauveXmfa(Text):
     file_ext = "xmfa"
+    sniff_magic = (b'#FormatVersion Mauve1',)
 
     MetadataElement(name="number_of_models", default=0, desc="Number of alignmened sequences", readonly=True, visible=True, optional=True, no_value=0)
 
@@ -290,6 +290,24 @@ class Registry(object):
                                     self.upload_file_formats.append(extension)
                                 # Max file size cut off for setting optional metadata.
                                 self.datatypes_by_extension[extension].max_optional_metadata_filesize = elem.get('max_optional_metadata_filesize', None)
+                                # Size from which column types of tabular datasets are guessed from a sample of lines.
+                                column_type_sampling_min_size = elem.get('column_type_sampling_min_size', None)
+                                if column_type_sampling_min_size is not None:
+                                    datatype_instance.column_type_sampling_min_size = int(column_type_sampling_min_size)
+                                # Size from which tabular datasets get a line offset index.
+                                line_offset_index_min_size = elem.get('line_offset_index_min_size', None)
+                                if line_offset_index_min_size is None and hasattr(datatype_instance, 'line_offset_index_min_size'):
+                                    line_offset_index_min_size = getattr(self.config, "tabular_line_offset_index_min_size", 0) or None
+                                    if line_offset_index_min_size is not None:
+                                        # Pass the config option on to metadata setting, which doesn't have a config object.
+                                        line_offset_index_min_size = str(line_offset_index_min_size)
+                                        elem.set('line_offset_index_min_size', line_offset_index_min_size)
+                                if line_offset_index_min_size is not None:
+                                    datatype_instance.line_offset_index_min_size = int(line_offset_index_min_size)
+                                # Classify the columns of tabular datasets with numpy and set column statistics.
+                                vectorized_column_types = elem.get('vectorized_column_types', None)
+                                if vectorized_column_types is not None:
+                                    datatype_instance.vectorized_column_types = galaxy.util.string_as_bool(vectorized_column_types)
                                 for converter in elem.findall('converter'):
                                     # Build the list of datatype converters which will later be loaded into the calling app's toolbox.
                                     converter_config = converter.get('file', None)
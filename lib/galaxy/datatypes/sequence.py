@@ -26,6 +26,10 @@ from galaxy.datatypes.sniff import (
     get_headers,
     iter_headers,
 )
+from galaxy.datatypes.util.line_scan import (
+    scan_lines,
+    SequenceCounter,
+)
 from galaxy.util import (
     compression_utils,
     nice_size
@@ -97,21 +101,10 @@ class Sequence(data.Text):
         """
         Set the number of sequences and the number of data lines in dataset.
         """
-        data_lines = 0
-        sequences = 0
-        with compression_utils.get_fileobj(dataset.file_name) as fh:
-            for line in fh:
-                line = line.strip()
-                if line and line.startswith('#'):
-                    # We don't count comment lines for sequence data types
-                    continue
-                if line and line.startswith('>'):
-                    sequences += 1
-                    data_lines += 1
-                else:
-                    data_lines += 1
-            dataset.metadata.data_lines = data_lines
-            dataset.metadata.sequences = sequences
+        counter = SequenceCounter()
+        scan_lines(dataset.file_name, [counter])
+        dataset.metadata.data_lines = counter.data_lines
+        dataset.metadata.sequences = counter.sequences
 
     def set_peek(self, dataset, is_multi_byte=False):
         if not dataset.dataset.purged:
@@ -12,7 +12,10 @@ import re
 import shutil
 import sys
 import tempfile
+import threading
+import time
 import zipfile
+from collections import defaultdict
 
 from six import (
     PY3,
@@ -155,17 +158,22 @@ def convert_newlines_sep2tabs(fname, in_place=True, patt=br"[^\S\n]+", tmp_dir=N
 def iter_headers(fname_or_file_prefix, sep, count=60, comment_designator=None):
     idx = 0
     if isinstance(fname_or_file_prefix, FilePrefix):
-        file_iterator = fname_or_file_prefix.line_iterator()
+        rows = fname_or_file_prefix.split_line_iterator(sep, comment_designator=comment_designator)
     else:
-        file_iterator = compression_utils.get_fileobj(fname_or_file_prefix)
+        rows = _iter_split_lines(compression_utils.get_fileobj(fname_or_file_prefix), sep, comment_designator)
+    for row in rows:
+        yield row
+        idx += 1
+        if idx == count:
+            break
+
+
+def _iter_split_lines(file_iterator, sep, comment_designator=None):
     for line in file_iterator:
         line = line.rstrip('\n\r')
         if comment_designator is not None and comment_designator != '' and line.startswith(comment_designator):
             continue
         yield line.split(sep)
-        idx += 1
-        if idx == count:
-            break
 
 
 def validate_tabular(fname_or_file_prefix, validate_row, sep, comment_designator=None):
@@ -437,74 +445,157 @@ def guess_ext(fname, sniff_order, is_binary=False):
     >>> guess_ext(fname, sniff_order)  # This test case is ensuring doesn't throw exception, actual value could change if non-utf encoding handling improves.
     'data'
     """
-    file_prefix = FilePrefix(fname)
-    file_ext = run_sniffers_raw(file_prefix, sniff_order, is_binary)
-
-    # Ugly hack for tsv vs tabular sniffing, we want to prefer tabular
-    # to tsv but it doesn't have a sniffer - is TSV was sniffed just check
-    # if it is an okay tabular and use that instead.
-    if file_ext == 'tsv':
+    with FilePrefix(fname) as file_prefix:
+        file_ext = run_sniffers_raw(file_prefix, sniff_order, is_binary)
+
+        # Ugly hack for tsv vs tabular sniffing, we want to prefer tabular
+        # to tsv but it doesn't have a sniffer - is TSV was sniffed just check
+        # if it is an okay tabular and use that instead.
+        if file_ext == 'tsv':
+            if is_column_based(file_prefix, '\t', 1):
+                file_ext = 'tabular'
+        if file_ext is not None:
+            return file_ext
+
+        # skip header check if data is already known to be binary
+        if is_binary:
+            return file_ext or 'binary'
+        try:
+            get_headers(file_prefix, None)
+        except UnicodeDecodeError:
+            return 'data'  # default data type file extension
         if is_column_based(file_prefix, '\t', 1):
-            file_ext = 'tabular'
-    if file_ext is not None:
-        return file_ext
-
-    # skip header check if data is already known to be binary
-    if is_binary:
-        return file_ext or 'binary'
-    try:
-        get_headers(file_prefix, None)
-    except UnicodeDecodeError:
-        return 'data'  # default data type file extension
-    if is_column_based(file_prefix, '\t', 1):
-        return 'tabular'  # default tabular data type file extension
-    return 'txt'  # default text data type file extension
+            return 'tabular'  # default tabular data type file extension
+        return 'txt'  # default text data type file extension
 
 
 def run_sniffers_raw(filename_or_file_prefix, sniff_order, is_binary=False):
     """Run through sniffers specified by sniff_order, return None of None match.
+
+    ``sniff_order`` may be a list of datatypes or a :class:`SniffIndex`.
     """
     if isinstance(filename_or_file_prefix, FilePrefix):
-        fname = filename_or_file_prefix.filename
-        file_prefix = filename_or_file_prefix
-    else:
-        fname = filename_or_file_prefix
-        file_prefix = FilePrefix(filename_or_file_prefix)
+        return get_sniff_index(sniff_order).run(filename_or_file_prefix, is_binary=is_binary)
+    with FilePrefix(filename_or_file_prefix) as file_prefix:
+        return get_sniff_index(sniff_order).run(file_prefix, is_binary=is_binary)
 
-    file_ext = None
-    for datatype in sniff_order:
-        """
-        Some classes may not have a sniff function, which is ok.  In fact,
-        Binary, Data, Tabular and Text are examples of classes that should never
-        have a sniff function. Since these classes are default classes, they contain
-        few rules to filter out data of other formats, so they should be called
-        from this function after all other datatypes in sniff_order have not been
-        successfully discovered.
-        """
-        try:
-            if hasattr(datatype, "sniff_prefix"):
-                datatype_compressed = getattr(datatype, "compressed", False)
-                if datatype_compressed and not file_prefix.compressed_format:
+
+_COMPRESSED_FORMAT_MISSING = object()
+
+
+class SniffIndex(object):
+    """Precomputed view of a sniff order used to run its sniffers.
+
+    Datatypes may declare a ``sniff_magic`` tuple of byte strings that any file
+    of that type starts with, sniffers of these datatypes are skipped without
+    being called for files that start with none of them. Candidate sniffers
+    are indexed by the first byte of the file, so the sniff order is only
+    filtered once for each distinct first byte. The total time spent in each
+    sniffer is recorded in ``timings``.
+    """
+
+    def __init__(self, sniff_order):
+        self.sniff_order = sniff_order
+        self.datatypes = tuple(sniff_order)
+        self.sniffers = []
+        for datatype in self.datatypes:
+            uses_prefix = hasattr(datatype, "sniff_prefix")
+            self.sniffers.append((
+                datatype,
+                uses_prefix,
+                bool(getattr(datatype, "compressed", False)),
+                getattr(datatype, "compressed_format", _COMPRESSED_FORMAT_MISSING) if uses_prefix else None,
+                tuple(getattr(datatype, "sniff_magic", None) or ()),
+            ))
+        self.magic_length = max([len(m) for sniffer in self.sniffers for m in sniffer[4]] or [1])
+        self._candidates = {}
+        self._lock = threading.Lock()
+        self.timings = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    def is_current(self, sniff_order):
+        return sniff_order is self.sniff_order and self.datatypes == tuple(sniff_order)
+
+    def candidates(self, file_prefix):
+        """Return the sniffers that may match ``file_prefix``, in sniff order."""
+        compressed = file_prefix.compressed_format is not None
+        key = (file_prefix.bytes_view(1).tobytes(), compressed)
+        candidates = self._candidates.get(key)
+        if candidates is None:
+            candidates = [sniffer for sniffer in self.sniffers if self._may_match(sniffer, key)]
+            with self._lock:
+                self._candidates[key] = candidates
+        return candidates
+
+    def _may_match(self, sniffer, key):
+        first_byte, compressed = key
+        _, uses_prefix, datatype_compressed, _, magic = sniffer
+        if uses_prefix and datatype_compressed != compressed:
+            return False
+        if not magic:
+            return True
+        if compressed and not uses_prefix:
+            # Legacy sniffers read the file itself, not the uncompressed prefix.
+            return True
+        return any(m[:1] == first_byte for m in magic)
+
+    def run(self, file_prefix, is_binary=False):
+        fname = file_prefix.filename
+        # Only the start of the file is read to check magic bytes.
+        header_bytes = file_prefix.bytes_view(self.magic_length).tobytes()
+        compressed_format = file_prefix.compressed_format
+        for datatype, uses_prefix, _, datatype_compressed_format, magic in self.candidates(file_prefix):
+            """
+            Some classes may not have a sniff function, which is ok.  In fact,
+            Binary, Data, Tabular and Text are examples of classes that should never
+            have a sniff function. Since these classes are default classes, they contain
+            few rules to filter out data of other formats, so they should be called
+            from this function after all other datatypes in sniff_order have not been
+            successfully discovered.
+            """
+            if magic and (uses_prefix or not compressed_format):
+                if not header_bytes.startswith(magic):
                     continue
-                if not datatype_compressed and file_prefix.compressed_format:
+            start = time.time()
+            try:
+                if uses_prefix:
+                    if compressed_format and datatype_compressed_format:
+                        # In this case go a step further and compare the compressed format detected
+                        # to the expected. Compressed datatypes without a compressed_format are never
+                        # matched.
+                        if compressed_format != datatype_compressed_format:
+                            continue
+                    if datatype.sniff_prefix(file_prefix):
+                        return datatype.file_ext
+                elif is_binary and not datatype.is_binary:
                     continue
-                if file_prefix.compressed_format and getattr(datatype, "compressed_format"):
-                    # In this case go a step further and compare the compressed format detected
-                    # to the expected.
-                    if file_prefix.compressed_format != datatype.compressed_format:
-                        continue
-                if datatype.sniff_prefix(file_prefix):
-                    file_ext = datatype.file_ext
-                    break
-            elif is_binary and not datatype.is_binary:
-                continue
-            elif datatype.sniff(fname):
-                file_ext = datatype.file_ext
-                break
-        except Exception:
-            pass
+                elif datatype.sniff(fname):
+                    return datatype.file_ext
+            except Exception:
+                pass
+            finally:
+                self.timings[datatype.file_ext] += time.time() - start
+                self.calls[datatype.file_ext] += 1
+        return None
 
-    return file_ext
+
+_sniff_index = None
+
+
+def get_sniff_index(sniff_order):
+    """Return a :class:`SniffIndex` for ``sniff_order``, reusing the last one
+    built if the sniff order has not changed since.
+    """
+    global _sniff_index
+    if isinstance(sniff_order, SniffIndex):
+        return sniff_order
+    if not isinstance(sniff_order, list):
+        # Filtered iterators are built for a single call, don't replace the shared index.
+        return SniffIndex(sniff_order)
+    sniff_index = _sniff_index
+    if sniff_index is None or not sniff_index.is_current(sniff_order):
+        sniff_index = _sniff_index = SniffIndex(sniff_order)
+    return sniff_index
 
 
 def zip_single_fileobj(path):
@@ -515,37 +606,113 @@ def zip_single_fileobj(path):
 
 
 class FilePrefix(object):
+    """Lazily loaded prefix of a (possibly compressed) file, shared by sniffers.
+
+    Nothing is read until a sniffer asks for it. ``bytes_view`` only reads as
+    many bytes as requested, the full ``SNIFF_PREFIX_BYTES`` are read and
+    decoded the first time text or the complete prefix is needed. The file is
+    kept open until the prefix is complete, so later reads continue where the
+    previous one stopped. Lines and split lines are computed once and reused
+    by every sniffer.
+    """
+    # Minimum number of bytes read when only the start of the file is needed.
+    partial_read_bytes = 4096
 
     def __init__(self, filename):
-        non_utf8_error = None
-        compressed_format = None
-        contents_header_bytes = None
-        contents_header = None  # First MAX_BYTES of the file.
-        truncated = False
-        # A future direction to optimize sniffing even more for sniffers at the top of the list
-        # is to lazy load contents_header based on what interface is requested. For instance instead
-        # of returning a StringIO directly in string_io() return an object that reads the contents and
-        # populates contents_header while providing a StringIO-like interface until the file is read
-        # but then would fallback to native string_io()
+        self.filename = filename
+        self._compressed_format = None
+        self._header_bytes = None
+        self._complete = False
+        self._decoded = False
+        self._contents_header = None  # First MAX_BYTES of the file.
+        self._non_utf8_error = None
+        self._lines = None
+        self._split_lines = {}
+        self._file_size = None
+        self._fh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def _read(self, size):
+        size = min(size, SNIFF_PREFIX_BYTES)
+        if self._fh is None:
+            # (Re)start from the beginning of the file
+            self._compressed_format, self._fh = compression_utils.get_fileobj_raw(self.filename, "rb")
+            self._header_bytes = b""
         try:
-            compressed_format, f = compression_utils.get_fileobj_raw(filename, "rb")
+            header_bytes = self._fh.read(size - len(self._header_bytes))
+        except Exception:
+            self.close()
+            raise
+        self._header_bytes += header_bytes
+        self._complete = len(self._header_bytes) >= SNIFF_PREFIX_BYTES or len(self._header_bytes) < size
+        if self._complete:
+            self.close()
+
+    def _read_complete(self):
+        if not self._complete:
+            self._read(SNIFF_PREFIX_BYTES)
+
+    def _decode(self):
+        if not self._decoded:
+            self._read_complete()
             try:
-                contents_header_bytes = f.read(SNIFF_PREFIX_BYTES)
-                truncated = len(contents_header_bytes) == SNIFF_PREFIX_BYTES
-                contents_header = contents_header_bytes.decode("utf-8")
-            finally:
-                f.close()
-        except UnicodeDecodeError as e:
-            non_utf8_error = e
+                self._contents_header = self._header_bytes.decode("utf-8")
+            except UnicodeDecodeError as e:
+                self._non_utf8_error = e
+            self._decoded = True
 
-        self.truncated = truncated
-        self.filename = filename
-        self.non_utf8_error = non_utf8_error
-        self.binary = non_utf8_error is not None  # obviously wrong
-        self.compressed_format = compressed_format
-        self.contents_header = contents_header
-        self.contents_header_bytes = contents_header_bytes
-        self._file_size = None
+    def bytes_view(self, size=None):
+        """Return a memoryview of the first ``size`` bytes of the prefix.
+
+        Only reads the whole prefix if ``size`` is None or exceeds what has
+        been read so far.
+        """
+        if size is None or size >= SNIFF_PREFIX_BYTES:
+            self._read_complete()
+        elif self._header_bytes is None or (not self._complete and len(self._header_bytes) < size):
+            self._read(max(size, self.partial_read_bytes))
+        view = memoryview(self._header_bytes)
+        return view if size is None else view[:size]
+
+    @property
+    def compressed_format(self):
+        if self._header_bytes is None:
+            self.bytes_view(1)
+        return self._compressed_format
+
+    @property
+    def contents_header_bytes(self):
+        self._read_complete()
+        return self._header_bytes
+
+    @property
+    def truncated(self):
+        self._read_complete()
+        return len(self._header_bytes) == SNIFF_PREFIX_BYTES
+
+    @property
+    def contents_header(self):
+        self._decode()
+        return self._contents_header
+
+    @property
+    def non_utf8_error(self):
+        self._decode()
+        return self._non_utf8_error
+
+    @property
+    def binary(self):
+        return self.non_utf8_error is not None  # obviously wrong
 
     @property
     def file_size(self):
@@ -560,17 +727,38 @@ class FilePrefix(object):
         return rval
 
     def startswith(self, prefix):
-        return self.string_io().read(len(prefix)) == prefix
+        if self.non_utf8_error is not None:
+            raise self.non_utf8_error
+        return self.contents_header.startswith(prefix)
+
+    def _get_lines(self):
+        if self._lines is None:
+            lines = self.string_io().readlines()
+            if lines and self.truncated and not lines[-1].endswith(("\n", "\r")):
+                # Drop the last line if it was truncated when reading it in.
+                lines.pop()
+            self._lines = lines
+        return self._lines
 
     def line_iterator(self):
-        s = self.string_io()
-        s_len = len(s.getvalue())
-        for line in s:
-            if line.endswith("\n") or line.endswith("\r"):
-                yield line
-            elif s.tell() == s_len and not self.truncated:
-                # At the end, return the last line if it wasn't truncated when reading it in.
-                yield line
+        for line in self._get_lines():
+            yield line
+
+    def split_line_iterator(self, sep, comment_designator=None):
+        """Iterate over the lines of the prefix, stripped of newlines and split on ``sep``.
+
+        Lines starting with ``comment_designator`` are skipped. Split lines are
+        cached per separator, each one is yielded as a new list so callers may
+        modify it.
+        """
+        rows = self._split_lines.setdefault(sep, {})
+        for i, line in enumerate(self._get_lines()):
+            if comment_designator and line.startswith(comment_designator):
+                continue
+            row = rows.get(i)
+            if row is None:
+                row = rows[i] = tuple(line.rstrip('\n\r').split(sep))
+            yield list(row)
 
     # Convenience wrappers around contents_header, shielding contents_header means we can
     # potentially do a better job lazy loading this data later on.
@@ -585,7 +773,10 @@ def build_sniff_from_prefix(klass):
     # Build and attach a sniff function to this class (klass) from the sniff_prefix function
     # expected to be defined for the class.
     def auto_sniff(self, filename):
-        file_prefix = FilePrefix(filename)
+        with FilePrefix(filename) as file_prefix:
+            return _auto_sniff(self, file_prefix)
+
+    def _auto_sniff(self, file_prefix):
         datatype_compressed = getattr(self, "compressed", False)
         if file_prefix.compressed_format and not datatype_compressed:
             return False
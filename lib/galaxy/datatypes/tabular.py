@@ -8,6 +8,7 @@ import binascii
 import csv
 import logging
 import os
+import random
 import re
 import shutil
 import subprocess
@@ -15,10 +16,14 @@ import sys
 import tempfile
 from json import dumps
 
+import numpy
 import pysam
 from markupsafe import escape
 
-from galaxy import util
+from galaxy import (
+    exceptions,
+    util
+)
 from galaxy.datatypes import binary, data, metadata
 from galaxy.datatypes.metadata import MetadataElement
 from galaxy.datatypes.sniff import (
@@ -27,6 +32,14 @@ from galaxy.datatypes.sniff import (
     iter_headers,
     validate_tabular,
 )
+from galaxy.datatypes.util.generic_util import (
+    read_line_offset,
+    write_line_offset_index,
+)
+from galaxy.datatypes.util.line_scan import (
+    LineAccumulator,
+    scan_lines,
+)
 from galaxy.util import compression_utils
 from . import dataproviders
 
@@ -43,6 +56,14 @@ class TabularData(data.Text):
     # All tabular data is chunkable.
     CHUNKABLE = True
     data_line_offset = 0
+    # Uncompressed datasets at least this large get a sparse index of the
+    # byte offset of every line_offset_index_interval-th line when metadata
+    # is set, so chunks starting at a given line can be served without
+    # reading the file up to that line. Disabled if None, set from the
+    # tabular_line_offset_index_min_size option or per datatype by the
+    # datatypes registry.
+    line_offset_index_min_size = None
+    line_offset_index_interval = 1000
 
     """Add metadata elements"""
     MetadataElement(name="comment_lines", default=0, desc="Number of comment lines", readonly=False, optional=True, no_value=0)
@@ -51,6 +72,10 @@ class TabularData(data.Text):
     MetadataElement(name="column_types", default=[], desc="Column types", param=metadata.ColumnTypesParameter, readonly=True, visible=False, no_value=[])
     MetadataElement(name="column_names", default=[], desc="Column names", readonly=True, visible=False, optional=True, no_value=[])
     MetadataElement(name="delimiter", default='\t', desc="Data delimiter", readonly=True, visible=False, optional=True, no_value=[])
+    MetadataElement(name="line_offset_index", desc="Line offset index", param=metadata.FileParameter, file_ext="lineidx", readonly=True, no_value=None, visible=False, optional=True)
+    MetadataElement(name="column_mins", default=[], desc="Smallest value of numeric columns", param=metadata.ListParameter, readonly=True, visible=False, optional=True, no_value=[])
+    MetadataElement(name="column_maxs", default=[], desc="Largest value of numeric columns", param=metadata.ListParameter, readonly=True, visible=False, optional=True, no_value=[])
+    MetadataElement(name="column_null_counts", default=[], desc="Number of missing values per column", param=metadata.ListParameter, readonly=True, visible=False, optional=True, no_value=[])
 
     @abc.abstractmethod
     def set_meta(self, dataset, **kwd):
@@ -70,23 +95,68 @@ class TabularData(data.Text):
         except Exception:
             return False
 
+    def set_line_offset_index(self, dataset):
+        """
+        Write the line offset index of large uncompressed datasets, see
+        ``line_offset_index_min_size``.
+        """
+        if self.line_offset_index_min_size is None:
+            return
+        if not dataset.has_data() or os.path.getsize(dataset.file_name) < self.line_offset_index_min_size:
+            return
+        compressed_format, fh = compression_utils.get_fileobj_raw(dataset.file_name, 'rb')
+        fh.close()
+        if compressed_format:
+            return
+        index_file = dataset.metadata.line_offset_index
+        if not index_file:
+            index_file = dataset.metadata.spec['line_offset_index'].param.new_file(dataset=dataset)
+        write_line_offset_index(dataset.file_name, index_file.file_name, self.line_offset_index_interval)
+        dataset.metadata.line_offset_index = index_file
+
+    def get_line_offset(self, dataset, line):
+        """
+        Return the offset of the start of line ``line`` (counting from 0 and
+        including comment lines) to be used with ``get_chunk``. The line offset
+        index is used if the dataset has one, otherwise lines are read from the
+        start of the file. Returns the offset of the end of the file if it has
+        fewer lines.
+        """
+        indexed_line, offset = 0, 0
+        index_file = dataset.metadata.line_offset_index
+        if index_file and os.path.exists(index_file.file_name):
+            indexed_line, offset = read_line_offset(index_file.file_name, line)
+        with compression_utils.get_fileobj(dataset.file_name, 'rb') as f:
+            f.seek(offset)
+            for _ in range(line - indexed_line):
+                if not f.readline():
+                    break
+            return f.tell()
+
     def get_chunk(self, trans, dataset, offset=0, ck_size=None):
         with compression_utils.get_fileobj(dataset.file_name) as f:
             f.seek(offset)
             ck_data = f.read(ck_size or trans.app.config.display_chunk_size)
             if ck_data and ck_data[-1] != '\n':
-                cursor = f.read(1)
-                while cursor and cursor != '\n':
-                    ck_data += cursor
-                    cursor = f.read(1)
+                # Finish the last line, leaving out its newline
+                line = f.readline()
+                ck_data += line[:-1] if line.endswith('\n') else line
             last_read = f.tell()
         return dumps({'ck_data': util.unicodify(ck_data),
                       'offset': last_read,
                       'data_line_offset': self.data_line_offset,
                       })
 
-    def display_data(self, trans, dataset, preview=False, filename=None, to_ext=None, offset=None, ck_size=None, **kwd):
+    def display_data(self, trans, dataset, preview=False, filename=None, to_ext=None, offset=None, ck_size=None, line=None, **kwd):
         preview = util.string_as_bool(preview)
+        if offset is None and line is not None:
+            try:
+                line_number = int(line)
+            except (TypeError, ValueError):
+                line_number = -1
+            if line_number < 0:
+                raise exceptions.RequestParameterInvalidException("line must be a non-negative integer: %s" % line)
+            offset = self.get_line_offset(dataset, line_number)
         if offset is not None:
             return self.get_chunk(trans, dataset, offset, ck_size)
         elif to_ext or not preview:
@@ -257,14 +327,392 @@ class TabularData(data.Text):
         return dataproviders.dataset.DatasetDictDataProvider(dataset, deliminator=delimiter, **settings)
 
 
+COLUMN_TYPE_SET_ORDER = ['int', 'float', 'list', 'str']  # Order to set column types in
+DEFAULT_COLUMN_TYPE = COLUMN_TYPE_SET_ORDER[-1]  # Default column type is lowest in list
+
+
+def _is_int(column_text):
+    try:
+        int(column_text)
+        return True
+    except ValueError:
+        return False
+
+
+def _is_float(column_text):
+    try:
+        float(column_text)
+        return True
+    except ValueError:
+        if column_text.strip().lower() == 'na':
+            return True  # na is special cased to be a float
+        return False
+
+
+def _is_list(column_text):
+    return "," in column_text
+
+
+def _is_str(column_text):
+    # anything, except an empty string, is True
+    if column_text == "":
+        return False
+    return True
+
+
+IS_COLUMN_TYPE = {
+    'int': _is_int,
+    'float': _is_float,
+    'list': _is_list,
+    'str': _is_str,
+}
+
+
+def guess_column_type(column_text):
+    for column_type in COLUMN_TYPE_SET_ORDER:
+        if IS_COLUMN_TYPE[column_type](column_text):
+            return column_type
+    return None
+
+
+def type_overrules_type(column_type1, column_type2):
+    if column_type1 is None or column_type1 == column_type2:
+        return False
+    if column_type2 is None:
+        return True
+    for column_type in reversed(COLUMN_TYPE_SET_ORDER):
+        if column_type1 == column_type:
+            return True
+        if column_type2 == column_type:
+            return False
+    # neither column type was found in our ordered list, this cannot happen
+    raise ValueError("Tried to compare unknown column types: %s and %s" % (column_type1, column_type2))
+
+
+def guess_column_values_type(values):
+    """
+    Guess the type of a column from the numpy array of its non empty
+    ``values`` at once, giving the same result as combining the
+    ``guess_column_type`` of each value with ``type_overrules_type``.
+    Returns the column type, the numeric values of int and float columns
+    without the missing values and the number of missing ('na' or 'nan')
+    values.
+
+    >>> guess_column_values_type(numpy.array(['1', '-2', '3']))
+    ('int', array([ 1, -2,  3]), 0)
+    >>> guess_column_values_type(numpy.array(['1', '2.5', 'NA', 'nan']))
+    ('float', array([1. , 2.5]), 2)
+    >>> guess_column_values_type(numpy.array(['1,2', '3']))
+    ('list', None, 0)
+    >>> guess_column_values_type(numpy.array(['1,2', 'a']))
+    ('str', None, 0)
+    """
+    if not len(values):
+        return None, None, 0
+    try:
+        return 'int', values.astype(numpy.int64), 0
+    except OverflowError:
+        # Integers that don't fit 64 bits, guess value by value
+        column_type = None
+        for value in values:
+            value_type = guess_column_type(value)
+            if type_overrules_type(value_type, column_type):
+                column_type = value_type
+        return column_type, None, 0
+    except ValueError:
+        pass
+    try:
+        numbers = values.astype(numpy.float64)
+    except ValueError:
+        pass
+    else:
+        nan = numpy.isnan(numbers)
+        return 'float', numbers[~nan], int(nan.sum())
+    # String operations are done by numpy value by value, so only look at distinct values
+    values, counts = numpy.unique(values, return_counts=True)
+    missing = numpy.char.lower(numpy.char.strip(values)) == 'na'
+    missing_count = int(counts[missing].sum())
+    try:
+        numbers = numpy.repeat(values[~missing].astype(numpy.float64), counts[~missing])
+    except ValueError:
+        pass
+    else:
+        nan = numpy.isnan(numbers)
+        return 'float', numbers[~nan], missing_count + int(nan.sum())
+    try:
+        # Values with a comma are lists, the column is a list column if all others are numbers
+        values[~missing & (numpy.char.find(values, ',') < 0)].astype(numpy.float64)
+    except ValueError:
+        return 'str', None, missing_count
+    return 'list', None, missing_count
+
+
+class ColumnTypesAccumulator(LineAccumulator):
+    """
+    Count the data and comment lines of a tabular dataset and guess its
+    column types, see ``Tabular.set_meta``. If ``vectorized`` is set, data
+    lines are collected into blocks of ``block_lines`` lines whose columns
+    are classified with numpy, which also computes the smallest and largest
+    value of numeric columns and the number of missing values of each column.
+    """
+
+    def __init__(self, skip=None, max_data_lines=None, max_guess_type_data_lines=None, get_column_names=None, vectorized=False, block_lines=10000):
+        # Store original skip value to check with later
+        self.requested_skip = skip
+        self.skip = skip or 0
+        self.max_data_lines = max_data_lines
+        self.max_guess_type_data_lines = max_guess_type_data_lines
+        self.get_column_names = get_column_names
+        self.line_count = 0
+        self.data_lines = 0
+        self.comment_lines = 0
+        self.column_names = None
+        self.column_types = []
+        self.first_line_column_types = [DEFAULT_COLUMN_TYPE]  # default value is one column of type str
+        # Set if lines follow the first max_data_lines data lines.
+        self.truncated = False
+        self.vectorized = vectorized
+        self.block_lines = block_lines
+        self.block = []
+        # Number of data lines classified in blocks
+        self.block_rows = 0
+        self.column_mins = []
+        self.column_maxs = []
+        self.column_null_counts = []
+
+    def feed(self, line):
+        if self.max_data_lines is not None and self.data_lines >= self.max_data_lines:
+            self.truncated = True
+            self.done = True
+            return
+        line = line.rstrip('\r\n')
+        if self.line_count == 0 and self.get_column_names is not None:
+            self.column_names = self.get_column_names(first_line=line)
+        if self.line_count < self.skip or not line or line.startswith('#'):
+            # We'll call blank lines comments
+            self.comment_lines += 1
+        else:
+            self.data_lines += 1
+            if self.max_guess_type_data_lines is None or self.data_lines <= self.max_guess_type_data_lines:
+                if self.vectorized and (self.line_count or self.requested_skip is not None):
+                    self.block.append(line)
+                    if len(self.block) >= self.block_lines:
+                        self.flush()
+                else:
+                    self.guess_fields(line.split('\t'))
+            if self.line_count == 0 and self.requested_skip is None:
+                # This is our first line, people seem to like to upload files that have a header line, but do not
+                # start with '#' (i.e. all column types would then most likely be detected as str).  We will assume
+                # that the first line is always a header (this was previous behavior - it was always skipped).  When
+                # the requested skip is None, we only use the data from the first line if we have no other data for
+                # a column.  This is far from perfect, as
+                # 1,2,3	1.1	2.2	qwerty
+                # 0	0		1,2,3
+                # will be detected as
+                # "column_types": ["int", "int", "float", "list"]
+                # instead of
+                # "column_types": ["list", "float", "float", "str"]  *** would seem to be the 'Truth' by manual
+                # observation that the first line should be included as data.  The old method would have detected as
+                # "column_types": ["int", "int", "str", "list"]
+                self.first_line_column_types = self.column_types
+                self.column_types = [None for col in self.first_line_column_types]
+        self.line_count += 1
+
+    def guess_sampled_lines(self, lines):
+        """Guess column types from lines sampled from the rest of the dataset."""
+        for line in lines:
+            line = line.rstrip('\r\n')
+            if line and not line.startswith('#'):
+                if self.vectorized:
+                    self.block.append(line)
+                else:
+                    self.guess_fields(line.split('\t'))
+        self.flush()
+
+    def flush(self):
+        """Classify the collected block of data lines."""
+        if self.block:
+            self.guess_block(self.block)
+            self.block = []
+
+    def guess_block(self, lines):
+        """
+        Guess column types from a block of data lines at once with numpy and
+        update the column statistics.
+        """
+        rows = [line.split('\t') for line in lines]
+        width = max(len(row) for row in rows)
+        column_types = self.column_types
+        while len(column_types) < width:
+            column_types.append(None)
+        while len(self.column_null_counts) < width:
+            # Lines of previous blocks didn't have this column
+            self.column_null_counts.append(self.block_rows)
+            self.column_mins.append(None)
+            self.column_maxs.append(None)
+        for i in range(width, len(self.column_null_counts)):
+            self.column_null_counts[i] += len(rows)
+        rows = [row if len(row) == width else row + [''] * (width - len(row)) for row in rows]
+        for i, column in enumerate(zip(*rows)):
+            values = numpy.array(column)
+            values = values[values != '']
+            column_type, numbers, missing = guess_column_values_type(values)
+            if type_overrules_type(column_type, column_types[i]):
+                column_types[i] = column_type
+            self.column_null_counts[i] += len(rows) - len(values) + missing
+            if numbers is not None:
+                # Infinite values can't be stored as JSON metadata
+                numbers = numbers[numpy.isfinite(numbers)]
+            if numbers is not None and len(numbers):
+                smallest, largest = numbers.min().item(), numbers.max().item()
+                if self.column_mins[i] is None or smallest < self.column_mins[i]:
+                    self.column_mins[i] = smallest
+                if self.column_maxs[i] is None or largest > self.column_maxs[i]:
+                    self.column_maxs[i] = largest
+        self.block_rows += len(rows)
+
+    def guess_fields(self, fields):
+        column_types = self.column_types
+        for field_count, field in enumerate(fields):
+            if field_count >= len(column_types):  # found a previously unknown column, we append None
+                column_types.append(None)
+            column_type = guess_column_type(field)
+            if type_overrules_type(column_type, column_types[field_count]):
+                column_types[field_count] = column_type
+
+    def get_column_types(self):
+        self.flush()
+        column_types = list(self.column_types)
+        first_line_column_types = self.first_line_column_types
+        # we error on the larger number of columns
+        # first we pad our column_types by using data from first line
+        if len(first_line_column_types) > len(column_types):
+            for column_type in first_line_column_types[len(column_types):]:
+                column_types.append(column_type)
+        # Now we fill any unknown (None) column_types with data from first line
+        for i in range(len(column_types)):
+            if column_types[i] is None:
+                if len(first_line_column_types) <= i or first_line_column_types[i] is None:
+                    column_types[i] = DEFAULT_COLUMN_TYPE
+                else:
+                    column_types[i] = first_line_column_types[i]
+        return column_types
+
+    def get_column_stats(self, column_types):
+        """
+        Return the smallest and largest values (None unless the column is
+        numeric) and the missing value counts of the ``column_types`` columns
+        from the vectorized classification.
+        """
+        self.flush()
+        mins, maxs, null_counts = [], [], []
+        for i, column_type in enumerate(column_types):
+            numeric = column_type in ('int', 'float')
+            known = i < len(self.column_null_counts)
+            mins.append(self.column_mins[i] if numeric and known else None)
+            maxs.append(self.column_maxs[i] if numeric and known else None)
+            null_counts.append(self.column_null_counts[i] if known else self.block_rows)
+        return mins, maxs, null_counts
+
+
+# Line endings as read in universal newlines mode, like scan_lines does
+NEWLINE_RE = re.compile(b'\r\n|\r(?!\n)|\n')
+# Lines including their line ending
+LINE_RE = re.compile(b'[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+')
+# Line endings followed by a comment or blank line
+COMMENT_LINE_RE = re.compile(b'(?:\r\n|\r(?!\n)|\n)(?=[#\r\n])')
+
+
+def _sampled_lines(sample):
+    """
+    Split ``sample``, a byte string of lines, into decoded lines.
+    """
+    return [line.decode('utf-8', 'replace') for line in NEWLINE_RE.split(sample)]
+
+
+def _count_and_sample_lines(fh, sample_blocks, sample_size, rng, block_size=2 ** 20):
+    """
+    Count the lines and the comment or blank lines from the current position
+    of ``fh`` (which must be the start of a line) to the end of the file, only
+    looking for line endings. Returns these counts and a reservoir sample of
+    ``sample_blocks`` byte strings of complete lines of at most about
+    ``sample_size`` bytes taken from blocks of the file.
+    """
+    lines = 0
+    comment_lines = 0
+    samples = []
+    block_count = 0
+    rest = b''
+    while True:
+        data = fh.read(block_size)
+        block = rest + data
+        if data:
+            # Leave the last, possibly partial line (or \r\n) for the next
+            # block, so that every block starts at the start of a line.
+            last_line = max(block.rfind(b'\n'), block.rfind(b'\r', 0, -1)) + 1
+            block, rest = block[:last_line], block[last_line:]
+            if not block:
+                continue
+        elif not block:
+            break
+        lines += len(NEWLINE_RE.findall(block)) + (0 if block.endswith((b'\n', b'\r')) else 1)
+        comment_lines += len(COMMENT_LINE_RE.findall(block)) + block.startswith((b'#', b'\r', b'\n'))
+        sample = block[:sample_size]
+        sample = sample[:max(sample.rfind(b'\n'), sample.rfind(b'\r')) + 1] or block
+        if block_count < sample_blocks:
+            samples.append(sample)
+        else:
+            i = rng.randint(0, block_count)
+            if i < sample_blocks:
+                samples[i] = sample
+        block_count += 1
+        if not data:
+            break
+    return lines, comment_lines, samples
+
+
+def _seek_sample_lines(fh, start, end, sample_blocks, sample_size, rng):
+    """
+    Return ``sample_blocks`` byte strings of complete lines of at most
+    ``sample_size`` bytes read from random offsets between ``start`` and
+    ``end`` of ``fh``, each starting at the start of a line.
+    """
+    samples = []
+    for offset in sorted(rng.randint(start, end - 1) for _ in range(sample_blocks)):
+        fh.seek(offset)
+        sample = fh.read(sample_size)
+        # Skip the partial line
+        first_line = NEWLINE_RE.search(sample)
+        first_line = first_line.end() if first_line else len(sample)
+        samples.append(sample[first_line:max(sample.rfind(b'\n'), sample.rfind(b'\r')) + 1])
+    return samples
+
+
 @dataproviders.decorators.has_dataproviders
 class Tabular(TabularData):
     """Tab delimited data"""
+    # If set, column types of uncompressed datasets at least this large are
+    # guessed from their first column_type_sample_head_lines lines and a
+    # sample of column_type_sample_blocks blocks of column_type_sample_block_size
+    # bytes from the rest of the file. When all lines have to be counted, the
+    # rest of the file is only searched for line endings. Values of a more
+    # general type outside of the sample (e.g. a single 'NA' in an int column)
+    # are missed, so this is off by default and can be enabled for a datatype
+    # with the column_type_sampling_min_size attribute in datatypes_conf.xml.
+    column_type_sampling_min_size = None
+    column_type_sample_head_lines = 10000
+    column_type_sample_blocks = 64
+    column_type_sample_block_size = 64 * 1024
+    # Classify the columns of blocks of lines with numpy instead of field by
+    # field and set the column_mins, column_maxs and column_null_counts
+    # metadata. Can be set for a datatype with the vectorized_column_types
+    # attribute in datatypes_conf.xml.
+    vectorized_column_types = False
 
     def get_column_names(self, first_line=None):
         return None
 
-    def set_meta(self, dataset, overwrite=True, skip=None, max_data_lines=100000, max_guess_type_data_lines=None, **kwd):
+    def set_meta(self, dataset, overwrite=True, skip=None, max_data_lines=100000, max_guess_type_data_lines=None, line_accumulators=None, **kwd):
         """
         Tries to determine the number of columns as well as those columns that
         contain numerical values in the dataset.  A skip parameter is used
@@ -278,7 +726,9 @@ class Tabular(TabularData):
         non-optional metadata parameters are properly set; if used, optional
         metadata parameters will be set to None, unless the entire file has
         already been read. Using None for max_data_lines will process all data
-        lines.
+        lines. Additional ``line_accumulators`` are fed the lines of the
+        dataset while it is read, so subclasses can compute their own
+        metadata without reading the file again.
 
         Items of interest:
 
@@ -289,125 +739,24 @@ class Tabular(TabularData):
            Since metadata can now be processed on cluster nodes, we've merged the line count portion
            of the set_peek() processing here, and we now check the entire contents of the file.
         """
-        # Store original skip value to check with later
-        requested_skip = skip
-        if skip is None:
-            skip = 0
-        column_type_set_order = ['int', 'float', 'list', 'str']  # Order to set column types in
-        default_column_type = column_type_set_order[-1]  # Default column type is lowest in list
-        column_type_compare_order = list(column_type_set_order)  # Order to compare column types
-        column_type_compare_order.reverse()
-
-        def type_overrules_type(column_type1, column_type2):
-            if column_type1 is None or column_type1 == column_type2:
-                return False
-            if column_type2 is None:
-                return True
-            for column_type in column_type_compare_order:
-                if column_type1 == column_type:
-                    return True
-                if column_type2 == column_type:
-                    return False
-            # neither column type was found in our ordered list, this cannot happen
-            raise ValueError("Tried to compare unknown column types: %s and %s" % (column_type1, column_type2))
-
-        def is_int(column_text):
-            try:
-                int(column_text)
-                return True
-            except ValueError:
-                return False
-
-        def is_float(column_text):
-            try:
-                float(column_text)
-                return True
-            except ValueError:
-                if column_text.strip().lower() == 'na':
-                    return True  # na is special cased to be a float
-                return False
-
-        def is_list(column_text):
-            return "," in column_text
-
-        def is_str(column_text):
-            # anything, except an empty string, is True
-            if column_text == "":
-                return False
-            return True
-        is_column_type = {}  # Dict to store column type string to checking function
-        for column_type in column_type_set_order:
-            is_column_type[column_type] = locals()["is_%s" % (column_type)]
-
-        def guess_column_type(column_text):
-            for column_type in column_type_set_order:
-                if is_column_type[column_type](column_text):
-                    return column_type
-            return None
-        data_lines = 0
-        comment_lines = 0
-        column_names = None
-        column_types = []
-        first_line_column_types = [default_column_type]  # default value is one column of type str
+        accumulator = ColumnTypesAccumulator(skip=skip,
+                                             max_data_lines=max_data_lines,
+                                             max_guess_type_data_lines=max_guess_type_data_lines,
+                                             get_column_names=self.get_column_names,
+                                             vectorized=self.vectorized_column_types)
+        sampled = False
         if dataset.has_data():
             # NOTE: if skip > num_check_lines, we won't detect any metadata, and will use default
-            with compression_utils.get_fileobj(dataset.file_name) as dataset_fh:
-                i = 0
-                while True:
-                    line = dataset_fh.readline()
-                    if not line:
-                        break
-                    line = line.rstrip('\r\n')
-                    if i == 0:
-                        column_names = self.get_column_names(first_line=line)
-                    if i < skip or not line or line.startswith('#'):
-                        # We'll call blank lines comments
-                        comment_lines += 1
-                    else:
-                        data_lines += 1
-                        if max_guess_type_data_lines is None or data_lines <= max_guess_type_data_lines:
-                            fields = line.split('\t')
-                            for field_count, field in enumerate(fields):
-                                if field_count >= len(column_types):  # found a previously unknown column, we append None
-                                    column_types.append(None)
-                                column_type = guess_column_type(field)
-                                if type_overrules_type(column_type, column_types[field_count]):
-                                    column_types[field_count] = column_type
-                        if i == 0 and requested_skip is None:
-                            # This is our first line, people seem to like to upload files that have a header line, but do not
-                            # start with '#' (i.e. all column types would then most likely be detected as str).  We will assume
-                            # that the first line is always a header (this was previous behavior - it was always skipped).  When
-                            # the requested skip is None, we only use the data from the first line if we have no other data for
-                            # a column.  This is far from perfect, as
-                            # 1,2,3	1.1	2.2	qwerty
-                            # 0	0		1,2,3
-                            # will be detected as
-                            # "column_types": ["int", "int", "float", "list"]
-                            # instead of
-                            # "column_types": ["list", "float", "float", "str"]  *** would seem to be the 'Truth' by manual
-                            # observation that the first line should be included as data.  The old method would have detected as
-                            # "column_types": ["int", "int", "str", "list"]
-                            first_line_column_types = column_types
-                            column_types = [None for col in first_line_column_types]
-                    if max_data_lines is not None and data_lines >= max_data_lines:
-                        if dataset_fh.tell() != dataset.get_size():
-                            data_lines = None  # Clear optional data_lines metadata value
-                            comment_lines = None  # Clear optional comment_lines metadata value; additional comment lines could appear below this point
-                        break
-                    i += 1
-
-        # we error on the larger number of columns
-        # first we pad our column_types by using data from first line
-        if len(first_line_column_types) > len(column_types):
-            for column_type in first_line_column_types[len(column_types):]:
-                column_types.append(column_type)
-        # Now we fill any unknown (None) column_types with data from first line
-        for i in range(len(column_types)):
-            if column_types[i] is None:
-                if len(first_line_column_types) <= i or first_line_column_types[i] is None:
-                    column_types[i] = default_column_type
-                else:
-                    column_types[i] = first_line_column_types[i]
+            sampled = self.sample_column_types(dataset, accumulator, line_accumulators or [])
+            if not sampled:
+                scan_lines(dataset.file_name, [accumulator] + list(line_accumulators or []))
+        data_lines = accumulator.data_lines
+        comment_lines = accumulator.comment_lines
+        if accumulator.truncated:
+            data_lines = None  # Clear optional data_lines metadata value
+            comment_lines = None  # Clear optional comment_lines metadata value; additional comment lines could appear below this point
+        column_names = accumulator.column_names
+        column_types = accumulator.get_column_types()
         # Set the discovered metadata values for the dataset
         dataset.metadata.data_lines = data_lines
         dataset.metadata.comment_lines = comment_lines
@@ -416,6 +765,58 @@ class Tabular(TabularData):
         dataset.metadata.delimiter = '\t'
         if column_names is not None:
             dataset.metadata.column_names = column_names
+        if accumulator.vectorized and not (sampled or accumulator.truncated or max_guess_type_data_lines is not None):
+            # Column statistics are only set if all data lines were classified
+            column_mins, column_maxs, column_null_counts = accumulator.get_column_stats(column_types)
+            dataset.metadata.column_mins = column_mins
+            dataset.metadata.column_maxs = column_maxs
+            dataset.metadata.column_null_counts = column_null_counts
+        self.set_line_offset_index(dataset)
+
+    def sample_column_types(self, dataset, accumulator, line_accumulators):
+        """
+        Feed the ``accumulator`` of ``set_meta`` from the first lines and a
+        sample of the rest of large datasets, see ``column_type_sampling_min_size``.
+        Returns False if the dataset should be read line by line instead.
+        """
+        max_data_lines = accumulator.max_data_lines
+        if self.column_type_sampling_min_size is None or os.path.getsize(dataset.file_name) < self.column_type_sampling_min_size:
+            return False
+        if max_data_lines is not None and max_data_lines <= self.column_type_sample_head_lines:
+            return False
+        compressed_format, fh = compression_utils.get_fileobj_raw(dataset.file_name, 'rb')
+        with fh:
+            if compressed_format:
+                return False
+            active = [accumulator] + [line_accumulator for line_accumulator in line_accumulators if not line_accumulator.done]
+            while True:
+                chunk = fh.readline()
+                if not chunk:
+                    return True
+                # Lines may also end with a single \r, like in scan_lines
+                for line in LINE_RE.findall(chunk):
+                    line = line.decode('utf-8')
+                    for line_accumulator in active:
+                        line_accumulator.feed(line)
+                    active = [line_accumulator for line_accumulator in active if not line_accumulator.done]
+                    if not active:
+                        return True
+                if active == [accumulator] and accumulator.line_count >= self.column_type_sample_head_lines:
+                    break
+            rng = random.Random(0)
+            if max_data_lines is None:
+                lines, comment_lines, samples = _count_and_sample_lines(fh, self.column_type_sample_blocks, self.column_type_sample_block_size, rng)
+                accumulator.data_lines += lines - comment_lines
+                accumulator.comment_lines += comment_lines
+            else:
+                start = fh.tell()
+                fh.seek(0, 2)
+                samples = _seek_sample_lines(fh, start, fh.tell(), self.column_type_sample_blocks, self.column_type_sample_block_size, rng)
+                accumulator.truncated = True
+        if accumulator.max_guess_type_data_lines is None:
+            for sample in samples:
+                accumulator.guess_sampled_lines(_sampled_lines(sample))
+        return True
 
     def as_gbrowse_display_file(self, dataset, **kwd):
         return open(dataset.file_name, 'rb')
@@ -1256,6 +1657,7 @@ class MatrixMarket(TabularData):
     True
     """
     file_ext = "mtx"
+    sniff_magic = (b'%%MatrixMarket matrix coordinate',)
 
     def __init__(self, **kwd):
         super(MatrixMarket, self).__init__(**kwd)
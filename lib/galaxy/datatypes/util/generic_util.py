@@ -1,5 +1,15 @@
+import struct
+
+import numpy
+
 from galaxy.util import commands
 
+LINE_OFFSET_STRUCT = struct.Struct('<Q')
+# Line offset indexes start with this magic and the interval of the indexed lines
+LINE_OFFSET_INDEX_HEADER = struct.Struct('<8sQ')
+LINE_OFFSET_INDEX_MAGIC = b'GXLNIDX1'
+NEWLINE = ord('\n')
+
 
 def count_special_lines(word, filename, invert=False):
     """
@@ -16,3 +26,55 @@ def count_special_lines(word, filename, invert=False):
     except commands.CommandLineException:
         return 0
     return int(out)
+
+
+def write_line_offset_index(filename, index_filename, interval, block_size=2 ** 20):
+    """
+    Write the byte offsets of every ``interval``-th line of ``filename``
+    (starting with line 0) to ``index_filename``. The index starts with a
+    header holding ``interval``, followed by the offsets as little-endian
+    unsigned 64 bit integers, so the offset of line ``n * interval`` is the
+    ``n``-th offset of the index.
+    """
+    line = 0
+    next_line = interval
+    position = 0
+    with open(filename, 'rb') as fh, open(index_filename, 'wb') as index_fh:
+        index_fh.write(LINE_OFFSET_INDEX_HEADER.pack(LINE_OFFSET_INDEX_MAGIC, interval))
+        index_fh.write(LINE_OFFSET_STRUCT.pack(0))
+        while True:
+            block = fh.read(block_size)
+            if not block:
+                break
+            # Line ``line + i + 1`` starts after the i-th newline of the block
+            newlines = numpy.flatnonzero(numpy.frombuffer(block, dtype=numpy.uint8) == NEWLINE)
+            first = next_line - line - 1
+            if first < len(newlines):
+                offsets = newlines[first::interval] + (position + 1)
+                index_fh.write(offsets.astype('<u8').tobytes())
+                next_line += len(offsets) * interval
+            line += len(newlines)
+            position += len(block)
+
+
+def read_line_offset(index_filename, line):
+    """
+    Return ``(indexed_line, offset)`` for the closest line at or before
+    ``line`` recorded in an index written by ``write_line_offset_index``,
+    or ``(0, 0)`` if the index isn't in that format.
+    """
+    with open(index_filename, 'rb') as index_fh:
+        header = index_fh.read(LINE_OFFSET_INDEX_HEADER.size)
+        if len(header) < LINE_OFFSET_INDEX_HEADER.size:
+            return 0, 0
+        magic, interval = LINE_OFFSET_INDEX_HEADER.unpack(header)
+        if magic != LINE_OFFSET_INDEX_MAGIC or not interval:
+            return 0, 0
+        index_fh.seek(0, 2)
+        entries = (index_fh.tell() - LINE_OFFSET_INDEX_HEADER.size) // LINE_OFFSET_STRUCT.size
+        if not entries:
+            return 0, 0
+        entry = min(line // interval, entries - 1)
+        index_fh.seek(LINE_OFFSET_INDEX_HEADER.size + entry * LINE_OFFSET_STRUCT.size)
+        offset = LINE_OFFSET_STRUCT.unpack(index_fh.read(LINE_OFFSET_STRUCT.size))[0]
+    return entry * interval, offset
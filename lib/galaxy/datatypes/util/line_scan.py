@@ -0,0 +1,74 @@
+"""
+Compute line based metadata of a dataset in a single pass over its lines.
+
+Datatypes describe what they compute from the lines of a dataset as
+``LineAccumulator`` instances and ``scan_lines`` feeds each line read to all
+of them, so metadata that used to require one pass over the file per
+datatype method is computed while reading the file once.
+"""
+from galaxy.util import compression_utils
+
+
+class LineAccumulator(object):
+    """Compute a value from the lines of a dataset, see ``scan_lines``."""
+
+    # Set to True once the accumulator doesn't need any more lines.
+    done = False
+
+    def feed(self, line):
+        """Consume the next line of the dataset, including its line ending."""
+        raise NotImplementedError()
+
+
+class DataLineCounter(LineAccumulator):
+    """Count the lines that are neither blank nor comments."""
+
+    def __init__(self):
+        self.data_lines = 0
+
+    def feed(self, line):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            self.data_lines += 1
+
+
+class SequenceCounter(LineAccumulator):
+    """Count the sequences (lines starting with ``>``) and non comment lines."""
+
+    def __init__(self):
+        self.data_lines = 0
+        self.sequences = 0
+
+    def feed(self, line):
+        line = line.strip()
+        if line and line.startswith('#'):
+            # We don't count comment lines for sequence data types
+            return
+        if line and line.startswith('>'):
+            self.sequences += 1
+        self.data_lines += 1
+
+
+def scan_lines(filename, accumulators):
+    """
+    Feed the lines of ``filename`` to ``accumulators`` until all of them are
+    done, reading the file once. Returns True if the whole file was read.
+
+    >>> from galaxy.datatypes.sniff import get_test_fname
+    >>> counter = DataLineCounter()
+    >>> scan_lines(get_test_fname('1.bed'), [counter])
+    True
+    >>> counter.data_lines
+    65
+    """
+    active = [accumulator for accumulator in accumulators if not accumulator.done]
+    with compression_utils.get_fileobj(filename) as fh:
+        while active:
+            line = fh.readline()
+            if not line:
+                return True
+            for accumulator in active:
+                accumulator.feed(line)
+            if any(accumulator.done for accumulator in active):
+                active = [accumulator for accumulator in active if not accumulator.done]
+        return not fh.read(1)
@@ -304,6 +304,7 @@ class JobConfiguration(ConfiguresHandlers):
         self.handler_assignment_methods = None
         self.handler_assignment_methods_configured = False
         self.handler_max_grab = None
+        self.handler_grab_notify = False
         self.destinations = {}
         self.destination_tags = {}
         self.default_destination_id = None
@@ -1307,6 +1308,7 @@ class JobWrapper(HasResourceParameters):
 
             self.sa_session.add(job)
             self.sa_session.flush()
+            self.app.job_manager.job_handler.job_queue.notify_job_terminal(job.id)
         else:
             for dataset_assoc in job.output_datasets:
                 dataset = dataset_assoc.dataset
@@ -1397,6 +1399,7 @@ class JobWrapper(HasResourceParameters):
         self.sa_session.add(job)
         if flush:
             self.sa_session.flush()
+        self.app.job_manager.job_handler.job_queue.notify_job_state(job.id, state)
 
     def get_state(self):
         job = self.get_job()
@@ -1451,7 +1454,7 @@ class JobWrapper(HasResourceParameters):
             dest_params, self.app.config, key, default
         )
 
-    def enqueue(self):
+    def enqueue(self, flush=True):
         job = self.get_job()
         # Change to queued state before handing to worker thread so the runner won't pick it up again
         self.change_state(model.Job.states.QUEUED, flush=False, job=job)
@@ -1459,7 +1462,8 @@ class JobWrapper(HasResourceParameters):
         self.set_job_destination(self.job_destination, None, flush=False, job=job)
         # Set object store after job destination so can leverage parameters...
         self._set_object_store_ids(job)
-        self.sa_session.flush()
+        if flush:
+            self.sa_session.flush()
 
     def _set_object_store_ids(self, job):
         if job.object_store_id:
@@ -1763,6 +1767,7 @@ class JobWrapper(HasResourceParameters):
             # If job was composed of tasks, don't attempt to recollect statisitcs
             self._collect_metrics(job, job_metrics_directory)
         self.sa_session.flush()
+        self.app.job_manager.job_handler.job_queue.notify_job_terminal(job.id)
         if job.state == job.states.ERROR:
             self._report_error()
         cleanup_job = self.cleanup_job
@@ -2631,5 +2636,14 @@ class NoopQueue(object):
     def put_stop(self, *args):
         return
 
+    def notify_job_state(self, *args):
+        return
+
+    def notify_job_terminal(self, *args):
+        return
+
+    def notify_grabbable_job(self, *args):
+        return
+
     def shutdown(self):
         return
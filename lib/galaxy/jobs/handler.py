@@ -3,6 +3,7 @@ Galaxy job handler, prepares, runs, tracks, and finishes Galaxy jobs
 """
 import datetime
 import os
+import threading
 import time
 from collections import defaultdict
 
@@ -11,6 +12,11 @@ from six.moves.queue import (
     Queue
 )
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import (
+    joinedload,
+    lazyload,
+    subqueryload
+)
 from sqlalchemy.sql.expression import (
     and_,
     func,
@@ -27,6 +33,8 @@ from galaxy.jobs import (
     TaskWrapper
 )
 from galaxy.jobs.mapper import JobNotReadyException
+from galaxy.jobs.runners import BaseJobRunner
+from galaxy.model.database_notify import DatabaseNotificationListener
 from galaxy.util import unicodify
 from galaxy.util.custom_logging import get_logger
 from galaxy.util.monitors import Monitors
@@ -38,6 +46,13 @@ log = get_logger(__name__)
 # States for running a job. These are NOT the same as data states
 JOB_WAIT, JOB_ERROR, JOB_INPUT_ERROR, JOB_INPUT_DELETED, JOB_READY, JOB_DELETED, JOB_ADMIN_DELETED, JOB_USER_OVER_QUOTA, JOB_USER_OVER_TOTAL_WALLTIME = 'wait', 'error', 'input_error', 'input_deleted', 'ready', 'deleted', 'admin_deleted', 'user_over_quota', 'user_over_total_walltime'
 DEFAULT_JOB_PUT_FAILURE_MESSAGE = 'Unable to run job due to a misconfiguration of the Galaxy job running system.  Please contact a site administrator.'
+JOB_GRAB_NOTIFY_CHANNEL = 'galaxy_job_grab'
+# How often handlers grab jobs if notified of new jobs, in case a notification is missed
+JOB_GRAB_NOTIFY_FALLBACK_INTERVAL = 60
+# How far below the highest job id seen new jobs are looked for when checking readiness incrementally, ids are
+# allocated before the jobs are committed so a job may become visible after jobs with higher ids
+JOB_READINESS_LOOKBACK_IDS = 1000
+JOB_USER_OVER_QUOTA_PAUSE_MESSAGE = "Execution of this dataset's job is paused because you were over your disk quota at the time it was ready to run"
 
 
 class JobHandler(object):
@@ -78,6 +93,9 @@ class JobHandlerQueue(Monitors):
         self.track_jobs_in_database = self.app.config.track_jobs_in_database
 
         # Initialize structures for handling job limits
+        self.__job_counts = None
+        if self.app.config.job_count_reconcile_interval:
+            self.__job_counts = ActiveJobCounts(self.sa_session, self.app.config.job_count_reconcile_interval)
         self.__clear_job_count()
 
         # Keep track of the pid that started the job manager, only it
@@ -89,10 +107,25 @@ class JobHandlerQueue(Monitors):
         self.waiting_jobs = []
         # Contains wrappers of jobs that are limited or ready (so they aren't created unnecessarily/multiple times)
         self.job_wrappers = {}
+        self.__batch_dispatch = self.app.config.job_handler_batch_dispatch
+        # Per-iteration caches of quota and usage, used when dispatching in batches
+        self.__quota_cache = {}
+        self.__usage_cache = {}
+        # Structures for incremental job readiness tracking, see __get_readiness_candidates()
+        self.__incremental_readiness = self.track_jobs_in_database and self.app.config.job_handler_incremental_readiness
+        self.__readiness_lock = threading.Lock()
+        self.__readiness_terminal_job_ids = set()
+        self.__readiness_pending_job_ids = set()
+        self.__readiness_max_job_id = 0
+        self.__readiness_seen_job_ids = set()
+        self.__readiness_steps_until_full_scan = 0
         name = "JobHandlerQueue.monitor_thread"
         self._init_monitor_thread(name, target=self.__monitor, config=app.config)
         self.__grab_query = None
         self.__grab_conn_opts = {'autocommit': False}
+        self.__grab_listener = None
+        self.__grab_notified = True
+        self.__last_grab_time = 0
         self.__initialize_job_grabbing()
 
     def __initialize_job_grabbing(self):
@@ -119,6 +152,13 @@ class JobHandlerQueue(Monitors):
             .values(handler=self.app.config.server_name)
         if method == HANDLER_ASSIGNMENT_METHODS.DB_TRANSACTION_ISOLATION:
             self.__grab_conn_opts['isolation_level'] = 'SERIALIZABLE'
+        if self.app.job_config.handler_grab_notify:
+            self.__grab_listener = DatabaseNotificationListener(
+                self.app.model.engine, JOB_GRAB_NOTIFY_CHANNEL, self.notify_grabbable_job)
+            if not self.__grab_listener.supported:
+                log.info("Database does not support notifications, handler '%s' will only grab jobs created by this "
+                         "process immediately and poll for other jobs every %s seconds", self.app.config.server_name,
+                         JOB_GRAB_NOTIFY_FALLBACK_INTERVAL)
         log.info(
             "Handler job grabber initialized with '%s' assignment method for handler '%s', tag(s): %s", method,
             self.app.config.server_name, ', '.join(str(x) for x in self.app.job_config.handler_tags)
@@ -133,6 +173,8 @@ class JobHandlerQueue(Monitors):
         self.__check_jobs_at_startup()
         # Start the queue
         self.monitor_thread.start()
+        if self.__grab_listener is not None:
+            self.__grab_listener.start()
         # The stack code is initialized in the application
         JobHandlerMessage().bind_default_handler(self, '_handle_message')
         self.app.application_stack.register_message_handler(self._handle_message, name=JobHandlerMessage.target)
@@ -248,11 +290,34 @@ class JobHandlerQueue(Monitors):
             'internal.galaxy.jobs.handlers.monitor_step',
             'Job handler monitor step complete.'
         )
-        if self.__grab_query is not None:
+        if self.__grab_query is not None and self.__should_grab():
             self.__grab_unhandled_jobs()
         self.__handle_waiting_jobs()
         log.trace(monitor_step_timer.to_str())
 
+    def notify_grabbable_job(self, handler_tag):
+        """
+        Called when a job has been assigned to ``handler_tag`` by a grabbable assignment method, wakes the monitor thread
+        so the job is grabbed immediately if this handler handles that tag.
+        """
+        if handler_tag in self.app.job_config.self_handler_tags:
+            self.__grab_notified = True
+            self.sleeper.wake()
+
+    def __should_grab(self):
+        """
+        If grabbing on notification, only grab when notified of new jobs (or periodically, in case a notification was
+        missed), otherwise grab on every iteration.
+        """
+        if self.__grab_listener is None:
+            return True
+        now = time.time()
+        if self.__grab_notified or now - self.__last_grab_time >= JOB_GRAB_NOTIFY_FALLBACK_INTERVAL:
+            self.__grab_notified = False
+            self.__last_grab_time = now
+            return True
+        return False
+
     def __grab_unhandled_jobs(self):
         """
         Attempts to "grab" jobs (assign unassigned jobs to itself) using DB serialization methods, if enabled. This
@@ -269,6 +334,10 @@ class JobHandlerQueue(Monitors):
                 if rows:
                     log.debug('Grabbed job(s): %s', ', '.join(str(row[0]) for row in rows))
                     trans.commit()
+                    self.__add_readiness_candidates(row[0] for row in rows)
+                    if self.app.job_config.handler_max_grab and len(rows) >= self.app.job_config.handler_max_grab:
+                        # There may be more jobs waiting to be grabbed
+                        self.__grab_notified = True
                 else:
                     trans.rollback()
             except OperationalError as e:
@@ -291,34 +360,42 @@ class JobHandlerQueue(Monitors):
         if self.track_jobs_in_database:
             # Clear the session so we get fresh states for job and all datasets
             self.sa_session.expunge_all()
+            # If checking readiness incrementally, restrict the queries below to candidate jobs
+            candidate_ids = self.__get_readiness_candidates()
+            new_job_filters = [model.Job.state == model.Job.states.NEW]
+            if candidate_ids is not None:
+                new_job_filters.append(model.Job.table.c.id.in_(candidate_ids))
             # Fetch all new jobs
             hda_not_ready = self.sa_session.query(model.Job.id).enable_eagerloads(False) \
                 .join(model.JobToInputDatasetAssociation) \
                 .join(model.HistoryDatasetAssociation) \
                 .join(model.Dataset) \
-                .filter(and_(model.Job.state == model.Job.states.NEW,
-                             model.Dataset.state.in_(model.Dataset.non_ready_states))).subquery()
+                .filter(and_(model.Dataset.state.in_(model.Dataset.non_ready_states),
+                             *new_job_filters)).subquery()
             ldda_not_ready = self.sa_session.query(model.Job.id).enable_eagerloads(False) \
                 .join(model.JobToInputLibraryDatasetAssociation) \
                 .join(model.LibraryDatasetDatasetAssociation) \
                 .join(model.Dataset) \
-                .filter(and_(model.Job.state == model.Job.states.NEW,
-                             model.Dataset.state.in_(model.Dataset.non_ready_states))).subquery()
-            if self.app.config.user_activation_on:
-                jobs_to_check = self.sa_session.query(model.Job).enable_eagerloads(False) \
+                .filter(and_(model.Dataset.state.in_(model.Dataset.non_ready_states),
+                             *new_job_filters)).subquery()
+            if candidate_ids is not None and not candidate_ids:
+                # Nothing changed since the last iteration
+                jobs_to_check = []
+            elif self.app.config.user_activation_on:
+                jobs_to_check = self.__waiting_jobs_query() \
                     .outerjoin(model.User) \
-                    .filter(and_((model.Job.state == model.Job.states.NEW),
-                                 or_((model.Job.user_id == null()), (model.User.active == true())),
+                    .filter(and_(or_((model.Job.user_id == null()), (model.User.active == true())),
                                  (model.Job.handler == self.app.config.server_name),
                                  ~model.Job.table.c.id.in_(hda_not_ready),
-                                 ~model.Job.table.c.id.in_(ldda_not_ready))) \
+                                 ~model.Job.table.c.id.in_(ldda_not_ready),
+                                 *new_job_filters)) \
                     .order_by(model.Job.id).all()
             else:
-                jobs_to_check = self.sa_session.query(model.Job).enable_eagerloads(False) \
-                    .filter(and_((model.Job.state == model.Job.states.NEW),
-                                 (model.Job.handler == self.app.config.server_name),
+                jobs_to_check = self.__waiting_jobs_query() \
+                    .filter(and_((model.Job.handler == self.app.config.server_name),
                                  ~model.Job.table.c.id.in_(hda_not_ready),
-                                 ~model.Job.table.c.id.in_(ldda_not_ready))) \
+                                 ~model.Job.table.c.id.in_(ldda_not_ready),
+                                 *new_job_filters)) \
                     .order_by(model.Job.id).all()
             # Filter jobs with invalid input states
             jobs_to_check = self.__filter_jobs_with_invalid_input_states(jobs_to_check)
@@ -345,17 +422,24 @@ class JobHandlerQueue(Monitors):
                 pass
         # Ensure that we get new job counts on each iteration
         self.__clear_job_count()
+        if self.__job_counts:
+            self.__job_counts.reconcile_if_due()
+        self.__quota_cache = {}
+        self.__usage_cache = {}
         # Check resubmit jobs first so that limits of new jobs will still be enforced
         for job in resubmit_jobs:
             log.debug('(%s) Job was resubmitted and is being dispatched immediately', job.id)
             # Reassemble resubmit job destination from persisted value
             jw = self.__recover_job_wrapper(job)
             if jw.is_ready_for_resubmission(job):
-                self.increase_running_job_count(job.user_id, jw.job_destination.id)
+                self.increase_running_job_count(job.user_id, jw.job_destination.id, job_id=job.id)
                 self.dispatcher.put(jw)
         # Iterate over new and waiting jobs and look for any that are
         # ready to run
         new_waiting_jobs = []
+        # When dispatching in batches, ready and over quota jobs are collected and handled after the loop
+        ready_job_wrappers = []
+        jobs_to_pause = {}
         for job in jobs_to_check:
             try:
                 # Check the job's dependencies, requeue if they're not done.
@@ -385,8 +469,11 @@ class JobHandlerQueue(Monitors):
                 elif job_state == JOB_INPUT_DELETED:
                     log.info("(%d) Job unable to run: one or more inputs deleted" % job.id)
                 elif job_state == JOB_READY:
-                    self.dispatcher.put(self.job_wrappers.pop(job.id))
-                    log.info("(%d) Job dispatched" % job.id)
+                    if self.__batch_dispatch:
+                        ready_job_wrappers.append(self.job_wrappers.pop(job.id))
+                    else:
+                        self.dispatcher.put(self.job_wrappers.pop(job.id))
+                        log.info("(%d) Job dispatched" % job.id)
                 elif job_state == JOB_DELETED:
                     log.info("(%d) Job deleted by user while still queued" % job.id)
                 elif job_state == JOB_ADMIN_DELETED:
@@ -398,10 +485,13 @@ class JobHandlerQueue(Monitors):
                     else:
                         log.info("(%d) User (%s) is over total walltime limit: job paused" % (job.id, job.user_id))
 
+                    if self.__batch_dispatch:
+                        jobs_to_pause[job.id] = JOB_USER_OVER_QUOTA_PAUSE_MESSAGE
+                        continue
                     job.set_state(model.Job.states.PAUSED)
                     for dataset_assoc in job.output_datasets + job.output_library_datasets:
                         dataset_assoc.dataset.dataset.state = model.Dataset.states.PAUSED
-                        dataset_assoc.dataset.info = "Execution of this dataset's job is paused because you were over your disk quota at the time it was ready to run"
+                        dataset_assoc.dataset.info = JOB_USER_OVER_QUOTA_PAUSE_MESSAGE
                         self.sa_session.add(dataset_assoc.dataset.dataset)
                     self.sa_session.add(job)
                 elif job_state == JOB_ERROR:
@@ -411,9 +501,17 @@ class JobHandlerQueue(Monitors):
                     new_waiting_jobs.append(job.id)
             except Exception:
                 log.exception("failure running job %d", job.id)
+        if jobs_to_pause:
+            self.__pause_jobs(jobs_to_pause)
+        if ready_job_wrappers:
+            self.dispatcher.put_batch(ready_job_wrappers)
+            log.info("Dispatched %d job(s): %s", len(ready_job_wrappers), ', '.join(str(jw.job_id) for jw in ready_job_wrappers))
         # Update the waiting list
         if not self.track_jobs_in_database:
             self.waiting_jobs = new_waiting_jobs
+        elif self.__incremental_readiness:
+            # Jobs waiting on limits (rather than inputs) must be checked again on the next iteration
+            self.__add_readiness_candidates(new_waiting_jobs)
         # Remove cached wrappers for any jobs that are no longer being tracked
         for id in list(self.job_wrappers.keys()):
             if id not in new_waiting_jobs:
@@ -423,6 +521,130 @@ class JobHandlerQueue(Monitors):
         # Done with the session
         self.sa_session.remove()
 
+    def __waiting_jobs_query(self):
+        query = self.sa_session.query(model.Job)
+        if not self.__batch_dispatch:
+            return query.enable_eagerloads(False)
+        # Load everything needed to check and dispatch the whole batch up front, rather than lazily per job
+        return query.options(
+            lazyload('*'),
+            joinedload(model.Job.user),
+            subqueryload(model.Job.parameters),
+            subqueryload(model.Job.tasks),
+            subqueryload(model.Job.input_datasets).joinedload(model.JobToInputDatasetAssociation.dataset),
+            subqueryload(model.Job.input_library_datasets).joinedload(model.JobToInputLibraryDatasetAssociation.dataset),
+            subqueryload(model.Job.output_datasets)
+            .joinedload(model.JobToOutputDatasetAssociation.dataset)
+            .joinedload(model.HistoryDatasetAssociation.dataset),
+            subqueryload(model.Job.output_library_datasets)
+            .joinedload(model.JobToOutputLibraryDatasetAssociation.dataset)
+            .joinedload(model.LibraryDatasetDatasetAssociation.dataset),
+        )
+
+    def __pause_jobs(self, pause_messages):
+        """
+        Pause new jobs and their outputs using bulk UPDATE statements rather than per-job ORM changes.
+        ``pause_messages`` maps job ids to the message that should be set on their outputs.
+        """
+        job_ids_by_message = defaultdict(list)
+        for job_id, message in pause_messages.items():
+            job_ids_by_message[message].append(job_id)
+        job_table = model.Job.table
+        for message, job_ids in job_ids_by_message.items():
+            paused_job_ids = [row[0] for row in self.sa_session.execute(
+                select([job_table.c.id]).where(and_(job_table.c.id.in_(job_ids),
+                                                    job_table.c.state == model.Job.states.NEW)))]
+            if not paused_job_ids:
+                continue
+            log.debug("Pausing job(s) %s, %s", ', '.join(str(job_id) for job_id in paused_job_ids), message)
+            self.sa_session.execute(job_table.update()
+                                    .where(job_table.c.id.in_(paused_job_ids))
+                                    .values(state=model.Job.states.PAUSED))
+            self.sa_session.execute(model.JobStateHistory.table.insert(),
+                                    [dict(job_id=job_id, state=model.Job.states.PAUSED) for job_id in paused_job_ids])
+            for job_to_output, association in [(model.JobToOutputDatasetAssociation, model.HistoryDatasetAssociation),
+                                               (model.JobToOutputLibraryDatasetAssociation, model.LibraryDatasetDatasetAssociation)]:
+                output_ids = select([job_to_output.table.c.dataset_id]).where(job_to_output.table.c.job_id.in_(paused_job_ids))
+                self.sa_session.execute(association.table.update()
+                                        .where(association.table.c.id.in_(output_ids))
+                                        .values(info=message))
+                dataset_ids = select([association.table.c.dataset_id]).where(association.table.c.id.in_(output_ids))
+                self.sa_session.execute(model.Dataset.table.update()
+                                        .where(model.Dataset.table.c.id.in_(dataset_ids))
+                                        .values(state=model.Dataset.states.PAUSED))
+
+    def __add_readiness_candidates(self, job_ids):
+        with self.__readiness_lock:
+            self.__readiness_pending_job_ids.update(job_ids)
+
+    def notify_job_terminal(self, job_id):
+        """
+        Record that job ``job_id`` and its outputs reached a terminal state, so that it no longer counts towards
+        concurrency limits and jobs consuming its outputs are checked on the next iteration if incremental readiness
+        tracking is enabled, and workflow invocations waiting on it are woken. May be called from any thread.
+        """
+        if self.__job_counts:
+            self.__job_counts.job_state_changed(job_id, model.Job.states.OK)
+        if self.__incremental_readiness:
+            with self.__readiness_lock:
+                self.__readiness_terminal_job_ids.add(job_id)
+            self.sleeper.wake()
+        self.app.workflow_scheduling_manager.notify_job_terminal(job_id)
+
+    def notify_job_state(self, job_id, state):
+        """
+        Record a job state change for the in-memory job counts, if enabled. May be called from any thread.
+        """
+        if self.__job_counts:
+            self.__job_counts.job_state_changed(job_id, state)
+
+    def __get_readiness_candidates(self):
+        """
+        Returns the set of ids of new jobs that may have become ready since the last iteration, or ``None`` if all new
+        jobs should be checked. Candidates are jobs assigned to this handler since the last iteration, jobs that were
+        waiting on limits and jobs consuming the outputs of jobs reported by ``notify_job_terminal()``. Dataset state
+        changes made in other processes are only picked up by the periodic full scan.
+        """
+        if not self.__incremental_readiness:
+            return None
+        with self.__readiness_lock:
+            candidate_ids = self.__readiness_pending_job_ids
+            terminal_job_ids = self.__readiness_terminal_job_ids
+            self.__readiness_pending_job_ids = set()
+            self.__readiness_terminal_job_ids = set()
+        if self.__readiness_steps_until_full_scan <= 0:
+            self.__readiness_steps_until_full_scan = self.app.config.job_handler_readiness_full_scan_interval
+            # Any job committed before this point will be examined by the full scan
+            self.__readiness_max_job_id = self.sa_session.query(func.max(model.Job.id)).scalar() or 0
+            self.__readiness_seen_job_ids = set()
+            return None
+        self.__readiness_steps_until_full_scan -= 1
+        # Jobs with ids lower than the highest seen may be committed late, so look back a bit and skip those seen
+        lookback_job_id = self.__readiness_max_job_id - JOB_READINESS_LOOKBACK_IDS
+        new_job_ids = [row[0] for row in self.sa_session.query(model.Job.id).enable_eagerloads(False)
+                       .filter(and_(model.Job.state == model.Job.states.NEW,
+                                    model.Job.handler == self.app.config.server_name,
+                                    model.Job.id > lookback_job_id))
+                       if row[0] not in self.__readiness_seen_job_ids]
+        if new_job_ids:
+            self.__readiness_max_job_id = max(self.__readiness_max_job_id, max(new_job_ids))
+            lookback_job_id = self.__readiness_max_job_id - JOB_READINESS_LOOKBACK_IDS
+            self.__readiness_seen_job_ids = {job_id for job_id in self.__readiness_seen_job_ids if job_id > lookback_job_id}
+            self.__readiness_seen_job_ids.update(new_job_ids)
+            candidate_ids.update(new_job_ids)
+        if terminal_job_ids:
+            for job_to_output, job_to_input, association in [
+                    (model.JobToOutputDatasetAssociation, model.JobToInputDatasetAssociation, model.HistoryDatasetAssociation),
+                    (model.JobToOutputLibraryDatasetAssociation, model.JobToInputLibraryDatasetAssociation, model.LibraryDatasetDatasetAssociation)]:
+                # Inputs may be copies of the outputs, so match on the underlying dataset
+                output_dataset_ids = self.sa_session.query(association.dataset_id) \
+                    .join(job_to_output) \
+                    .filter(job_to_output.job_id.in_(terminal_job_ids)).subquery()
+                candidate_ids.update(row[0] for row in self.sa_session.query(job_to_input.job_id)
+                                     .join(association)
+                                     .filter(association.dataset_id.in_(output_dataset_ids)))
+        return candidate_ids
+
     def __filter_jobs_with_invalid_input_states(self, jobs):
         """
         Takes  list of jobs and filters out jobs whose input datasets are in invalid state and
@@ -468,14 +690,20 @@ class JobHandlerQueue(Monitors):
                 jobs_to_pause[job_id].append("Input dataset '%s' is in error state" % hda_name)
             elif dataset_state != model.Dataset.states.OK:
                 jobs_to_ignore[job_id].append("Input dataset '%s' is in %s state" % (hda_name, dataset_state))
+        pause_messages = {}
         for job_id in sorted(jobs_to_pause):
             pause_message = ", ".join(jobs_to_pause[job_id])
             pause_message = "%s. To resume this job fix the input dataset(s)." % pause_message
+            if self.__batch_dispatch:
+                pause_messages[job_id] = pause_message
+                continue
             job, job_wrapper = self.job_pair_for_id(job_id)
             try:
                 job_wrapper.pause(job=job, message=pause_message)
             except Exception:
                 log.exception("(%s) Caught exception while attempting to pause job.", job_id)
+        if pause_messages:
+            self.__pause_jobs(pause_messages)
         for job_id in sorted(jobs_to_fail):
             fail_message = ", ".join(jobs_to_fail[job_id])
             job, job_wrapper = self.job_pair_for_id(job_id)
@@ -519,7 +747,7 @@ class JobHandlerQueue(Monitors):
 
         if state == JOB_READY:
             # PASS.  increase usage by one job (if caching) so that multiple jobs aren't dispatched on this queue iteration
-            self.increase_running_job_count(job.user_id, job_destination.id)
+            self.increase_running_job_count(job.user_id, job_destination.id, job_id=job.id)
             for job_to_input_dataset_association in job.input_datasets:
                 # We record the input dataset version, now that we know the inputs are ready
                 if job_to_input_dataset_association.dataset:
@@ -559,10 +787,10 @@ class JobHandlerQueue(Monitors):
         if state == JOB_READY:
             state = self.__check_user_jobs(job, job_wrapper)
         if state == JOB_READY and self.app.config.enable_quotas:
-            quota = self.app.quota_agent.get_quota(job.user)
+            quota = self.__get_quota(job)
             if quota is not None:
                 try:
-                    usage = self.app.quota_agent.get_usage(user=job.user, history=job.history)
+                    usage = self.__get_usage(job)
                     if usage > quota:
                         return JOB_USER_OVER_QUOTA, job_destination
                 except AssertionError:
@@ -598,6 +826,22 @@ class JobHandlerQueue(Monitors):
 
         return state, job_destination
 
+    def __get_quota(self, job):
+        if not self.__batch_dispatch:
+            return self.app.quota_agent.get_quota(job.user)
+        if job.user_id not in self.__quota_cache:
+            self.__quota_cache[job.user_id] = self.app.quota_agent.get_quota(job.user)
+        return self.__quota_cache[job.user_id]
+
+    def __get_usage(self, job):
+        if not self.__batch_dispatch:
+            return self.app.quota_agent.get_usage(user=job.user, history=job.history)
+        # Usage of anonymous users is tracked per history
+        key = (job.user_id, job.history_id if job.user_id is None else None)
+        if key not in self.__usage_cache:
+            self.__usage_cache[key] = self.app.quota_agent.get_usage(user=job.user, history=job.history)
+        return self.__usage_cache[key]
+
     def __verify_in_memory_job_inputs(self, job):
         """ Perform the same checks that happen via SQL for in-memory managed
         jobs.
@@ -634,6 +878,8 @@ class JobHandlerQueue(Monitors):
         self.total_job_count_per_destination = None
 
     def get_user_job_count(self, user_id):
+        if self.__job_counts:
+            return self.__job_counts.get_user_job_count(user_id)
         self.__cache_user_job_count()
         # This could have been incremented by a previous job dispatched on this iteration, even if we're not caching
         rval = self.user_job_count.get(user_id, 0)
@@ -664,6 +910,8 @@ class JobHandlerQueue(Monitors):
             self.user_job_count = {}
 
     def get_user_job_count_per_destination(self, user_id):
+        if self.__job_counts:
+            return self.__job_counts.get_user_job_count_per_destination(user_id)
         self.__cache_user_job_count_per_destination()
         cached = self.user_job_count_per_destination.get(user_id, {})
         if self.app.config.cache_user_job_count:
@@ -697,7 +945,10 @@ class JobHandlerQueue(Monitors):
         elif self.user_job_count_per_destination is None:
             self.user_job_count_per_destination = {}
 
-    def increase_running_job_count(self, user_id, destination_id):
+    def increase_running_job_count(self, user_id, destination_id, job_id=None):
+        if self.__job_counts and job_id is not None:
+            self.__job_counts.job_dispatched(job_id, user_id, destination_id)
+            return
         if self.app.job_config.limits.registered_user_concurrent_jobs or \
            self.app.job_config.limits.anonymous_user_concurrent_jobs or \
            self.app.job_config.limits.destination_user_concurrent_jobs:
@@ -769,6 +1020,8 @@ class JobHandlerQueue(Monitors):
                 self.total_job_count_per_destination[row['destination_id']] = row['job_count']
 
     def get_total_job_count_per_destination(self):
+        if self.__job_counts:
+            return self.__job_counts.get_total_job_count_per_destination()
         self.__cache_total_job_count_per_destination()
         # Always use caching (at worst a job will have to wait one iteration,
         # and this would be more fair anyway as it ensures FIFO scheduling,
@@ -804,6 +1057,7 @@ class JobHandlerQueue(Monitors):
             job.handler = self.app.config.server_name
             self.sa_session.add(job)
             self.sa_session.flush()
+            self.__add_readiness_candidates([job.id])
             # If not tracking jobs in the database
             self.put(job.id, job.tool_id)
         else:
@@ -829,10 +1083,128 @@ class JobHandlerQueue(Monitors):
             self.app.application_stack.deregister_message_handler(name=JobHandlerMessage.target)
             self.sleeper.wake()
             self.shutdown_monitor()
+            if self.__grab_listener is not None:
+                self.__grab_listener.shutdown()
             log.info("job handler queue stopped")
             self.dispatcher.shutdown()
 
 
+class ActiveJobCounts(object):
+    """
+    In-memory counts of dispatched (queued, running or resubmitted) jobs per user and destination, used to enforce job
+    concurrency limits without querying the job table on every handler queue iteration. The counts are updated as
+    jobs are dispatched by this handler and change state, and are periodically reconciled against the database to
+    account for jobs dispatched or finished by other handlers.
+    """
+    active_states = (model.Job.states.QUEUED, model.Job.states.RUNNING, model.Job.states.RESUBMITTED)
+
+    def __init__(self, sa_session, reconcile_interval):
+        self.sa_session = sa_session
+        self.reconcile_interval = reconcile_interval
+        self.__lock = threading.Lock()
+        # job id -> (user id, destination id, state)
+        self.__jobs = {}
+        self.__user_job_count = {}
+        self.__user_job_count_per_destination = {}
+        self.__total_job_count_per_destination = {}
+        # Jobs leaving the active states while the database is being queried, these must not be restored
+        self.__removed_during_reconcile = None
+        self.__last_reconcile = None
+
+    def reconcile_if_due(self):
+        if self.__last_reconcile is None or time.time() - self.__last_reconcile >= self.reconcile_interval:
+            self.reconcile()
+
+    def reconcile(self):
+        with self.__lock:
+            self.__removed_during_reconcile = set()
+        jobs = {}
+        try:
+            result = self.sa_session.execute(select([model.Job.table.c.id,
+                                                     model.Job.table.c.user_id,
+                                                     model.Job.table.c.destination_id,
+                                                     model.Job.table.c.state])
+                                             .where(model.Job.table.c.state.in_(self.active_states)))
+            for row in result:
+                jobs[row[0]] = (row[1], row[2], row[3])
+        except Exception:
+            with self.__lock:
+                self.__removed_during_reconcile = None
+            raise
+        with self.__lock:
+            removed = self.__removed_during_reconcile
+            self.__removed_during_reconcile = None
+            self.__jobs = {}
+            self.__user_job_count = {}
+            self.__user_job_count_per_destination = {}
+            self.__total_job_count_per_destination = {}
+            for job_id, (user_id, destination_id, state) in jobs.items():
+                if job_id not in removed:
+                    self.__add(job_id, user_id, destination_id, state)
+        self.__last_reconcile = time.time()
+        log.debug("Reconciled job counts with the database, %d active jobs", len(jobs))
+
+    def __add(self, job_id, user_id, destination_id, state):
+        # Must be called with the lock held
+        self.__remove(job_id)
+        self.__jobs[job_id] = (user_id, destination_id, state)
+        if user_id is not None:
+            self.__user_job_count[user_id] = self.__user_job_count.get(user_id, 0) + 1
+        # Resubmitted jobs count towards the user's limit but not towards any destination's
+        if state != model.Job.states.RESUBMITTED:
+            if user_id is not None:
+                per_destination = self.__user_job_count_per_destination.setdefault(user_id, {})
+                per_destination[destination_id] = per_destination.get(destination_id, 0) + 1
+            self.__total_job_count_per_destination[destination_id] = self.__total_job_count_per_destination.get(destination_id, 0) + 1
+
+    def __remove(self, job_id):
+        # Must be called with the lock held
+        if job_id not in self.__jobs:
+            return
+        user_id, destination_id, state = self.__jobs.pop(job_id)
+        if user_id is not None:
+            self.__user_job_count[user_id] -= 1
+            if not self.__user_job_count[user_id]:
+                del self.__user_job_count[user_id]
+        if state != model.Job.states.RESUBMITTED:
+            if user_id is not None:
+                per_destination = self.__user_job_count_per_destination[user_id]
+                per_destination[destination_id] -= 1
+                if not per_destination[destination_id]:
+                    del per_destination[destination_id]
+                if not per_destination:
+                    del self.__user_job_count_per_destination[user_id]
+            self.__total_job_count_per_destination[destination_id] -= 1
+            if not self.__total_job_count_per_destination[destination_id]:
+                del self.__total_job_count_per_destination[destination_id]
+
+    def job_dispatched(self, job_id, user_id, destination_id):
+        with self.__lock:
+            self.__add(job_id, user_id, destination_id, model.Job.states.QUEUED)
+
+    def job_state_changed(self, job_id, state):
+        with self.__lock:
+            if state not in self.active_states:
+                self.__remove(job_id)
+                if self.__removed_during_reconcile is not None:
+                    self.__removed_during_reconcile.add(job_id)
+            elif job_id in self.__jobs:
+                user_id, destination_id, _ = self.__jobs[job_id]
+                self.__add(job_id, user_id, destination_id, state)
+
+    def get_user_job_count(self, user_id):
+        with self.__lock:
+            return self.__user_job_count.get(user_id, 0)
+
+    def get_user_job_count_per_destination(self, user_id):
+        with self.__lock:
+            return dict(self.__user_job_count_per_destination.get(user_id, {}))
+
+    def get_total_job_count_per_destination(self):
+        with self.__lock:
+            return dict(self.__total_job_count_per_destination)
+
+
 class JobHandlerStopQueue(Monitors):
     """
     A queue for jobs which need to be terminated prematurely.
@@ -922,6 +1294,7 @@ class JobHandlerStopQueue(Monitors):
             job.set_final_state(final_state)
             self.sa_session.add(job)
             self.sa_session.flush()
+            self.app.job_manager.job_handler.job_queue.notify_job_terminal(job.id)
             if job.job_runner_name is not None:
                 # tell the dispatcher to stop the job
                 job_wrapper = JobWrapper(job, self, use_persisted_destination=True)
@@ -989,6 +1362,37 @@ class DefaultJobDispatcher(object):
             log.error('put(): (%s) Invalid job runner: %s' % (job_wrapper.job_id, runner_name))
             job_wrapper.fail(DEFAULT_JOB_PUT_FAILURE_MESSAGE)
 
+    def put_batch(self, job_wrappers):
+        """
+        Dispatch several jobs at once. The queued state and destination of all jobs are persisted with a single flush
+        before any of them are handed to the runners' worker threads. Jobs for runners overriding ``put`` are handed
+        to it one at a time.
+        """
+        queued = []
+        for job_wrapper in job_wrappers:
+            runner_name = self.__get_runner_name(job_wrapper)
+            runner = self.job_runners.get(runner_name)
+            if runner is None:
+                log.error('put_batch(): (%s) Invalid job runner: %s' % (job_wrapper.job_id, runner_name))
+                job_wrapper.fail(DEFAULT_JOB_PUT_FAILURE_MESSAGE)
+                continue
+            if type(runner).put is not BaseJobRunner.put:
+                self.put(job_wrapper)
+                continue
+            try:
+                job_wrapper.enqueue(flush=False)
+            except Exception:
+                log.exception("(%s) Failed to enqueue job", job_wrapper.job_id)
+                # Don't leave a half queued job that no runner will ever pick up
+                job_wrapper.fail(DEFAULT_JOB_PUT_FAILURE_MESSAGE)
+                continue
+            log.debug("(%s) Dispatching to %s runner" % (job_wrapper.job_id, runner_name))
+            queued.append((runner, job_wrapper))
+        if queued:
+            self.app.model.context.flush()
+        for runner, job_wrapper in queued:
+            runner.mark_as_queued(job_wrapper)
+
     def stop(self, job, job_wrapper):
         """
         Stop the given job. The input variable job may be either a Job or a Task.
@@ -9,6 +9,7 @@ from sqlalchemy.sql.expression import null
 from galaxy.exceptions import HandlerAssignmentError, ToolExecutionError
 from galaxy.jobs import handler, NoopQueue
 from galaxy.model import Job
+from galaxy.model.database_notify import send_notification
 from galaxy.web_stack.message import JobHandlerMessage
 
 log = logging.getLogger(__name__)
@@ -75,10 +76,21 @@ class JobManager(object):
         queue_callback = partial(self._queue_callback, job, tool_id)
         message_callback = partial(self._message_callback, job)
         try:
-            return self.app.job_config.assign_handler(
+            assigned = self.app.job_config.assign_handler(
                 job, configured=configured_handler, queue_callback=queue_callback, message_callback=message_callback)
         except HandlerAssignmentError as exc:
             raise ToolExecutionError(exc.args[0], job=exc.obj)
+        if self.app.job_config.handler_grab_notify and self.app.job_config.grab_handler_assignment and assigned is not True:
+            self.__notify_grabbers(assigned)
+        return assigned
+
+    def __notify_grabbers(self, handler_tag):
+        # Wake handlers that grab jobs for this tag, both in other processes and in this one
+        try:
+            send_notification(self.app.model.context, handler.JOB_GRAB_NOTIFY_CHANNEL, handler_tag)
+        except Exception:
+            log.exception("Failed to send notification for new jobs assigned to '%s'", handler_tag)
+        self.job_handler.job_queue.notify_grabbable_job(handler_tag)
 
     def stop(self, job, message=None):
         """Stop a job that is currently executing.
@@ -68,7 +68,9 @@ class RunnerParams(ParamsWithSpecs):
 
 
 class BaseJobRunner(object):
-    DEFAULT_SPECS = dict(recheck_missing_job_retries=dict(map=int, valid=lambda x: int(x) >= 0, default=0))
+    DEFAULT_SPECS = dict(recheck_missing_job_retries=dict(map=int, valid=lambda x: int(x) >= 0, default=0),
+                         max_poll_interval=dict(map=int, valid=lambda x: int(x) >= 1, default=1),
+                         finish_workers=dict(map=int, valid=lambda x: int(x) >= 0, default=0))
 
     def __init__(self, app, nworkers, **kwargs):
         """Start the job runner
@@ -87,32 +89,49 @@ class BaseJobRunner(object):
 
     def _init_worker_threads(self):
         """Start ``nworkers`` worker threads.
+
+        If the ``finish_workers`` runner parameter is set, that many
+        additional threads are started to finish jobs, so that finishing a
+        large number of jobs does not hold up the queueing of new ones.
         """
         self.work_queue = Queue()
         self.work_threads = []
+        self.finish_queue = self.work_queue
+        self.finish_threads = []
         log.debug('Starting %s %s workers' % (self.nworkers, self.runner_name))
         for i in range(self.nworkers):
             worker = threading.Thread(name="%s.work_thread-%d" % (self.runner_name, i), target=self.run_next)
             worker.daemon = True
             self.app.application_stack.register_postfork_function(worker.start)
             self.work_threads.append(worker)
+        finish_workers = self.runner_params.finish_workers
+        if finish_workers:
+            self.finish_queue = Queue()
+            log.debug('Starting %s %s finish workers' % (finish_workers, self.runner_name))
+            for i in range(finish_workers):
+                worker = threading.Thread(name="%s.finish_thread-%d" % (self.runner_name, i), target=self.run_next, args=(self.finish_queue,))
+                worker.daemon = True
+                self.app.application_stack.register_postfork_function(worker.start)
+                self.finish_threads.append(worker)
 
     def _alive_worker_threads(self, cycle=False):
         # yield endlessly as long as there are alive threads if cycle is True
         alive = True
         while alive:
             alive = False
-            for thread in self.work_threads:
+            for thread in self.work_threads + self.finish_threads:
                 if thread.is_alive():
                     if cycle:
                         alive = True
                     yield thread
 
-    def run_next(self):
+    def run_next(self, work_queue=None):
         """Run the next item in the work queue (a job waiting to run)
         """
+        if work_queue is None:
+            work_queue = self.work_queue
         while True:
-            (method, arg) = self.work_queue.get()
+            (method, arg) = work_queue.get()
             if method is STOP_SIGNAL:
                 return
             # id and name are collected first so that the call of method() is the last exception.
@@ -162,6 +181,8 @@ class BaseJobRunner(object):
         log.info("%s: Sending stop signal to %s job worker threads", self.runner_name, len(self.work_threads))
         for i in range(len(self.work_threads)):
             self.work_queue.put((STOP_SIGNAL, None))
+        for i in range(len(self.finish_threads)):
+            self.finish_queue.put((STOP_SIGNAL, None))
 
         join_timeout = self.app.config.monitor_thread_join_timeout
         if join_timeout > 0:
@@ -617,6 +638,11 @@ class AsynchronousJobState(JobState):
         self._running = False
         self.check_count = 0
         self.start_time = None
+        # Used by AsynchronousJobRunner to poll jobs whose state does not change less frequently
+        self.poll_interval = 1
+        self.next_poll_time = 0
+        # Used by AsynchronousJobRunner to wait for the job's output files without blocking a worker
+        self.output_collection_try = 0
 
         # job_id is the DRM's job id, not the Galaxy job id
         self.job_id = job_id
@@ -677,6 +703,12 @@ class AsynchronousJobRunner(BaseJobRunner, Monitors):
         # to 'watched' and then manage the watched jobs.
         self.watched = []
         self.monitor_queue = Queue()
+        # Finished jobs whose output files have not appeared yet are put on
+        # 'output_wait_queue' by the worker threads. The monitor thread moves
+        # them to 'waiting_for_output' and hands them back to the workers
+        # after a delay, instead of having the workers sleep.
+        self.waiting_for_output = []
+        self.output_wait_queue = Queue()
 
     def _init_monitor_thread(self):
         name = "%s.monitor_thread" % self.runner_name
@@ -703,6 +735,10 @@ class AsynchronousJobRunner(BaseJobRunner, Monitors):
                     self.watched.append(async_job_state)
             except Empty:
                 pass
+            try:
+                self.check_waiting_for_output()
+            except Exception:
+                log.exception('Unhandled exception checking jobs waiting for output')
             # Iterate over the list of watched jobs and check state
             try:
                 self.check_watched_items()
@@ -726,25 +762,83 @@ class AsynchronousJobRunner(BaseJobRunner, Monitors):
         """
         This method is responsible for iterating over self.watched and handling
         state changes and updating self.watched with a new list of watched job
-        states. Subclasses can opt to override this directly (as older job runners will
-        initially) or just override check_watched_item and allow the list processing to
-        reuse the logic here.
+        states. Job states that are due for a status check are passed to
+        check_watched_items_batch() all at once.
+
+        If the ``max_poll_interval`` runner parameter is greater than 1, the
+        interval between status checks of a job is doubled (up to
+        ``max_poll_interval`` seconds) each time its state is found to be
+        unchanged, so that long running jobs are polled less frequently.
         """
-        new_watched = []
+        if self.runner_params.max_poll_interval <= 1:
+            self.watched = self.check_watched_items_batch(self.watched)
+            return
+        now = time.time()
+        due = []
+        not_due = []
         for async_job_state in self.watched:
+            if async_job_state.next_poll_time <= now:
+                due.append(async_job_state)
+            else:
+                not_due.append(async_job_state)
+        if not due:
+            return
+        previous_states = {id(ajs): (ajs.old_state, ajs.running) for ajs in due}
+        new_watched = self.check_watched_items_batch(due)
+        now = time.time()
+        for async_job_state in new_watched:
+            if previous_states.get(id(async_job_state)) == (async_job_state.old_state, async_job_state.running):
+                async_job_state.poll_interval = min(async_job_state.poll_interval * 2, self.runner_params.max_poll_interval)
+            else:
+                async_job_state.poll_interval = 1
+            async_job_state.next_poll_time = now + async_job_state.poll_interval
+        self.watched = not_due + new_watched
+
+    def check_watched_items_batch(self, job_states):
+        """
+        Check the state of all of the ``job_states`` at once and handle any
+        state changes, returning the list of job states that should continue
+        to be watched. Subclasses able to query the state of many jobs with a
+        single call to the resource manager should override this method,
+        otherwise it calls check_watched_item() for each job state.
+        """
+        new_watched = []
+        for async_job_state in job_states:
             new_async_job_state = self.check_watched_item(async_job_state)
             if new_async_job_state:
                 new_watched.append(new_async_job_state)
-        self.watched = new_watched
+        return new_watched
 
-    # Subclasses should implement this unless they override check_watched_items all together.
+    # Subclasses should implement this unless they override check_watched_items_batch all together.
     def check_watched_item(self, job_state):
         raise NotImplementedError()
 
+    def check_waiting_for_output(self):
+        """
+        Called by the monitor thread to retry finishing jobs whose output
+        files had not appeared when finish_job() was last called.
+        """
+        try:
+            while True:
+                self.waiting_for_output.append(self.output_wait_queue.get_nowait())
+        except Empty:
+            pass
+        now = time.time()
+        still_waiting = []
+        for (retry_time, job_state) in self.waiting_for_output:
+            if retry_time <= now:
+                self.mark_as_finished(job_state)
+            else:
+                still_waiting.append((retry_time, job_state))
+        self.waiting_for_output = still_waiting
+
     def finish_job(self, job_state):
         """
         Get the output/error for a finished job, pass to `job_wrapper.finish`
         and cleanup all the job's temporary files.
+
+        Return False if the job's output files haven't appeared yet and
+        finishing it was deferred to a later call, True otherwise.
         """
         galaxy_id_tag = job_state.job_wrapper.get_id_tag()
         external_job_id = job_state.job_id
@@ -752,35 +846,35 @@ class AsynchronousJobRunner(BaseJobRunner, Monitors):
         # To ensure that files below are readable, ownership must be reclaimed first
         job_state.job_wrapper.reclaim_ownership()
 
-        # wait for the files to appear
-        which_try = 0
+        # If the files have not appeared yet, hand the job back to the
+        # monitor thread to retry later rather than sleeping in this worker.
         collect_output_success = True
-        while which_try < self.app.config.retry_job_output_collection + 1:
-            try:
-                with open(job_state.output_file, "rb") as stdout_file, open(job_state.error_file, 'rb') as stderr_file:
-                    stdout = self._job_io_for_db(stdout_file)
-                    stderr = self._job_io_for_db(stderr_file)
-                break
-            except Exception as e:
-                if which_try == self.app.config.retry_job_output_collection:
-                    stdout = ''
-                    stderr = job_state.runner_states.JOB_OUTPUT_NOT_RETURNED_FROM_CLUSTER
-                    log.error('(%s/%s) %s: %s', galaxy_id_tag, external_job_id, stderr, unicodify(e))
-                    collect_output_success = False
-                else:
-                    time.sleep(1)
-                which_try += 1
+        try:
+            with open(job_state.output_file, "rb") as stdout_file, open(job_state.error_file, 'rb') as stderr_file:
+                stdout = self._job_io_for_db(stdout_file)
+                stderr = self._job_io_for_db(stderr_file)
+        except Exception as e:
+            if job_state.output_collection_try < self.app.config.retry_job_output_collection:
+                job_state.output_collection_try += 1
+                log.debug('(%s/%s) Job output not yet available, will retry: %s', galaxy_id_tag, external_job_id, unicodify(e))
+                self.output_wait_queue.put((time.time() + 1, job_state))
+                return False
+            stdout = ''
+            stderr = job_state.runner_states.JOB_OUTPUT_NOT_RETURNED_FROM_CLUSTER
+            log.error('(%s/%s) %s: %s', galaxy_id_tag, external_job_id, stderr, unicodify(e))
+            collect_output_success = False
 
         if not collect_output_success:
             job_state.fail_message = stderr
             job_state.runner_state = job_state.runner_states.JOB_OUTPUT_NOT_RETURNED_FROM_CLUSTER
             self.mark_as_failed(job_state)
-            return
+            return True
 
         self._finish_or_resubmit_job(job_state, stdout, stderr, job_id=galaxy_id_tag, external_job_id=external_job_id)
+        return True
 
     def mark_as_finished(self, job_state):
-        self.work_queue.put((self.finish_job, job_state))
+        self.finish_queue.put((self.finish_job, job_state))
 
     def mark_as_failed(self, job_state):
         self.work_queue.put((self.fail_job, job_state))
@@ -227,8 +227,11 @@ class ChronosJobRunner(AsynchronousJobRunner):
 
     @handle_exception_call
     def finish_job(self, job_state):
-        super(ChronosJobRunner, self).finish_job(job_state)
+        if not super(ChronosJobRunner, self).finish_job(job_state):
+            # Finishing was deferred, the chronos job is deleted once it's done
+            return False
         self._chronos_client.delete(job_state.job_id)
+        return True
 
     def parse_destination_params(self, params):
         parsed_params = {}
@@ -143,16 +143,17 @@ class ShellJobRunner(AsynchronousJobRunner):
             log.error(stderr)
             return cmd_out.returncode, cmd_out.stdout
 
-    def check_watched_items(self):
+    def check_watched_items_batch(self, watched):
         """
-        Called by the monitor thread to look at each watched job and deal
-        with state changes.
+        Called by the monitor thread to look at watched jobs and deal with
+        state changes. The states of all jobs at a destination are queried
+        with a single status command.
         """
         new_watched = []
 
-        job_states = self.__get_job_states()
+        job_states = self.__get_job_states(watched)
 
-        for ajs in self.watched:
+        for ajs in watched:
             external_job_id = ajs.job_id
             id_tag = ajs.job_wrapper.get_id_tag()
             old_state = ajs.old_state
@@ -187,11 +188,10 @@ class ShellJobRunner(AsynchronousJobRunner):
                 if external_metadata:
                     self.work_queue.put((self.handle_metadata_externally, ajs))
                 log.debug('(%s/%s) job execution finished, running job wrapper finish method' % (id_tag, external_job_id))
-                self.work_queue.put((self.finish_job, ajs))
+                self.mark_as_finished(ajs)
             else:
                 new_watched.append(ajs)
-        # Replace the watch list with the updated version
-        self.watched = new_watched
+        return new_watched
 
     def handle_metadata_externally(self, ajs):
         self._handle_metadata_externally(ajs.job_wrapper, resolve_requirements=True)
@@ -206,11 +206,11 @@ class ShellJobRunner(AsynchronousJobRunner):
                 ajs.runner_state = JobState.runner_states.MEMORY_LIMIT_REACHED
                 ajs.fail_message = "Tool failed due to insufficient memory. Try with more memory."
 
-    def __get_job_states(self):
+    def __get_job_states(self, watched):
         job_destinations = {}
         job_states = {}
         # unique the list of destinations
-        for ajs in self.watched:
+        for ajs in watched:
             if ajs.job_destination.id not in job_destinations:
                 job_destinations[ajs.job_destination.id] = dict(job_destination=ajs.job_destination, job_ids=[ajs.job_id])
             else:
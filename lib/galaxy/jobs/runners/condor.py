@@ -180,13 +180,13 @@ class CondorJobRunner(AsynchronousJobRunner):
         # Add to our 'queue' of jobs to monitor
         self.monitor_queue.put(cjs)
 
-    def check_watched_items(self):
+    def check_watched_items_batch(self, watched):
         """
-        Called by the monitor thread to look at each watched job and deal
+        Called by the monitor thread to look at watched jobs and deal
         with state changes.
         """
         new_watched = []
-        for cjs in self.watched:
+        for cjs in watched:
             job_id = cjs.job_id
             galaxy_id_tag = cjs.job_wrapper.get_id_tag()
             self.__old_state_paths(cjs)  # remove in 21.01
@@ -224,17 +224,16 @@ class CondorJobRunner(AsynchronousJobRunner):
                     if external_metadata:
                         self._handle_metadata_externally(cjs.job_wrapper, resolve_requirements=True)
                     log.debug("(%s/%s) job has completed" % (galaxy_id_tag, job_id))
-                    self.work_queue.put((self.finish_job, cjs))
+                    self.mark_as_finished(cjs)
                 continue
             if job_failed:
                 log.debug("(%s/%s) job failed" % (galaxy_id_tag, job_id))
                 cjs.failed = True
-                self.work_queue.put((self.finish_job, cjs))
+                self.mark_as_finished(cjs)
                 continue
             cjs.runnning = job_running
             new_watched.append(cjs)
-        # Replace the watch list with the updated version
-        self.watched = new_watched
+        return new_watched
 
     def stop_job(self, job_wrapper):
         """Attempts to delete a job from the DRM queue"""
@@ -261,7 +260,7 @@ class CondorJobRunner(AsynchronousJobRunner):
                     if external_metadata:
                         self._handle_metadata_externally(cjs.job_wrapper, resolve_requirements=True)
                     log.debug("(%s/%s) job has completed" % (galaxy_id_tag, external_id))
-                    self.work_queue.put((self.finish_job, cjs))
+                    self.mark_as_finished(cjs)
             except Exception as e:
                 log.warning("stop_job(): %s: trying to stop container failed. (%s)" % (job.id, e))
                 try:
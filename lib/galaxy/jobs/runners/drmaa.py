@@ -253,22 +253,31 @@ class DRMAAJobRunner(AsynchronousJobRunner):
             if external_metadata:
                 self._handle_metadata_externally(ajs.job_wrapper, resolve_requirements=True)
             if ajs.job_wrapper.get_state() != model.Job.states.DELETED:
-                self.work_queue.put((self.finish_job, ajs))
+                self.mark_as_finished(ajs)
 
-    def check_watched_item(self, ajs, new_watched):
+    def _get_job_states(self, watched):
+        """
+        Return the DRMAA states of as many of the ``watched`` jobs as can be
+        queried at once, by external job id. DRMAA itself only reports the
+        status of one job at a time, runners for DRMs with a bulk status
+        command override this, jobs not returned are checked one by one.
+        """
+        return {}
+
+    def check_watched_item(self, ajs, new_watched, job_states=None):
         """
         look at a single watched job, determine its state, and deal with errors
-        that could happen in this process. to be called from check_watched_items()
+        that could happen in this process. to be called from check_watched_items_batch()
         returns the state or None if exceptions occurred
         in the latter case the job is appended to new_watched if a
         1 drmaa.InternalException,
         2 drmaa.InvalidJobExceptionnot, or
         3 drmaa.DrmCommunicationException occurred
-        (which causes the job to be tested again in the next iteration of check_watched_items)
+        (which causes the job to be tested again in the next iteration of check_watched_items_batch)
         - the job is finished as errored if any other exception occurs
         - the job is finished OK or errored after the maximum number of retries
           depending on the exception
-        Note that None is returned in all cases where the loop in check_watched_items
+        Note that None is returned in all cases where the loop in check_watched_items_batch
         is to be continued
         """
         external_job_id = ajs.job_id
@@ -276,7 +285,10 @@ class DRMAAJobRunner(AsynchronousJobRunner):
         state = None
         try:
             assert external_job_id not in (None, 'None'), '(%s/%s) Invalid job id' % (galaxy_id_tag, external_job_id)
-            state = self.ds.job_status(external_job_id)
+            if job_states and external_job_id in job_states:
+                state = job_states[external_job_id]
+            else:
+                state = self.ds.job_status(external_job_id)
             # Reset exception retries
             for retry_exception in RETRY_EXCEPTIONS_LOWER:
                 setattr(ajs, retry_exception + '_retries', 0)
@@ -294,7 +306,7 @@ class DRMAAJobRunner(AsynchronousJobRunner):
                     return None
             if self.runner_params[state_param] == model.Job.states.OK:
                 log.warning("(%s/%s) job will now be finished OK", galaxy_id_tag, external_job_id)
-                self.work_queue.put((self.finish_job, ajs))
+                self.mark_as_finished(ajs)
             elif self.runner_params[state_param] == model.Job.states.ERROR:
                 log.warning("(%s/%s) job will now be errored", galaxy_id_tag, external_job_id)
                 self.work_queue.put((self.fail_job, ajs))
@@ -314,17 +326,22 @@ class DRMAAJobRunner(AsynchronousJobRunner):
             return None
         return state
 
-    def check_watched_items(self):
+    def check_watched_items_batch(self, watched):
         """
-        Called by the monitor thread to look at each watched job and deal
+        Called by the monitor thread to look at watched jobs and deal
         with state changes.
         """
         new_watched = []
-        for ajs in self.watched:
+        try:
+            job_states = self._get_job_states(watched)
+        except Exception:
+            log.exception("Unable to query the state of watched jobs at once, checking them one by one")
+            job_states = {}
+        for ajs in watched:
             external_job_id = ajs.job_id
             galaxy_id_tag = ajs.job_wrapper.get_id_tag()
             old_state = ajs.old_state
-            state = self.check_watched_item(ajs, new_watched)
+            state = self.check_watched_item(ajs, new_watched, job_states=job_states)
             if state is None:
                 continue
             if state != old_state:
@@ -346,8 +363,7 @@ class DRMAAJobRunner(AsynchronousJobRunner):
                 continue
             ajs.old_state = state
             new_watched.append(ajs)
-        # Replace the watch list with the updated version
-        self.watched = new_watched
+        return new_watched
 
     def stop_job(self, job_wrapper):
         """Attempts to delete a job from the DRM queue"""
@@ -581,7 +581,9 @@ class KubernetesJobRunner(AsynchronousJobRunner):
             self.monitor_queue.put(ajs)
 
     def finish_job(self, job_state):
-        super(KubernetesJobRunner, self).finish_job(job_state)
+        if not super(KubernetesJobRunner, self).finish_job(job_state):
+            # Finishing was deferred, the k8s job is cleaned up once it's done
+            return False
         jobs = Job.objects(self._pykube_api).filter(selector="app=" + job_state.job_id,
                                                     namespace=self.runner_params['k8s_namespace'])
         if len(jobs.response['items']) != 1:
@@ -589,3 +591,4 @@ class KubernetesJobRunner(AsynchronousJobRunner):
                         " in job id '%s'", job_state.job_id)
         job = Job(self._pykube_api, jobs.response['items'][0])
         self.__cleanup_k8s_job(job)
+        return True
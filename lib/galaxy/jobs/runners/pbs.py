@@ -344,15 +344,15 @@ class PBSJobRunner(AsynchronousJobRunner):
         # Add to our 'queue' of jobs to monitor
         self.monitor_queue.put(job_state)
 
-    def check_watched_items(self):
+    def check_watched_items_batch(self, watched):
         """
-        Called by the monitor thread to look at each watched job and deal
+        Called by the monitor thread to look at watched jobs and deal
         with state changes.
         """
         new_watched = []
         # reduce pbs load by batching status queries
-        (failures, statuses) = self.check_all_jobs()
-        for pbs_job_state in self.watched:
+        (failures, statuses) = self.check_all_jobs(watched)
+        for pbs_job_state in watched:
             job_id = pbs_job_state.job_id
             galaxy_job_id = pbs_job_state.job_wrapper.get_id_tag()
             old_state = pbs_job_state.old_state
@@ -376,7 +376,7 @@ class PBSJobRunner(AsynchronousJobRunner):
                     if errno == 15001:
                         # 15001 == job not in queue
                         log.debug("(%s/%s) PBS job has left queue" % (galaxy_job_id, job_id))
-                        self.work_queue.put((self.finish_job, pbs_job_state))
+                        self.mark_as_finished(pbs_job_state)
                     else:
                         # Unhandled error, continue to monitor
                         log.info("(%s/%s) PBS state check resulted in error (%d): %s" % (galaxy_job_id, job_id, errno, text))
@@ -410,23 +410,24 @@ class PBSJobRunner(AsynchronousJobRunner):
                 except AttributeError:
                     # No exit_status, can't verify proper completion so we just have to assume success.
                     log.debug("(%s/%s) PBS job has completed" % (galaxy_job_id, job_id))
-                self.work_queue.put((self.finish_job, pbs_job_state))
+                self.mark_as_finished(pbs_job_state)
                 continue
             pbs_job_state.old_state = status.job_state
             new_watched.append(pbs_job_state)
-        # Replace the watch list with the updated version
-        self.watched = new_watched
+        return new_watched
 
-    def check_all_jobs(self):
+    def check_all_jobs(self, watched=None):
         """
         Returns a list of servers that failed to be contacted and a dict
         of "job_id : status" pairs (where status is a bunchified version
         of the API's structure.
         """
+        if watched is None:
+            watched = self.watched
         servers = []
         failures = []
         statuses = {}
-        for pbs_job_state in self.watched:
+        for pbs_job_state in watched:
             pbs_server_name = self.__get_pbs_server(pbs_job_state.job_destination.params)
             if pbs_server_name not in servers:
                 servers.append(pbs_server_name)
@@ -33,6 +33,9 @@ SLURM_TOP_WARNING_RES = (
     SLURM_CGROUP_RE,
 )
 
+# Job ids per squeue call, keeps the command line short
+SLURM_SQUEUE_CHUNK_SIZE = 500
+
 # These messages are returned to the user
 OUT_OF_MEMORY_MSG = 'This job was terminated because it used more memory than it was allocated.'
 PROBABLY_OUT_OF_MEMORY_MSG = 'This job was cancelled probably because it used more memory than it was allocated.'
@@ -42,6 +45,51 @@ class SlurmJobRunner(DRMAAJobRunner):
     runner_name = "SlurmRunner"
     restrict_job_name_length = False
 
+    def _get_job_states(self, watched):
+        """
+        Get the states of the queued and running watched jobs with a single
+        squeue call per cluster. Jobs that have left the queue, or that
+        squeue failed to list, are checked through DRMAA, which reports how
+        they ended.
+        """
+        states = {
+            'PENDING': self.drmaa_job_states.QUEUED_ACTIVE,
+            'CONFIGURING': self.drmaa_job_states.QUEUED_ACTIVE,
+            'REQUEUED': self.drmaa_job_states.QUEUED_ACTIVE,
+            'REQUEUE_HOLD': self.drmaa_job_states.SYSTEM_ON_HOLD,
+            'RUNNING': self.drmaa_job_states.RUNNING,
+            'COMPLETING': self.drmaa_job_states.RUNNING,
+            'SUSPENDED': self.drmaa_job_states.SYSTEM_SUSPENDED,
+        }
+        job_ids_by_cluster = {}
+        for ajs in watched:
+            if ajs.job_id in (None, 'None'):
+                continue
+            # custom slurm-drmaa-with-cluster-support job id syntax
+            job_id, _, cluster = ajs.job_id.partition('.')
+            job_ids_by_cluster.setdefault(cluster, {})[job_id] = ajs.job_id
+        job_states = {}
+        for cluster, external_job_ids in job_ids_by_cluster.items():
+            job_ids = list(external_job_ids)
+            for i in range(0, len(job_ids), SLURM_SQUEUE_CHUNK_SIZE):
+                cmd = ['squeue', '-h', '-o', '%i %T']
+                if cluster:
+                    cmd.extend(['-M', cluster])
+                cmd.extend(['-j', ','.join(job_ids[i:i + SLURM_SQUEUE_CHUNK_SIZE])])
+                try:
+                    stdout = commands.execute(cmd)
+                except commands.CommandLineException as e:
+                    # squeue fails if some of the jobs already left the
+                    # queue, the jobs it didn't list are checked through DRMAA
+                    log.debug("squeue didn't list all watched jobs: %s", (e.stderr or '').strip())
+                    stdout = e.stdout or ''
+                for line in stdout.splitlines():
+                    # With -M, the jobs are listed after a "CLUSTER: <name>" line
+                    fields = line.split()
+                    if len(fields) == 2 and fields[0] in external_job_ids and fields[1] in states:
+                        job_states[external_job_ids[fields[0]]] = states[fields[1]]
+        return job_states
+
     def _complete_terminal_job(self, ajs, drmaa_state, **kwargs):
         def _get_slurm_state_with_sacct(job_id, cluster):
             cmd = ['sacct', '-n', '-o', 'state%-32']
@@ -161,6 +161,8 @@ class WorkflowsManager(object):
         if cancelled:
             trans.sa_session.add(workflow_invocation)
             trans.sa_session.flush()
+            # Wake the invocation if it is parked, so the cancellation is handled right away
+            trans.app.workflow_scheduling_manager.notify_invocation(workflow_invocation.id)
         else:
             # TODO: More specific exception?
             raise exceptions.MessageException("Cannot cancel an inactive workflow invocation.")
@@ -192,6 +194,7 @@ class WorkflowsManager(object):
         workflow_invocation_step.action = performed_action
         trans.sa_session.add(workflow_invocation_step)
         trans.sa_session.flush()
+        trans.app.workflow_scheduling_manager.notify_invocation(workflow_invocation.id)
         return workflow_invocation_step
 
     def build_invocations_query(self, trans, stored_workflow_id=None, history_id=None, user_id=None, include_terminal=True, limit=None):
@@ -34,7 +34,8 @@ from sqlalchemy import (
     text,
     true,
     type_coerce,
-    types)
+    types,
+    union)
 from sqlalchemy.ext import hybrid
 from sqlalchemy.orm import (
     aliased,
@@ -5040,7 +5041,8 @@ class WorkflowInvocation(UsesCreateAndUpdateTime, Dictifiable, RepresentById):
     def poll_active_workflow_ids(
         sa_session,
         scheduler=None,
-        handler=None
+        handler=None,
+        include_history_id=False,
     ):
         and_conditions = [
             or_(
@@ -5053,13 +5055,97 @@ class WorkflowInvocation(UsesCreateAndUpdateTime, Dictifiable, RepresentById):
         if handler is not None:
             and_conditions.append(WorkflowInvocation.handler == handler)
 
+        columns = [WorkflowInvocation.id]
+        if include_history_id:
+            columns.append(WorkflowInvocation.history_id)
         query = sa_session.query(
-            WorkflowInvocation.id
+            *columns
         ).filter(and_(*and_conditions)).order_by(WorkflowInvocation.table.c.id.asc())
         # Immediately just load all ids into memory so time slicing logic
         # is relatively intutitive.
         return [wid for wid in query.all()]
 
+    @staticmethod
+    def poll_workflow_ids_for_job(sa_session, job_id):
+        """
+        Return the ids of the workflow invocations that may be scheduled further
+        now that job ``job_id`` is terminal: invocations with a step that created
+        the job or with an input the job produced, and the invocations these are
+        subworkflow invocations of.
+        """
+        step_table = WorkflowInvocationStep.table
+        icjja_table = ImplicitCollectionJobsJobAssociation.table
+        output_table = JobToOutputDatasetAssociation.table
+        output_collection_table = JobToOutputDatasetCollectionAssociation.table
+        implicit_output_collection_table = JobToImplicitOutputDatasetCollectionAssociation.table
+        element_table = DatasetCollectionElement.table
+        hdca_table = HistoryDatasetCollectionAssociation.table
+        input_table = WorkflowRequestToInputDatasetAssociation.table
+        input_collection_table = WorkflowRequestToInputDatasetCollectionAssociation.table
+        subworkflow_table = WorkflowInvocationToSubworkflowInvocationAssociation.table
+
+        implicit_collection_jobs_ids = select([icjja_table.c.implicit_collection_jobs_id]).where(icjja_table.c.job_id == job_id)
+        output_dataset_ids = select([output_table.c.dataset_id]).where(output_table.c.job_id == job_id)
+        output_collection_ids = select([output_collection_table.c.dataset_collection_id]).where(output_collection_table.c.job_id == job_id)
+        # Collections the job created or has outputs in
+        collection_ids = union(
+            select([implicit_output_collection_table.c.dataset_collection_id]).where(implicit_output_collection_table.c.job_id == job_id),
+            select([element_table.c.dataset_collection_id]).where(element_table.c.hda_id.in_(output_dataset_ids)),
+        )
+        query = union(
+            select([step_table.c.workflow_invocation_id]).where(
+                or_(
+                    step_table.c.job_id == job_id,
+                    step_table.c.implicit_collection_jobs_id.in_(implicit_collection_jobs_ids),
+                )
+            ),
+            select([input_table.c.workflow_invocation_id]).where(input_table.c.dataset_id.in_(output_dataset_ids)),
+            select([input_collection_table.c.workflow_invocation_id]).where(
+                or_(
+                    input_collection_table.c.dataset_collection_id.in_(output_collection_ids),
+                    input_collection_table.c.dataset_collection_id.in_(
+                        select([hdca_table.c.id]).where(hdca_table.c.collection_id.in_(collection_ids))
+                    ),
+                )
+            ),
+        )
+        workflow_invocation_ids = {row[0] for row in sa_session.execute(query)}
+        # Subworkflow invocations are scheduled by scheduling their parents
+        new_ids = workflow_invocation_ids
+        while new_ids:
+            query = select([subworkflow_table.c.workflow_invocation_id]).where(
+                subworkflow_table.c.subworkflow_invocation_id.in_(new_ids)
+            )
+            new_ids = {row[0] for row in sa_session.execute(query)} - workflow_invocation_ids
+            workflow_invocation_ids |= new_ids
+        return sorted(workflow_invocation_ids)
+
+    @staticmethod
+    def scheduling_progress(sa_session, workflow_invocation_id):
+        """
+        Return the ``(id, state, job count)`` of the steps of workflow invocation
+        ``workflow_invocation_id``, the job count is that of the implicit
+        collection jobs of steps that are not scheduled yet.
+        """
+        step_table = WorkflowInvocationStep.table
+        icjja_table = ImplicitCollectionJobsJobAssociation.table
+        query = select([
+            step_table.c.id,
+            step_table.c.state,
+            func.count(icjja_table.c.id),
+        ]).select_from(
+            step_table.outerjoin(
+                icjja_table,
+                and_(
+                    icjja_table.c.implicit_collection_jobs_id == step_table.c.implicit_collection_jobs_id,
+                    or_(step_table.c.state.is_(None), step_table.c.state != WorkflowInvocationStep.states.SCHEDULED),
+                )
+            )
+        ).where(
+            step_table.c.workflow_invocation_id == workflow_invocation_id
+        ).group_by(step_table.c.id, step_table.c.state).order_by(step_table.c.id)
+        return [tuple(row) for row in sa_session.execute(query)]
+
     def add_output(self, workflow_output, step, output_object):
         if not hasattr(output_object, "history_content_type"):
             # assuming this is a simple type, just JSON-ify it and stick in the database. In the future
@@ -0,0 +1,96 @@
+"""Send and receive database notifications (PostgreSQL ``LISTEN``/``NOTIFY``).
+
+Notifications allow Galaxy processes to wake each other up on database events
+instead of polling. Other database engines do not support notifications, in
+which case sending is a no-op and listeners are never started, so callers must
+keep a (slower) polling fallback.
+"""
+import logging
+import select
+import threading
+
+from sqlalchemy import text
+
+log = logging.getLogger(__name__)
+
+
+def supports_notifications(engine):
+    return 'postgres' in engine.dialect.name
+
+
+def send_notification(sa_session, channel, payload=''):
+    """Send ``payload`` on ``channel`` if the database supports notifications.
+
+    Notifications sent inside a transaction are delivered when it commits.
+
+    :returns: bool -- True if a notification was sent, False otherwise.
+    """
+    if not supports_notifications(sa_session.bind):
+        return False
+    statement = text("SELECT pg_notify(:channel, :payload)").execution_options(autocommit=True)
+    sa_session.execute(statement, {'channel': channel, 'payload': payload})
+    return True
+
+
+class DatabaseNotificationListener(object):
+    """Listen for notifications on a channel and call ``callback(payload)`` for
+    each one received. A dedicated database connection is held open (outside
+    of the connection pool) for as long as the listener is active.
+    """
+
+    def __init__(self, engine, channel, callback, poll_interval=5, retry_interval=10):
+        self.engine = engine
+        self.channel = channel
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self.exit = threading.Event()
+        self.thread = None
+
+    @property
+    def supported(self):
+        return supports_notifications(self.engine)
+
+    def start(self):
+        if self.thread is None and self.supported:
+            self.thread = threading.Thread(target=self.listen, name="database_notification_listener_%s.thread" % self.channel)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def shutdown(self):
+        self.exit.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def listen(self):
+        while not self.exit.is_set():
+            try:
+                self._listen_on_connection()
+            except Exception:
+                log.exception("Error listening for notifications on channel '%s', reconnecting in %s seconds",
+                              self.channel, self.retry_interval)
+                self.exit.wait(self.retry_interval)
+
+    def _listen_on_connection(self):
+        connection = self.engine.raw_connection()
+        # The connection is in autocommit mode while listening, don't return it to the pool
+        connection.detach()
+        dbapi_connection = connection.connection
+        try:
+            dbapi_connection.set_isolation_level(0)
+            cursor = dbapi_connection.cursor()
+            cursor.execute('LISTEN "%s"' % self.channel)
+            log.debug("Listening for notifications on channel '%s'", self.channel)
+            while not self.exit.is_set():
+                if select.select([dbapi_connection], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    notification = dbapi_connection.notifies.pop(0)
+                    try:
+                        self.callback(notification.payload)
+                    except Exception:
+                        log.exception("Error handling notification on channel '%s'", self.channel)
+        finally:
+            dbapi_connection.close()
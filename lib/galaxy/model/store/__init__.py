@@ -1,6 +1,7 @@
 import abc
 import contextlib
 import datetime
+import hashlib
 import os
 import shutil
 import tarfile
@@ -30,6 +31,7 @@ ATTRS_FILENAME_IMPLICIT_COLLECTION_JOBS = 'implicit_collection_jobs_attrs.txt'
 ATTRS_FILENAME_COLLECTIONS = 'collections_attrs.txt'
 ATTRS_FILENAME_EXPORT = 'export_attrs.txt'
 ATTRS_FILENAME_LIBRARIES = 'libraries_attrs.txt'
+MANIFEST_FILENAME = 'manifest-sha256.txt'
 GALAXY_EXPORT_VERSION = "2"
 
 
@@ -1022,16 +1024,6 @@ class DirectoryModelExportStore(ModelExportStore):
     def serialize_files(self, dataset, as_dict):
         if self.export_files is None:
             return None
-        elif self.export_files == "symlink":
-            add = os.symlink
-        elif self.export_files == "copy":
-            def add(src, dest):
-                if os.path.isdir(src):
-                    shutil.copytree(src, dest)
-                else:
-                    shutil.copyfile(src, dest)
-
-        export_directory = self.export_directory
 
         _, include_files = self.included_datasets[dataset.id]
         if not include_files:
@@ -1051,7 +1043,6 @@ class DirectoryModelExportStore(ModelExportStore):
             pass
 
         dir_name = 'datasets'
-        dir_path = os.path.join(export_directory, dir_name)
         dataset_hid = as_dict['hid']
         assert dataset_hid, as_dict
 
@@ -1064,15 +1055,9 @@ class DirectoryModelExportStore(ModelExportStore):
             return
 
         if file_name:
-            if not os.path.exists(dir_path):
-                os.makedirs(dir_path)
-
             target_filename = get_export_dataset_filename(as_dict['name'], as_dict['extension'], dataset_hid)
             arcname = os.path.join(dir_name, target_filename)
-
-            src = file_name
-            dest = os.path.join(export_directory, arcname)
-            add(src, dest)
+            self._add_file(file_name, arcname)
             as_dict['file_name'] = arcname
 
         if extra_files_path:
@@ -1083,13 +1068,26 @@ class DirectoryModelExportStore(ModelExportStore):
 
             if len(file_list):
                 arcname = os.path.join(dir_name, 'extra_files_path_%s' % dataset_hid)
-                add(extra_files_path, os.path.join(export_directory, arcname))
+                self._add_file(extra_files_path, arcname)
                 as_dict['extra_files_path'] = arcname
             else:
                 as_dict['extra_files_path'] = ''
 
         self.dataset_id_to_path[dataset.dataset.id] = (as_dict.get("file_name"), as_dict.get("extra_files_path"))
 
+    def _add_file(self, src, arcname):
+        """Add file or directory ``src`` to the export as ``arcname``."""
+        dest = os.path.join(self.export_directory, arcname)
+        dest_dir = os.path.dirname(dest)
+        if not os.path.exists(dest_dir):
+            os.makedirs(dest_dir)
+        if self.export_files == "symlink":
+            os.symlink(src, dest)
+        elif os.path.isdir(src):
+            shutil.copytree(src, dest)
+        else:
+            shutil.copyfile(src, dest)
+
     def exported_key(self, obj):
         return self.serialization_options.get_identifier(self.security, obj)
 
@@ -1355,17 +1353,59 @@ class DirectoryModelExportStore(ModelExportStore):
 
 
 class TarModelExportStore(DirectoryModelExportStore):
+    """
+    Export to a tar archive. Dataset files are streamed into the archive as
+    they are serialized rather than staged in the export directory, which
+    only holds the attribute files and a manifest of the files' checksums.
+    """
 
     def __init__(self, out_file, gzip=True, **kwds):
         self.gzip = gzip
         self.out_file = out_file
+        self.archive = None
+        self.file_checksums = []
         temp_output_dir = tempfile.mkdtemp()
         super(TarModelExportStore, self).__init__(temp_output_dir, **kwds)
 
+    def _open_archive(self):
+        if self.archive is None:
+            self.archive = tarfile.open(self.out_file, "w:gz" if self.gzip else "w", dereference=True)
+        return self.archive
+
+    def _add_file(self, src, arcname):
+        archive = self._open_archive()
+        if os.path.isdir(src):
+            archive.add(src, arcname=arcname, recursive=False)
+            for name in sorted(os.listdir(src)):
+                self._add_file(os.path.join(src, name), os.path.join(arcname, name))
+            return
+        tarinfo = archive.gettarinfo(src, arcname=arcname)
+        with open(src, 'rb') as fh:
+            reader = HashingReader(fh, hashlib.sha256())
+            archive.addfile(tarinfo, reader)
+        self.file_checksums.append((arcname, reader.hexdigest()))
+
     def _finalize(self):
         super(TarModelExportStore, self)._finalize()
-        tar_export_directory(self.export_directory, self.out_file, self.gzip)
-        shutil.rmtree(self.export_directory)
+        with open(os.path.join(self.export_directory, MANIFEST_FILENAME), 'w') as manifest:
+            for arcname, checksum in self.file_checksums:
+                manifest.write("%s  %s\n" % (checksum, arcname))
+        archive = self._open_archive()
+        for export_path in sorted(os.listdir(self.export_directory)):
+            archive.add(os.path.join(self.export_directory, export_path), arcname=export_path)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        exported = False
+        try:
+            rval = super(TarModelExportStore, self).__exit__(exc_type, exc_val, exc_tb)
+            exported = exc_type is None
+            return rval
+        finally:
+            if self.archive is not None:
+                self.archive.close()
+                if not exported:
+                    os.remove(self.out_file)
+            shutil.rmtree(self.export_directory)
 
 
 class BagDirectoryModelExportStore(DirectoryModelExportStore):
@@ -1405,6 +1445,22 @@ def tar_export_directory(export_directory, out_file, gzip):
             history_archive.add(os.path.join(export_directory, export_path), arcname=export_path)
 
 
+class HashingReader(object):
+    """File-like wrapper updating ``hasher`` with the data read from ``fileobj``."""
+
+    def __init__(self, fileobj, hasher):
+        self.fileobj = fileobj
+        self.hasher = hasher
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.hasher.update(data)
+        return data
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+
 def get_export_dataset_filename(name, ext, hid):
     """
     Builds a filename for a dataset using its name an extension.
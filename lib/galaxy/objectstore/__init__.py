@@ -601,6 +601,80 @@ class DiskObjectStore(ConcreteObjectStore):
         return (float(st.f_blocks - st.f_bavail) / st.f_blocks) * 100
 
 
+class ObjectLocationCache(object):
+
+    """
+    Bounded cache of the id of the backend holding an object.
+
+    Lookups are keyed by the object and the arguments locating the file, not
+    finding an object in any backend is cached too but for a shorter time.
+    """
+
+    # Arguments of object store methods that change the file being located
+    location_kwds = ('base_dir', 'dir_only', 'extra_dir', 'extra_dir_at_root', 'alt_name', 'obj_dir')
+
+    def __init__(self, size, ttl, negative_ttl):
+        self.size = size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        # (object class, object id) -> {location arguments: (backend id, expiration time)}
+        self._locations = OrderedDict()
+
+    def _object_key(self, obj):
+        obj_id = getattr(obj, 'id', None)
+        if obj_id is None:
+            return None
+        return (obj.__class__.__name__, obj_id)
+
+    def _location_key(self, kwargs):
+        return tuple((kwd, kwargs[kwd]) for kwd in self.location_kwds if kwargs.get(kwd))
+
+    def get(self, obj, **kwargs):
+        """Return whether the location of `obj` is cached and the id of its backend (None if in none)."""
+        object_key = self._object_key(obj)
+        if object_key is None:
+            return False, None
+        with self._lock:
+            locations = self._locations.get(object_key)
+            location = locations and locations.get(self._location_key(kwargs))
+            if location is None:
+                return False, None
+            backend_id, expires = location
+            if expires < time.time():
+                del locations[self._location_key(kwargs)]
+                return False, None
+            self._locations.move_to_end(object_key)
+            return True, backend_id
+
+    def set(self, obj, backend_id, **kwargs):
+        """Record that `obj` is in backend `backend_id`, or in no backend if None."""
+        object_key = self._object_key(obj)
+        location_key = self._location_key(kwargs)
+        if object_key is None:
+            return
+        if backend_id is None:
+            # Extra files are written directly by jobs, only cache the
+            # absence of datasets, which are created through the object store
+            if location_key:
+                return
+            expires = time.time() + self.negative_ttl
+        else:
+            expires = time.time() + self.ttl
+        with self._lock:
+            self._locations.setdefault(object_key, {})[location_key] = (backend_id, expires)
+            self._locations.move_to_end(object_key)
+            while len(self._locations) > self.size:
+                self._locations.popitem(last=False)
+
+    def invalidate(self, obj):
+        """Forget the locations of `obj` and of its extra files."""
+        object_key = self._object_key(obj)
+        if object_key is not None:
+            with self._lock:
+                self._locations.pop(object_key, None)
+
+
 class NestedObjectStore(BaseObjectStore):
 
     """
@@ -609,10 +683,24 @@ class NestedObjectStore(BaseObjectStore):
     Example: DistributedObjectStore, HierarchicalObjectStore
     """
 
+    # Number of objects and seconds the backend holding an object is cached
+    # for, objects found in no backend are cached for `location_cache_negative_ttl`.
+    # Cached backends are trusted until they expire, unless an operation on
+    # them does not find the object. The cache is per process, so objects
+    # created by other processes may be reported missing for up to
+    # `location_cache_negative_ttl` seconds; lookups made to create or update
+    # objects don't use nor record their absence.
+    location_cache_size = 10000
+    location_cache_ttl = 300
+    location_cache_negative_ttl = 5
+
     def __init__(self, config, config_xml=None):
         """Extend `ObjectStore`'s constructor."""
         super(NestedObjectStore, self).__init__(config)
         self.backends = {}
+        self.location_cache = ObjectLocationCache(self.location_cache_size,
+                                                  self.location_cache_ttl,
+                                                  self.location_cache_negative_ttl)
 
     def shutdown(self):
         """For each backend, shuts them down."""
@@ -622,7 +710,7 @@ class NestedObjectStore(BaseObjectStore):
 
     def _exists(self, obj, **kwargs):
         """Determine if the `obj` exists in any of the backends."""
-        return self._call_method('_exists', obj, False, False, **kwargs)
+        return self._get_backend_id(obj, **kwargs) is not None
 
     def file_ready(self, obj, **kwargs):
         """Determine if the file for `obj` is ready to be used by any of the backends."""
@@ -642,7 +730,10 @@ class NestedObjectStore(BaseObjectStore):
 
     def _delete(self, obj, **kwargs):
         """For the first backend that has this `obj`, delete it."""
-        return self._call_method('_delete', obj, False, False, **kwargs)
+        try:
+            return self._call_method('_delete', obj, False, False, **kwargs)
+        finally:
+            self.location_cache.invalidate(obj)
 
     def _get_data(self, obj, **kwargs):
         """For the first backend that has this `obj`, get data from it."""
@@ -657,7 +748,11 @@ class NestedObjectStore(BaseObjectStore):
         if kwargs.get('create', False):
             self._create(obj, **kwargs)
             kwargs['create'] = False
-        return self._call_method('_update_from_file', obj, ObjectNotFound, True, **kwargs)
+        try:
+            return self._call_method('_update_from_file', obj, ObjectNotFound, True, **kwargs)
+        finally:
+            # The update may have created extra files
+            self.location_cache.invalidate(obj)
 
     def _get_object_url(self, obj, **kwargs):
         """For the first backend that has this `obj`, get its URL."""
@@ -674,12 +769,49 @@ class NestedObjectStore(BaseObjectStore):
         except AttributeError:
             return str(obj)
 
+    def _get_backend_id(self, obj, **kwargs):
+        """Return the id of the first backend with `obj`, or None if no backend has it."""
+        return self._locate_backend(obj, kwargs)
+
+    def _locate_backend(self, obj, kwargs, negative_cache=True):
+        """
+        Return the id of the first backend with `obj`, or None if no backend
+        has it. If `negative_cache` is False, `obj` being in no backend is
+        neither read from nor recorded in the location cache.
+        """
+        cached, backend_id = self.location_cache.get(obj, **kwargs)
+        if cached and (backend_id is not None or negative_cache):
+            return backend_id
+        backend_id = None
+        for id, store in self.backends.items():
+            if store.exists(obj, **kwargs):
+                backend_id = id
+                break
+        if backend_id is not None or negative_cache:
+            self.location_cache.set(obj, backend_id, **kwargs)
+        return backend_id
+
+    def _created_in(self, backend_id, obj, **kwargs):
+        """Record that `obj` was created in backend `backend_id`."""
+        self.location_cache.invalidate(obj)
+        self.location_cache.set(obj, backend_id, **kwargs)
+
     def _call_method(self, method, obj, default, default_is_exception,
             **kwargs):
         """Check all children object stores for the first one with the dataset."""
-        for store in self.backends.values():
-            if store.exists(obj, **kwargs):
-                return store.__getattribute__(method)(obj, **kwargs)
+        negative_cache = method != '_update_from_file'
+        backend_id = self._locate_backend(obj, kwargs, negative_cache)
+        if backend_id is not None:
+            try:
+                return self.backends[backend_id].__getattribute__(method)(obj, **kwargs)
+            except ObjectNotFound:
+                # The cached backend may no longer have the object if it was
+                # moved behind the object store's back, look for it again
+                self.location_cache.invalidate(obj)
+                relocated_id = self._locate_backend(obj, kwargs, negative_cache)
+                if relocated_id is None or relocated_id == backend_id:
+                    raise
+                return self.backends[relocated_id].__getattribute__(method)(obj, **kwargs)
         if default_is_exception:
             raise default('objectstore, _call_method failed: %s on %s, kwargs: %s'
                           % (method, self._repr_object_for_exception(obj), str(kwargs)))
@@ -831,7 +963,7 @@ class DistributedObjectStore(NestedObjectStore):
 
     def _create(self, obj, **kwargs):
         """The only method in which obj.object_store_id may be None."""
-        if obj.object_store_id is None or not self._exists(obj, **kwargs):
+        if obj.object_store_id is None or self._locate_backend(obj, kwargs, negative_cache=False) is None:
             if obj.object_store_id is None or obj.object_store_id not in self.backends:
                 try:
                     obj.object_store_id = random.choice(self.weighted_backend_ids)
@@ -846,6 +978,7 @@ class DistributedObjectStore(NestedObjectStore):
                 log.debug("Using preferred backend '%s' for creation of %s %s"
                           % (obj.object_store_id, obj.__class__.__name__, obj.id))
             self.backends[obj.object_store_id].create(obj, **kwargs)
+            self._created_in(obj.object_store_id, obj, **kwargs)
 
     def _call_method(self, method, obj, default, default_is_exception, **kwargs):
         object_store_id = self.__get_store_id_for(obj, **kwargs)
@@ -867,14 +1000,13 @@ class DistributedObjectStore(NestedObjectStore):
         # if this instance has been switched from a non-distributed to a
         # distributed object store, or if the object's store id is invalid,
         # try to locate the object
-        for id, store in self.backends.items():
-            if store.exists(obj, **kwargs):
-                log.warning('%s object with ID %s found in backend object store with ID %s'
-                            % (obj.__class__.__name__, obj.id, id))
-                obj.object_store_id = id
-                _create_object_in_session(obj)
-                return id
-        return None
+        id = self._get_backend_id(obj, **kwargs)
+        if id is not None:
+            log.warning('%s object with ID %s found in backend object store with ID %s'
+                        % (obj.__class__.__name__, obj.id, id))
+            obj.object_store_id = id
+            _create_object_in_session(obj)
+        return id
 
 
 class HierarchicalObjectStore(NestedObjectStore):
@@ -920,14 +1052,12 @@ class HierarchicalObjectStore(NestedObjectStore):
 
     def _exists(self, obj, **kwargs):
         """Check all child object stores."""
-        for store in self.backends.values():
-            if store.exists(obj, **kwargs):
-                return True
-        return False
+        return self._get_backend_id(obj, **kwargs) is not None
 
     def _create(self, obj, **kwargs):
         """Call the primary object store."""
         self.backends[0].create(obj, **kwargs)
+        self._created_in(0, obj, **kwargs)
 
 
 def type_to_object_store_class(store, fsmon=False):
@@ -5,8 +5,6 @@ Object Store plugin for the Microsoft Azure Block Blob Storage system
 import logging
 import os
 import shutil
-import threading
-import time
 from datetime import datetime
 
 try:
@@ -23,14 +21,15 @@ from galaxy.exceptions import (
 )
 from galaxy.util import (
     directory_hash_id,
-    umask_fix_perms
+    umask_fix_perms,
+    unicodify,
 )
 from galaxy.util.path import safe_relpath
-from galaxy.util.sleeper import Sleeper
-from ..objectstore import (
-    ConcreteObjectStore,
-    convert_bytes,
+from .caching import (
+    CacheMonitorMixin,
+    CachePulls,
 )
+from ..objectstore import ConcreteObjectStore
 
 NO_BLOBSERVICE_ERROR_MESSAGE = ("ObjectStore configured, but no azure.storage.blob dependency available."
                                 "Please install and properly configure azure.storage.blob or modify Object Store configuration.")
@@ -48,10 +47,12 @@ def parse_config_xml(config_xml):
         container_xml = config_xml.find('container')
         container_name = container_xml.get('name')
         max_chunk_size = int(container_xml.get('max_chunk_size', 250))  # currently unused
+        transfer_threads = int(container_xml.get('transfer_threads', 4))
 
         c_xml = config_xml.findall('cache')[0]
         cache_size = float(c_xml.get('size', -1))
         staging_path = c_xml.get('path', None)
+        cache_index_path = c_xml.get('index_path', None)
 
         tag, attrs = 'extra_dir', ('type', 'path')
         extra_dirs = config_xml.findall(tag)
@@ -68,10 +69,12 @@ def parse_config_xml(config_xml):
             'container': {
                 'name': container_name,
                 'max_chunk_size': max_chunk_size,
+                'transfer_threads': transfer_threads,
             },
             'cache': {
                 'size': cache_size,
                 'path': staging_path,
+                'index_path': cache_index_path,
             },
             'extra_dirs': extra_dirs,
         }
@@ -81,7 +84,7 @@ def parse_config_xml(config_xml):
         raise
 
 
-class AzureBlobObjectStore(ConcreteObjectStore):
+class AzureBlobObjectStore(ConcreteObjectStore, CacheMonitorMixin):
     """
     Object store that stores objects as blobs in an Azure Blob Container. A local
     cache exists that is used as an intermediate location for files between
@@ -93,6 +96,7 @@ class AzureBlobObjectStore(ConcreteObjectStore):
         super(AzureBlobObjectStore, self).__init__(config, config_dict)
 
         self.transfer_progress = 0
+        self.cache_pulls = CachePulls()
 
         auth_dict = config_dict["auth"]
         container_dict = config_dict["container"]
@@ -103,9 +107,11 @@ class AzureBlobObjectStore(ConcreteObjectStore):
 
         self.container_name = container_dict.get('name')
         self.max_chunk_size = container_dict.get('max_chunk_size', 250)  # currently unused
+        self.transfer_threads = container_dict.get('transfer_threads', 4)
 
         self.cache_size = cache_dict.get('size', -1)
         self.staging_path = cache_dict.get('path') or self.config.object_store_cache_path
+        self.cache_index_path = cache_dict.get('index_path')
 
         self._initialize()
 
@@ -115,15 +121,7 @@ class AzureBlobObjectStore(ConcreteObjectStore):
 
         self._configure_connection()
 
-        # Clean cache only if value is set in galaxy.ini
-        if self.cache_size != -1:
-            # Convert GBs to bytes for comparison
-            self.cache_size = self.cache_size * 1073741824
-            # Helper for interruptable sleep
-            self.sleeper = Sleeper()
-            self.cache_monitor_thread = threading.Thread(target=self.__cache_monitor)
-            self.cache_monitor_thread.start()
-            log.info("Cache cleaner manager started")
+        self._start_cache_monitor()
 
     def to_dict(self):
         as_dict = super(AzureBlobObjectStore, self).to_dict()
@@ -135,10 +133,12 @@ class AzureBlobObjectStore(ConcreteObjectStore):
             'container': {
                 'name': self.container_name,
                 'max_chunk_size': self.max_chunk_size,
+                'transfer_threads': self.transfer_threads,
             },
             'cache': {
                 'size': self.cache_size,
                 'path': self.staging_path,
+                'index_path': self.cache_index_path,
             }
         })
         return as_dict
@@ -239,16 +239,18 @@ class AzureBlobObjectStore(ConcreteObjectStore):
     def _in_cache(self, rel_path):
         """ Check if the given dataset is in the local cache. """
         cache_path = self._get_cache_path(rel_path)
-        return os.path.exists(cache_path)
+        return os.path.exists(cache_path) and not self.cache_pulls.in_progress(cache_path)
 
     def _pull_into_cache(self, rel_path):
         # Ensure the cache directory structure exists (e.g., dataset_#_files/)
         rel_path_dir = os.path.dirname(rel_path)
         if not os.path.exists(self._get_cache_path(rel_path_dir)):
             os.makedirs(self._get_cache_path(rel_path_dir))
-        # Now pull in the file
-        file_ok = self._download(rel_path)
+        # Now pull in the file, unless a concurrent pull of the same file does it
+        file_ok = self.cache_pulls.pull(self._get_cache_path(rel_path), self._download, rel_path)
         self._fix_permissions(self._get_cache_path(rel_path_dir))
+        if file_ok:
+            self._cache_updated(rel_path)
         return file_ok
 
     def _transfer_cb(self, complete, total):
@@ -264,12 +266,32 @@ class AzureBlobObjectStore(ConcreteObjectStore):
                 return False
             else:
                 self.transfer_progress = 0  # Reset transfer progress counter
-                self.service.get_blob_to_path(self.container_name, rel_path, local_destination, progress_callback=self._transfer_cb)
+                self.service.get_blob_to_path(self.container_name, rel_path, local_destination,
+                                              progress_callback=self._transfer_cb,
+                                              max_connections=self.transfer_threads,
+                                              validate_content=True)
                 return True
         except AzureHttpError:
             log.exception("Problem downloading '%s' from Azure", rel_path)
         return False
 
+    def _get_range(self, rel_path, start, count):
+        """
+        Return ``count`` bytes of blob ``rel_path`` from ``start`` or None if
+        the range couldn't be fetched.
+        """
+        if count == 0:
+            return b''
+        try:
+            blob = self.service.get_blob_to_bytes(self.container_name, rel_path, start_range=start, end_range=start + count - 1)
+            return blob.content
+        except AzureHttpError as e:
+            if e.status_code == 416:
+                # Range starts past the end of the blob
+                return b''
+            log.exception("Could not get range %s-%s of blob '%s' from Azure", start, start + count - 1, rel_path)
+        return None
+
     def _push_to_os(self, rel_path, source_file=None, from_string=None):
         """
         Push the file pointed to by ``rel_path`` to the object store naming the blob
@@ -296,7 +318,10 @@ class AzureBlobObjectStore(ConcreteObjectStore):
                 start_time = datetime.now()
                 log.debug("Pushing cache file '%s' of size %s bytes to '%s'", source_file, os.path.getsize(source_file), rel_path)
                 self.transfer_progress = 0  # Reset transfer progress counter
-                self.service.create_blob_from_path(self.container_name, rel_path, source_file, progress_callback=self._transfer_cb)
+                self.service.create_blob_from_path(self.container_name, rel_path, source_file,
+                                                   progress_callback=self._transfer_cb,
+                                                   max_connections=self.transfer_threads,
+                                                   validate_content=True)
                 end_time = datetime.now()
                 log.debug("Pushed cache file '%s' to blob '%s' (%s bytes transfered in %s sec)",
                           source_file, rel_path, os.path.getsize(source_file), end_time - start_time)
@@ -391,6 +416,7 @@ class AzureBlobObjectStore(ConcreteObjectStore):
             if not dir_only:
                 rel_path = os.path.join(rel_path, alt_name if alt_name else "dataset_%s.dat" % self._get_object_id(obj))
                 open(os.path.join(self.staging_path, rel_path), 'w').close()
+                self._cache_updated(rel_path)
                 self._push_to_os(rel_path, from_string='')
 
     def _empty(self, obj, **kwargs):
@@ -429,6 +455,7 @@ class AzureBlobObjectStore(ConcreteObjectStore):
             # but requires iterating through each individual blob in Azure and deleing it.
             if entire_dir and extra_dir:
                 shutil.rmtree(self._get_cache_path(rel_path))
+                self._cache_removed(rel_path, recursive=True)
                 blobs = self.service.list_blobs(self.container_name, prefix=rel_path)
                 for blob in blobs:
                     log.debug("Deleting from Azure: %s", blob)
@@ -437,6 +464,7 @@ class AzureBlobObjectStore(ConcreteObjectStore):
             else:
                 # Delete from cache first
                 os.unlink(self._get_cache_path(rel_path))
+                self._cache_removed(rel_path)
                 # Delete from S3 as well
                 if self._in_azure(rel_path):
                     log.debug("Deleting from Azure: %s", rel_path)
@@ -452,13 +480,19 @@ class AzureBlobObjectStore(ConcreteObjectStore):
         rel_path = self._construct_path(obj, **kwargs)
         # Check cache first and get file if not there
         if not self._in_cache(rel_path):
+            if count >= 0:
+                # Fetch only the requested range instead of the whole blob
+                data = self._get_range(rel_path, start, count)
+                if data is not None:
+                    return unicodify(data)
             self._pull_into_cache(rel_path)
-        # Read the file content from cache
-        data_file = open(self._get_cache_path(rel_path), 'r')
-        data_file.seek(start)
-        content = data_file.read(count)
-        data_file.close()
-        return content
+        else:
+            self._cache_accessed(rel_path)
+        # Read the file content from cache, as bytes like the ranged reads
+        with open(self._get_cache_path(rel_path), 'rb') as data_file:
+            data_file.seek(start)
+            content = data_file.read(count)
+        return unicodify(content)
 
     def _get_filename(self, obj, **kwargs):
         rel_path = self._construct_path(obj, **kwargs)
@@ -481,6 +515,7 @@ class AzureBlobObjectStore(ConcreteObjectStore):
         #     return cache_path
         # Check if the file exists in the cache first
         if self._in_cache(rel_path):
+            self._cache_accessed(rel_path)
             return cache_path
         # Check if the file exists in persistent storage and, if it does, pull it into cache
         elif self._exists(obj, **kwargs):
@@ -514,6 +549,7 @@ class AzureBlobObjectStore(ConcreteObjectStore):
                     log.exception("Trouble copying source file '%s' to cache '%s'", source_file, cache_file)
             else:
                 source_file = self._get_cache_path(rel_path)
+            self._cache_updated(rel_path)
 
             self._push_to_os(rel_path, source_file)
 
@@ -533,53 +569,6 @@ class AzureBlobObjectStore(ConcreteObjectStore):
     def _get_store_usage_percent(self):
         return 0.0
 
-    ##################
-    # Secret Methods #
-    ##################
-
-    def __cache_monitor(self):
-        time.sleep(2)  # Wait for things to load before starting the monitor
-        while self.running:
-            total_size = 0
-            # Is this going to be too expensive of an operation to be done frequently?
-            file_list = []
-            for dirpath, _, filenames in os.walk(self.staging_path):
-                for filename in filenames:
-                    filepath = os.path.join(dirpath, filename)
-                    file_size = os.path.getsize(filepath)
-                    total_size += file_size
-                    # Get the time given file was last accessed
-                    last_access_time = time.localtime(os.stat(filepath)[7])
-                    # Compose a tuple of the access time and the file path
-                    file_tuple = last_access_time, filepath, file_size
-                    file_list.append(file_tuple)
-            # Sort the file list (based on access time)
-            file_list.sort()
-            # Initiate cleaning once within 10% of the defined cache size?
-            cache_limit = self.cache_size * 0.9
-            if total_size > cache_limit:
-                log.info("Initiating cache cleaning: current cache size: %s; clean until smaller than: %s",
-                         convert_bytes(total_size), convert_bytes(cache_limit))
-                # How much to delete? If simply deleting up to the cache-10% limit,
-                # is likely to be deleting frequently and may run the risk of hitting
-                # the limit - maybe delete additional #%?
-                # For now, delete enough to leave at least 10% of the total cache free
-                delete_this_much = total_size - cache_limit
-                # Keep deleting datasets from file_list until deleted_amount does not
-                # exceed delete_this_much; start deleting from the front of the file list,
-                # which assumes the oldest files come first on the list.
-                deleted_amount = 0
-                for entry in enumerate(file_list):
-                    if deleted_amount < delete_this_much:
-                        deleted_amount += entry[2]
-                        os.remove(entry[1])
-                        # Debugging code for printing deleted files' stats
-                        # folder, file_name = os.path.split(f[1])
-                        # file_date = time.strftime("%m/%d/%y %H:%M:%S", f[0])
-                        # log.debug("%s. %-25s %s, size %s (deleted %s/%s)" \
-                        #     % (i, file_name, convert_bytes(f[2]), file_date, \
-                        #     convert_bytes(deleted_amount), convert_bytes(delete_this_much)))
-                    else:
-                        log.debug("Cache cleaning done. Total space freed: %s", convert_bytes(deleted_amount))
-
-            self.sleeper.sleep(30)  # Test cache size every 30 seconds?
+    def shutdown(self):
+        self.running = False
+        self._shutdown_cache_monitor()
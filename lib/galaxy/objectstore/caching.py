@@ -0,0 +1,452 @@
+"""Utilities for managing the local cache of object stores backed by remote services.
+
+Cached files, their sizes and last access times are tracked in an SQLite index
+that the object stores update as files are pulled, written, accessed and
+deleted, so keeping the cache under its size limit doesn't require walking
+and stat-ing the whole cache. It is reconciled with the cache directory only
+occasionally.
+
+By default the index is stored in the cache directory and shared by all the
+Galaxy processes using the cache. Since the cache may be on a network file
+system shared by several hosts, this index uses a rollback journal rather
+than SQLite's write-ahead log, which requires shared memory. The index can
+instead be stored on a local file system (the ``index_path`` attribute of the
+``<cache>`` element), in which case it only tracks the files pulled by the
+processes of that host between reconciliations. If the index can't be used
+the cache is cleaned by walking the cache directory as before.
+
+Concurrent pulls of the same file into the cache, from this or other
+processes sharing the cache, are coordinated so that only one of them
+downloads the file while the others wait for it.
+"""
+import errno
+import fcntl
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from operator import itemgetter
+
+from galaxy.util.sleeper import Sleeper
+from ..objectstore import convert_bytes
+
+log = logging.getLogger(__name__)
+
+# Start cleaning the cache once it reaches this fraction of its size limit
+CACHE_LIMIT_FACTOR = 0.9
+# Suffix of the files locking cache paths being pulled
+LOCK_SUFFIX = '.lock'
+# Name of the index in the cache directory, SQLite adds files with this prefix
+INDEX_FILENAME = '.cache_index.sqlite'
+
+
+class CacheIndex(object):
+    """
+    Index of the files in a cache directory with their sizes and last access
+    times, stored in ``index_path``, which must be on a local file system, or
+    by default in the cache directory. Each change is a single write
+    transaction, so processes sharing the index can update it concurrently.
+    """
+
+    def __init__(self, cache_path, index_path=None):
+        self.cache_path = cache_path
+        if index_path is None:
+            index_path = os.path.join(cache_path, INDEX_FILENAME)
+            # The write-ahead log doesn't work on network file systems
+            journal_mode = 'DELETE'
+        else:
+            journal_mode = 'WAL'
+        index_dir = os.path.dirname(os.path.abspath(index_path))
+        if not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(index_path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=%s" % journal_mode)
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (path TEXT PRIMARY KEY, size INTEGER, atime REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime)")
+            # Total size of the entries, kept up to date by each change to the entries
+            conn.execute("CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY, size INTEGER)")
+            conn.execute("INSERT OR IGNORE INTO totals (id, size) VALUES (0, 0)")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            # Take the write lock up front rather than upgrading a read lock,
+            # which fails instead of waiting when another process writes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    @property
+    def total_size(self):
+        with self._lock:
+            return self._conn.execute("SELECT size FROM totals WHERE id = 0").fetchone()[0]
+
+    def add(self, path):
+        """Record the current size of file ``path`` and that it was just accessed."""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return self.remove(path)
+        with self._transaction() as conn:
+            previous = conn.execute("SELECT size FROM entries WHERE path = ?", (path,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO entries (path, size, atime) VALUES (?, ?, ?)", (path, size, time.time()))
+            conn.execute("UPDATE totals SET size = size + ? WHERE id = 0", (size - (previous[0] if previous else 0),))
+
+    def touch(self, path):
+        """Record that ``path`` was just accessed, adding it to the index if needed."""
+        with self._lock:
+            touched = self._conn.execute("UPDATE entries SET atime = ? WHERE path = ?", (time.time(), path)).rowcount
+        if not touched and os.path.isfile(path):
+            self.add(path)
+
+    def remove(self, path, recursive=False):
+        """Remove ``path``, or all the paths under it if ``recursive``, from the index."""
+        if recursive:
+            where, args = "path = ? OR path LIKE ? ESCAPE '\\'", (path, _like_prefix(path))
+        else:
+            where, args = "path = ?", (path,)
+        with self._transaction() as conn:
+            removed = conn.execute("SELECT SUM(size) FROM entries WHERE %s" % where, args).fetchone()[0]
+            if removed is not None:
+                conn.execute("DELETE FROM entries WHERE %s" % where, args)
+                conn.execute("UPDATE totals SET size = size - ? WHERE id = 0", (removed,))
+
+    def least_recently_used(self, limit=100):
+        """Return up to ``limit`` (path, size, atime) tuples, least recently used first."""
+        with self._lock:
+            return self._conn.execute("SELECT path, size, atime FROM entries ORDER BY atime LIMIT ?", (limit,)).fetchall()
+
+    def update_access_time(self, path, atime):
+        with self._lock:
+            self._conn.execute("UPDATE entries SET atime = ? WHERE path = ? AND atime < ?", (atime, path, atime))
+
+    def reconcile(self):
+        """Replace the content of the index with the files found in the cache directory."""
+        entries = _walk_cache(self.cache_path)
+        with self._transaction() as conn:
+            # Keep access times recorded since the walk started if they are more recent
+            recorded = dict(conn.execute("SELECT path, atime FROM entries").fetchall())
+            conn.execute("DELETE FROM entries")
+            conn.executemany(
+                "INSERT INTO entries (path, size, atime) VALUES (?, ?, ?)",
+                ((path, size, max(atime, recorded.get(path, atime))) for path, size, atime in entries)
+            )
+            conn.execute("UPDATE totals SET size = ? WHERE id = 0", (sum(entry[1] for entry in entries),))
+
+
+def _walk_cache(cache_path):
+    """Return (path, size, atime) tuples for the files in ``cache_path``."""
+    entries = []
+    for dirpath, _, filenames in os.walk(cache_path):
+        for filename in filenames:
+            if filename.endswith(LOCK_SUFFIX) or filename.startswith(INDEX_FILENAME):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_atime))
+    return entries
+
+
+def _like_prefix(path):
+    prefix = path.rstrip(os.sep) + os.sep
+    return prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+class CacheMonitor(object):
+    """
+    Keep the files in a cache directory under ``cache_size`` bytes by deleting
+    the least recently used ones, based on a ``CacheIndex`` of the directory.
+    If the index can't be opened or fails, ``index`` is None and the cache
+    directory is walked to find the files to delete instead.
+    """
+
+    def __init__(self, cache_path, cache_size, interval=30, reconcile_interval=3600, index_path=None):
+        self.cache_path = cache_path
+        self.cache_size = cache_size
+        self.interval = interval
+        self.reconcile_interval = reconcile_interval
+        try:
+            self.index = CacheIndex(cache_path, index_path=index_path)
+        except sqlite3.Error:
+            self.index = None
+            log.exception("Failed to open the index of object store cache '%s', cleaning it by walking the cache "
+                          "directory instead", cache_path)
+        self.running = False
+        self.sleeper = Sleeper()
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._monitor, name="CacheMonitor.monitor_thread")
+        self.thread.daemon = True
+        self.thread.start()
+        log.info("Cache cleaner manager started")
+
+    def shutdown(self):
+        self.running = False
+        if self.thread:
+            log.debug("Shutting down thread")
+            self.sleeper.wake()
+            self.thread.join(5)
+
+    def _monitor(self):
+        time.sleep(2)  # Wait for things to load before starting the monitor
+        last_reconcile = None
+        while self.running:
+            try:
+                if self.index is not None and (
+                        last_reconcile is None or time.time() - last_reconcile > self.reconcile_interval):
+                    self.index.reconcile()
+                    last_reconcile = time.time()
+                self.check()
+            except sqlite3.Error:
+                self.index_failed()
+            except Exception:
+                log.exception("Failed to clean object store cache at '%s'", self.cache_path)
+            self.sleeper.sleep(self.interval)
+
+    def index_failed(self):
+        """Stop using the index after an error using it, e.g. if it is corrupted or can't be locked."""
+        if self.index is not None:
+            log.exception("Failed to use the index of object store cache '%s' at '%s', cleaning it by walking the "
+                          "cache directory instead", self.cache_path, self.index.index_path)
+            self.index = None
+
+    def check(self):
+        """Clean the cache if it is within 10% of its size limit."""
+        if self.index is None:
+            entries = _walk_cache(self.cache_path)
+            total_size = sum(entry[1] for entry in entries)
+        else:
+            total_size = self.index.total_size
+        cache_limit = self.cache_size * CACHE_LIMIT_FACTOR
+        if total_size > cache_limit:
+            log.info("Initiating cache cleaning: current cache size: %s; clean until smaller than: %s",
+                     convert_bytes(total_size), convert_bytes(cache_limit))
+            # For now, delete enough to leave at least 10% of the total cache free
+            if self.index is None:
+                self._clean_entries(sorted(entries, key=itemgetter(2)), total_size - cache_limit)
+            else:
+                self.clean(total_size - cache_limit)
+
+    def _clean_entries(self, entries, delete_this_much):
+        """
+        Delete the files of the (path, size, atime) ``entries``, in order,
+        until the size of the deleted files is greater than
+        ``delete_this_much`` bytes.
+        """
+        deleted_amount = 0
+        for path, size, _ in entries:
+            if deleted_amount >= delete_this_much:
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    log.exception("Failed to remove cached file '%s'", path)
+                continue
+            deleted_amount += size
+        log.debug("Cache cleaning done. Total space freed: %s", convert_bytes(deleted_amount))
+        return deleted_amount
+
+    def clean(self, delete_this_much):
+        """
+        Delete the least recently used files until the size of the deleted
+        files is greater than ``delete_this_much`` bytes. Files accessed by
+        other processes since their last access was recorded are kept.
+        """
+        deleted_amount = 0
+        while deleted_amount < delete_this_much:
+            entries = self.index.least_recently_used()
+            if not entries:
+                break
+            for path, size, atime in entries:
+                try:
+                    disk_atime = os.stat(path).st_atime
+                except OSError:
+                    self.index.remove(path)
+                    continue
+                if disk_atime > atime:
+                    self.index.update_access_time(path, disk_atime)
+                    continue
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    # Another process sharing the cache may have removed it first
+                    if e.errno != errno.ENOENT:
+                        log.exception("Failed to remove cached file '%s'", path)
+                self.index.remove(path)
+                deleted_amount += size
+                if deleted_amount >= delete_this_much:
+                    break
+        log.debug("Cache cleaning done. Total space freed: %s", convert_bytes(deleted_amount))
+        return deleted_amount
+
+
+class CacheMonitorMixin(object):
+    """
+    Keep the index of an object store's cache monitor up to date, object
+    stores using it must define ``staging_path``, ``cache_size`` (in GB, -1
+    meaning unlimited) and ``_get_cache_path``, and may define
+    ``cache_index_path``.
+    """
+    cache_monitor = None
+    cache_index_path = None
+
+    def _start_cache_monitor(self):
+        # Clean cache only if value is set in galaxy.ini
+        if self.cache_size != -1:
+            # Convert GBs to bytes for comparison
+            self.cache_size = self.cache_size * 1073741824
+            self.cache_monitor = CacheMonitor(self.staging_path, self.cache_size, index_path=self.cache_index_path)
+            self.cache_monitor.start()
+
+    def _shutdown_cache_monitor(self):
+        if self.cache_monitor:
+            self.cache_monitor.shutdown()
+
+    def _cache_updated(self, rel_path):
+        """Record that ``rel_path`` was written to the cache."""
+        self._update_cache_index('add', rel_path)
+
+    def _cache_accessed(self, rel_path):
+        """Record that ``rel_path`` was read from the cache."""
+        self._update_cache_index('touch', rel_path)
+
+    def _cache_removed(self, rel_path, recursive=False):
+        """Record that ``rel_path`` was removed from the cache."""
+        self._update_cache_index('remove', rel_path, recursive=recursive)
+
+    def _update_cache_index(self, method, rel_path, **kwd):
+        index = self.cache_monitor.index if self.cache_monitor else None
+        if index is not None:
+            try:
+                getattr(index, method)(self._get_cache_path(rel_path), **kwd)
+            except sqlite3.Error:
+                self.cache_monitor.index_failed()
+
+
+class CachePulls(object):
+    """
+    Make concurrent pulls of the same file into a cache wait for a single
+    download. Pulls are serialized per cache path with a lock for the threads
+    of this process and an ``flock`` on a lock file next to the cached file for
+    other processes, a pull that finds the file in the cache once it holds both
+    locks doesn't download it again.
+
+    The pulling process writes its pid into the lock file and removes it once
+    the pull is over, so a lock file with a pid that isn't locked by anyone
+    was left by a process that died while pulling, and the file it was
+    pulling is downloaded again. The operating system releases the ``flock``
+    of dead processes, so such pulls don't block others.
+    """
+
+    def __init__(self):
+        # Number of downloads and of pulls served by another pull's download
+        self.downloads = 0
+        self.deduplicated = 0
+        self._lock = threading.Lock()
+        # cache path -> [lock, number of pulls using it]
+        self._path_locks = {}
+
+    def in_progress(self, cache_path):
+        """
+        Return True if ``cache_path`` is being pulled by this or another
+        process, or if a process died while pulling it.
+        """
+        with self._lock:
+            if cache_path in self._path_locks:
+                return True
+        return os.path.exists(cache_path + LOCK_SUFFIX)
+
+    def pull(self, cache_path, download, *args):
+        """
+        Call ``download(*args)`` to bring ``cache_path`` into the cache unless
+        a concurrent pull did it first and return whether the file was pulled.
+        A failed download doesn't leave anything at ``cache_path``.
+        """
+        path_lock = self._acquire_path_lock(cache_path)
+        try:
+            lock_fd, abandoned = self._acquire_file_lock(cache_path + LOCK_SUFFIX)
+            try:
+                if abandoned:
+                    log.warning("Pulling cache file '%s' again, a previous pull of it was interrupted", cache_path)
+                    _remove(cache_path)
+                elif os.path.exists(cache_path):
+                    with self._lock:
+                        self.deduplicated += 1
+                    log.debug("Cache file '%s' was pulled by a concurrent request", cache_path)
+                    return True
+                with self._lock:
+                    self.downloads += 1
+                pulled = False
+                try:
+                    pulled = download(*args)
+                finally:
+                    if not pulled:
+                        _remove(cache_path)
+                return pulled
+            finally:
+                # Remove the lock file before unlocking it so that waiters
+                # holding it open know the pull is over, see _acquire_file_lock
+                _remove(cache_path + LOCK_SUFFIX)
+                os.close(lock_fd)
+        finally:
+            self._release_path_lock(cache_path, path_lock)
+
+    def _acquire_file_lock(self, lock_path):
+        """
+        Lock ``lock_path`` and return its file descriptor and whether it was
+        left behind by a pull that didn't complete.
+        """
+        while True:
+            fd = os.open(lock_path, os.O_CREAT | os.O_RDWR)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # The lock file may have been removed by the pull holding it while
+            # waiting for it, in which case the lock is stale
+            try:
+                if os.fstat(fd).st_ino == os.stat(lock_path).st_ino:
+                    abandoned = os.fstat(fd).st_size > 0
+                    os.ftruncate(fd, 0)
+                    os.write(fd, str(os.getpid()).encode())
+                    return fd, abandoned
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    os.close(fd)
+                    raise
+            os.close(fd)
+
+    def _acquire_path_lock(self, cache_path):
+        with self._lock:
+            path_lock = self._path_locks.setdefault(cache_path, [threading.Lock(), 0])
+            path_lock[1] += 1
+        path_lock[0].acquire()
+        return path_lock
+
+    def _release_path_lock(self, cache_path, path_lock):
+        path_lock[0].release()
+        with self._lock:
+            path_lock[1] -= 1
+            if not path_lock[1]:
+                del self._path_locks[cache_path]
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
@@ -6,7 +6,6 @@ import multiprocessing
 import os
 import shutil
 import subprocess
-import threading
 import time
 from datetime import datetime
 
@@ -24,12 +23,16 @@ from galaxy.util import (
     directory_hash_id,
     string_as_bool,
     umask_fix_perms,
+    unicodify,
     which,
 )
 from galaxy.util.path import safe_relpath
-from galaxy.util.sleeper import Sleeper
-from .s3_multipart_upload import multipart_upload
-from ..objectstore import ConcreteObjectStore, convert_bytes
+from .caching import (
+    CacheMonitorMixin,
+    CachePulls,
+)
+from .s3_multipart_upload import multipart_download, multipart_upload
+from ..objectstore import ConcreteObjectStore
 
 NO_BOTO_ERROR_MESSAGE = ("S3/Swift object store configured, but no boto dependency available."
                          "Please install and properly configure boto or modify object store configuration.")
@@ -58,6 +61,7 @@ def parse_config_xml(config_xml):
         host = cn_xml.get('host', None)
         port = int(cn_xml.get('port', 6000))
         multipart = string_as_bool(cn_xml.get('multipart', 'True'))
+        transfer_threads = int(cn_xml.get('transfer_threads', 4))
         is_secure = string_as_bool(cn_xml.get('is_secure', 'True'))
         conn_path = cn_xml.get('conn_path', '/')
 
@@ -65,6 +69,7 @@ def parse_config_xml(config_xml):
         cache_size = float(c_xml.get('size', -1))
 
         staging_path = c_xml.get('path', None)
+        cache_index_path = c_xml.get('index_path', None)
 
         tag, attrs = 'extra_dir', ('type', 'path')
         extra_dirs = config_xml.findall(tag)
@@ -88,12 +93,14 @@ def parse_config_xml(config_xml):
                 'host': host,
                 'port': port,
                 'multipart': multipart,
+                'transfer_threads': transfer_threads,
                 'is_secure': is_secure,
                 'conn_path': conn_path,
             },
             'cache': {
                 'size': cache_size,
                 'path': staging_path,
+                'index_path': cache_index_path,
             },
             'extra_dirs': extra_dirs,
         }
@@ -119,18 +126,20 @@ class CloudConfigMixin(object):
                 'host': self.host,
                 'port': self.port,
                 'multipart': self.multipart,
+                'transfer_threads': self.transfer_threads,
                 'is_secure': self.is_secure,
                 'conn_path': self.conn_path,
             },
             'cache': {
                 'size': self.cache_size,
                 'path': self.staging_path,
+                'index_path': self.cache_index_path,
             },
             'enable_cache_monitor': False,
         }
 
 
-class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
+class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin, CacheMonitorMixin):
     """
     Object store that stores objects as items in an AWS S3 bucket. A local
     cache exists that is used as an intermediate location for files between
@@ -142,6 +151,7 @@ class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
         super(S3ObjectStore, self).__init__(config, config_dict)
 
         self.transfer_progress = 0
+        self.cache_pulls = CachePulls()
 
         auth_dict = config_dict['auth']
         bucket_dict = config_dict['bucket']
@@ -159,11 +169,13 @@ class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
         self.host = connection_dict.get('host', None)
         self.port = connection_dict.get('port', 6000)
         self.multipart = connection_dict.get('multipart', True)
+        self.transfer_threads = connection_dict.get('transfer_threads', 4)
         self.is_secure = connection_dict.get('is_secure', True)
         self.conn_path = connection_dict.get('conn_path', '/')
 
         self.cache_size = cache_dict.get('size', -1)
         self.staging_path = cache_dict.get('path') or self.config.object_store_cache_path
+        self.cache_index_path = cache_dict.get('index_path')
 
         extra_dirs = dict(
             (e['type'], e['path']) for e in config_dict.get('extra_dirs', []))
@@ -183,7 +195,8 @@ class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
                          'host': self.host,
                          'port': self.port,
                          'use_rr': self.use_rr,
-                         'conn_path': self.conn_path}
+                         'conn_path': self.conn_path,
+                         'transfer_threads': self.transfer_threads}
 
         self._configure_connection()
         self._bucket = self._get_bucket(self.bucket)
@@ -195,15 +208,8 @@ class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
             self.use_axel = False
 
     def start_cache_monitor(self):
-        # Clean cache only if value is set in galaxy.ini
-        if self.cache_size != -1 and self.enable_cache_monitor:
-            # Convert GBs to bytes for comparison
-            self.cache_size = self.cache_size * 1073741824
-            # Helper for interruptable sleep
-            self.sleeper = Sleeper()
-            self.cache_monitor_thread = threading.Thread(target=self.__cache_monitor)
-            self.cache_monitor_thread.start()
-            log.info("Cache cleaner manager started")
+        if self.enable_cache_monitor:
+            self._start_cache_monitor()
 
     def _configure_connection(self):
         log.debug("Configuring S3 Connection")
@@ -218,70 +224,6 @@ class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
         as_dict.update(self._config_to_dict())
         return as_dict
 
-    def __cache_monitor(self):
-        time.sleep(2)  # Wait for things to load before starting the monitor
-        while self.running:
-            total_size = 0
-            # Is this going to be too expensive of an operation to be done frequently?
-            file_list = []
-            for dirpath, _, filenames in os.walk(self.staging_path):
-                for filename in filenames:
-                    filepath = os.path.join(dirpath, filename)
-                    file_size = os.path.getsize(filepath)
-                    total_size += file_size
-                    # Get the time given file was last accessed
-                    last_access_time = time.localtime(os.stat(filepath)[7])
-                    # Compose a tuple of the access time and the file path
-                    file_tuple = last_access_time, filepath, file_size
-                    file_list.append(file_tuple)
-            # Sort the file list (based on access time)
-            file_list.sort()
-            # Initiate cleaning once within 10% of the defined cache size?
-            cache_limit = self.cache_size * 0.9
-            if total_size > cache_limit:
-                log.info("Initiating cache cleaning: current cache size: %s; clean until smaller than: %s",
-                         convert_bytes(total_size), convert_bytes(cache_limit))
-                # How much to delete? If simply deleting up to the cache-10% limit,
-                # is likely to be deleting frequently and may run the risk of hitting
-                # the limit - maybe delete additional #%?
-                # For now, delete enough to leave at least 10% of the total cache free
-                delete_this_much = total_size - cache_limit
-                self.__clean_cache(file_list, delete_this_much)
-            self.sleeper.sleep(30)  # Test cache size every 30 seconds?
-
-    def __clean_cache(self, file_list, delete_this_much):
-        """ Keep deleting files from the file_list until the size of the deleted
-        files is greater than the value in delete_this_much parameter.
-
-        :type file_list: list
-        :param file_list: List of candidate files that can be deleted. This method
-            will start deleting files from the beginning of the list so the list
-            should be sorted accordingly. The list must contains 3-element tuples,
-            positioned as follows: position 0 holds file last accessed timestamp
-            (as time.struct_time), position 1 holds file path, and position 2 has
-            file size (e.g., (<access time>, /mnt/data/dataset_1.dat), 472394)
-
-        :type delete_this_much: int
-        :param delete_this_much: Total size of files, in bytes, that should be deleted.
-        """
-        # Keep deleting datasets from file_list until deleted_amount does not
-        # exceed delete_this_much; start deleting from the front of the file list,
-        # which assumes the oldest files come first on the list.
-        deleted_amount = 0
-        for entry in file_list:
-            if deleted_amount < delete_this_much:
-                deleted_amount += entry[2]
-                os.remove(entry[1])
-                # Debugging code for printing deleted files' stats
-                # folder, file_name = os.path.split(f[1])
-                # file_date = time.strftime("%m/%d/%y %H:%M:%S", f[0])
-                # log.debug("%s. %-25s %s, size %s (deleted %s/%s)" \
-                #     % (i, file_name, convert_bytes(f[2]), file_date, \
-                #     convert_bytes(deleted_amount), convert_bytes(delete_this_much)))
-            else:
-                log.debug("Cache cleaning done. Total space freed: %s", convert_bytes(deleted_amount))
-                return
-
     def _get_bucket(self, bucket_name):
         """ Sometimes a handle to a bucket is not established right away so try
         it a few times. Raise error is connection is not established. """
@@ -386,7 +328,7 @@ class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
         """ Check if the given dataset is in the local cache and return True if so. """
         # log.debug("------ Checking cache for rel_path %s" % rel_path)
         cache_path = self._get_cache_path(rel_path)
-        return os.path.exists(cache_path)
+        return os.path.exists(cache_path) and not self.cache_pulls.in_progress(cache_path)
         # TODO: Part of checking if a file is in cache should be to ensure the
         # size of the cached file matches that on S3. Once the upload tool explicitly
         # creates, this check sould be implemented- in the mean time, it's not
@@ -416,9 +358,11 @@ class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
         rel_path_dir = os.path.dirname(rel_path)
         if not os.path.exists(self._get_cache_path(rel_path_dir)):
             os.makedirs(self._get_cache_path(rel_path_dir))
-        # Now pull in the file
-        file_ok = self._download(rel_path)
+        # Now pull in the file, unless a concurrent pull of the same file does it
+        file_ok = self.cache_pulls.pull(self._get_cache_path(rel_path), self._download, rel_path)
         self._fix_permissions(self._get_cache_path(rel_path_dir))
+        if file_ok:
+            self._cache_updated(rel_path)
         return file_ok
 
     def _transfer_cb(self, complete, total):
@@ -440,15 +384,36 @@ class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
                 ret_code = subprocess.call(['axel', '-a', '-n', ncores, url])
                 if ret_code == 0:
                     return True
+            elif self.multipart and key.size >= 10 * 1e6:
+                log.debug("Pulled key '%s' into cache to %s in parts", rel_path, self._get_cache_path(rel_path))
+                multipart_download(self.s3server, key, self._get_cache_path(rel_path))
+                return True
             else:
                 log.debug("Pulled key '%s' into cache to %s", rel_path, self._get_cache_path(rel_path))
                 self.transfer_progress = 0  # Reset transfer progress counter
                 key.get_contents_to_filename(self._get_cache_path(rel_path), cb=self._transfer_cb, num_cb=10)
                 return True
-        except S3ResponseError:
+        except (S3ResponseError, IOError):
             log.exception("Problem downloading key '%s' from S3 bucket '%s'", rel_path, self._bucket.name)
         return False
 
+    def _get_range(self, rel_path, start, count):
+        """
+        Return ``count`` bytes of key ``rel_path`` from ``start`` or None if
+        the range couldn't be fetched.
+        """
+        if count == 0:
+            return b''
+        try:
+            key = Key(self._bucket, rel_path)
+            return key.get_contents_as_string(headers={'Range': 'bytes=%d-%d' % (start, start + count - 1)})
+        except S3ResponseError as e:
+            if e.status == 416:
+                # Range starts past the end of the key
+                return b''
+            log.exception("Could not get range %s-%s of key '%s' from S3", start, start + count - 1, rel_path)
+        return None
+
     def _push_to_os(self, rel_path, source_file=None, from_string=None):
         """
         Push the file pointed to by ``rel_path`` to the object store naming the key
@@ -570,6 +535,7 @@ class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
             if not dir_only:
                 rel_path = os.path.join(rel_path, alt_name if alt_name else "dataset_%s.dat" % self._get_object_id(obj))
                 open(os.path.join(self.staging_path, rel_path), 'w').close()
+                self._cache_updated(rel_path)
                 self._push_to_os(rel_path, from_string='')
 
     def _empty(self, obj, **kwargs):
@@ -609,6 +575,7 @@ class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
             # but requires iterating through each individual key in S3 and deleing it.
             if entire_dir and extra_dir:
                 shutil.rmtree(self._get_cache_path(rel_path))
+                self._cache_removed(rel_path, recursive=True)
                 results = self._bucket.get_all_keys(prefix=rel_path)
                 for key in results:
                     log.debug("Deleting key %s", key.name)
@@ -617,6 +584,7 @@ class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
             else:
                 # Delete from cache first
                 os.unlink(self._get_cache_path(rel_path))
+                self._cache_removed(rel_path)
                 # Delete from S3 as well
                 if self._key_exists(rel_path):
                     key = Key(self._bucket, rel_path)
@@ -633,13 +601,19 @@ class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
         rel_path = self._construct_path(obj, **kwargs)
         # Check cache first and get file if not there
         if not self._in_cache(rel_path):
+            if count >= 0:
+                # Fetch only the requested range instead of the whole object
+                data = self._get_range(rel_path, start, count)
+                if data is not None:
+                    return unicodify(data)
             self._pull_into_cache(rel_path)
-        # Read the file content from cache
-        data_file = open(self._get_cache_path(rel_path), 'r')
-        data_file.seek(start)
-        content = data_file.read(count)
-        data_file.close()
-        return content
+        else:
+            self._cache_accessed(rel_path)
+        # Read the file content from cache, as bytes like the ranged reads
+        with open(self._get_cache_path(rel_path), 'rb') as data_file:
+            data_file.seek(start)
+            content = data_file.read(count)
+        return unicodify(content)
 
     def _get_filename(self, obj, **kwargs):
         base_dir = kwargs.get('base_dir', None)
@@ -662,6 +636,7 @@ class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
         #     return cache_path
         # Check if the file exists in the cache first
         if self._in_cache(rel_path):
+            self._cache_accessed(rel_path)
             return cache_path
         # Check if the file exists in persistent storage and, if it does, pull it into cache
         elif self._exists(obj, **kwargs):
@@ -697,6 +672,7 @@ class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
                     log.exception("Trouble copying source file '%s' to cache '%s'", source_file, cache_file)
             else:
                 source_file = self._get_cache_path(rel_path)
+            self._cache_updated(rel_path)
             # Update the file on S3
             self._push_to_os(rel_path, source_file)
         else:
@@ -718,11 +694,7 @@ class S3ObjectStore(ConcreteObjectStore, CloudConfigMixin):
 
     def shutdown(self):
         self.running = False
-        thread = getattr(self, 'cache_monitor_thread', None)
-        if thread:
-            log.debug("Shutting down thread")
-            self.sleeper.wake()
-            thread.join(5)
+        self._shutdown_cache_monitor()
 
 
 class SwiftObjectStore(S3ObjectStore):
@@ -1,39 +1,58 @@
 #!/usr/bin/env python
 """
-Split large file into multiple pieces for upload to S3.
-This parallelizes the task over available cores using multiprocessing.
-Code mostly taken form CloudBioLinux.
+Transfer large files to and from S3 in multiple parts.
+Parts are read from and written to the file in place and transferred
+concurrently by a pool of threads, each using its own connection.
+Code originally taken form CloudBioLinux.
 """
 
-import glob
+import hashlib
+import logging
 import os
-import subprocess
+import tempfile
 import threading
+from concurrent.futures import (
+    FIRST_EXCEPTION,
+    ThreadPoolExecutor,
+    wait
+)
 
 try:
     import boto
+    from boto.exception import S3ResponseError
     from boto.s3.connection import S3Connection
+    from boto.s3.key import Key
 except ImportError:
     boto = None
 
+log = logging.getLogger(__name__)
 
-def mp_from_ids(s3server, mp_id, mp_keyname, mp_bucketname):
-    """Get the multipart upload from the bucket and multipart IDs.
+MB = 1024 * 1024
+# Number of times a part is attempted before giving up on a transfer
+PART_ATTEMPTS = 3
+DEFAULT_TRANSFER_THREADS = 4
 
-    This allows us to reconstitute a connection to the upload
-    from within multiprocessing functions.
-    """
+
+def connect(s3server):
+    """Open a new connection to the S3 server described by ``s3server``."""
     if s3server['host']:
-        conn = boto.connect_s3(aws_access_key_id=s3server['access_key'],
+        return boto.connect_s3(aws_access_key_id=s3server['access_key'],
                                aws_secret_access_key=s3server['secret_key'],
                                is_secure=s3server['is_secure'],
                                host=s3server['host'],
                                port=s3server['port'],
                                calling_format=boto.s3.connection.OrdinaryCallingFormat(),
                                path=s3server['conn_path'])
-    else:
-        conn = S3Connection(s3server['access_key'], s3server['secret_key'])
+    return S3Connection(s3server['access_key'], s3server['secret_key'])
+
+
+def mp_from_ids(s3server, mp_id, mp_keyname, mp_bucketname):
+    """Get the multipart upload from the bucket and multipart IDs.
 
+    This allows us to reconstitute a connection to the upload
+    from within multiprocessing functions.
+    """
+    conn = connect(s3server)
     bucket = conn.lookup(mp_bucketname)
     mp = boto.s3.multipart.MultiPartUpload(bucket)
     mp.key_name = mp_keyname
@@ -41,37 +60,137 @@ def mp_from_ids(s3server, mp_id, mp_keyname, mp_bucketname):
     return mp
 
 
-def transfer_part(s3server, mp_id, mp_keyname, mp_bucketname, i, part):
+def get_part_size(s3server, mb_size, split_num=5):
+    """Return the size in bytes of the parts used to transfer ``mb_size`` MB."""
+    # Split chunks so they are 5MB < chunk < 250MB(max_chunk_size)
+    return int(max(min(mb_size / (split_num * 2.0), s3server['max_chunk_size']), 5)) * MB
+
+
+def split_parts(size, part_size):
+    """Return (part number, offset, size) tuples covering ``size`` bytes."""
+    return [(i + 1, offset, min(part_size, size - offset)) for i, offset in enumerate(range(0, size, part_size))]
+
+
+def part_md5(path, offset, size):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as fh:
+        fh.seek(offset)
+        remaining = size
+        while remaining > 0:
+            data = fh.read(min(remaining, MB))
+            if not data:
+                break
+            md5.update(data)
+            remaining -= len(data)
+    return md5.hexdigest()
+
+
+def _attempt(failed, func, *args):
+    for attempt in range(1, PART_ATTEMPTS + 1):
+        try:
+            return func(*args)
+        except Exception:
+            if attempt == PART_ATTEMPTS or failed.is_set():
+                failed.set()
+                raise
+            log.warning("Failed to transfer part (attempt %s/%s), retrying", attempt, PART_ATTEMPTS, exc_info=True)
+
+
+def _run_parallel(s3server, func, args_list):
+    """Run ``func`` for each of ``args_list``, stopping at the first part that fails."""
+    threads = s3server.get('transfer_threads') or DEFAULT_TRANSFER_THREADS
+    failed = threading.Event()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(_attempt, failed, func, *args) for args in args_list]
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        # Parts being transferred are not retried anymore once one failed
+        for future in not_done:
+            future.cancel()
+        for future in done:
+            future.result()
+
+
+def transfer_part(s3server, mp_id, mp_keyname, mp_bucketname, source_file, part_num, offset, size):
     """Transfer a part of a multipart upload. Designed to be run in parallel.
+
+    boto sends the part's MD5 with it, so S3 rejects corrupted parts.
     """
     mp = mp_from_ids(s3server, mp_id, mp_keyname, mp_bucketname)
-    with open(part) as t_handle:
-        mp.upload_part_from_file(t_handle, i + 1)
-    os.remove(part)
+    with open(source_file, 'rb') as t_handle:
+        t_handle.seek(offset)
+        mp.upload_part_from_file(t_handle, part_num, size=size)
+
+
+def _resumable_upload(bucket, s3_key_name, part_count):
+    """Return the most recent unfinished upload to ``s3_key_name`` if it can be resumed."""
+    try:
+        uploads = [upload for upload in bucket.get_all_multipart_uploads(prefix=s3_key_name) if upload.key_name == s3_key_name]
+        if not uploads:
+            return None
+        mp = uploads[-1]
+        if any(part.part_number > part_count for part in mp):
+            # Parts were split differently, they can't be reused.
+            mp.cancel_upload()
+            return None
+        return mp
+    except S3ResponseError as e:
+        # e.g. the credentials may not allow listing multipart uploads
+        log.debug("Can't resume the upload of '%s', starting a new one: %s", s3_key_name, e)
+        return None
 
 
-def multipart_upload(s3server, bucket, s3_key_name, tarball, mb_size):
+def multipart_upload(s3server, bucket, s3_key_name, source_file, mb_size):
     """Upload large files using Amazon's multipart upload functionality.
-    """
-    def split_file(in_file, mb_size, split_num=5):
-        prefix = os.path.join(os.path.dirname(in_file),
-                              "%sS3PART" % (os.path.basename(s3_key_name)))
-        max_chunk = s3server['max_chunk_size']
-        # Split chunks so they are 5MB < chunk < 250MB(max_chunk_size)
-        split_size = int(max(min(mb_size / (split_num * 2.0), max_chunk), 5))
-        if not os.path.exists("%saa" % prefix):
-            cl = ["split", "-b%sm" % split_size, in_file, prefix]
-            subprocess.check_call(cl)
-        return sorted(glob.glob("%s*" % prefix))
-
-    mp = bucket.initiate_multipart_upload(s3_key_name,
-                                          reduced_redundancy=s3server['use_rr'])
-
-    for (i, part) in enumerate(split_file(tarball, mb_size)):
-        t = threading.Thread(
-            target=transfer_part,
-            args=(s3server, mp.id, mp.key_name, mp.bucket_name, i, part))
-        t.start()
-        t.join()
 
+    Parts already uploaded by an interrupted upload of the same content are
+    not transferred again.
+    """
+    parts = split_parts(os.path.getsize(source_file), get_part_size(s3server, mb_size))
+    mp = _resumable_upload(bucket, s3_key_name, len(parts))
+    if mp is None:
+        mp = bucket.initiate_multipart_upload(s3_key_name,
+                                              reduced_redundancy=s3server['use_rr'])
+        uploaded = {}
+    else:
+        uploaded = {part.part_number: part.etag.strip('"') for part in mp}
+        log.debug("Resuming upload of '%s' with %s parts uploaded", s3_key_name, len(uploaded))
+    args_list = [(s3server, mp.id, mp.key_name, mp.bucket_name, source_file, part_num, offset, size)
+                 for part_num, offset, size in parts
+                 if part_num not in uploaded or uploaded[part_num] != part_md5(source_file, offset, size)]
+    _run_parallel(s3server, transfer_part, args_list)
     mp.complete_upload()
+
+
+def transfer_range(s3server, bucket_name, key_name, dest, offset, size):
+    """Download ``size`` bytes of a key from ``offset`` into the same place of ``dest``."""
+    bucket = connect(s3server).get_bucket(bucket_name, validate=False)
+    with open(dest, 'r+b') as fh:
+        fh.seek(offset)
+        Key(bucket, key_name).get_file(fh, headers={'Range': 'bytes=%d-%d' % (offset, offset + size - 1)})
+        if fh.tell() != offset + size:
+            raise IOError("Downloaded %s bytes instead of %s from key '%s'" % (fh.tell() - offset, size, key_name))
+
+
+def multipart_download(s3server, key, dest):
+    """Download large key ``key`` to ``dest`` with concurrent ranged requests.
+
+    The download is verified against the key's size and, if the key wasn't
+    uploaded in parts, against its MD5 checksum. Parts are written to a
+    temporary file next to ``dest`` that is only moved to ``dest`` once
+    verified, so ``dest`` never holds a partial download.
+    """
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(dest), prefix='.%s.' % os.path.basename(dest))
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.truncate(key.size)
+        parts = split_parts(key.size, get_part_size(s3server, key.size / MB))
+        _run_parallel(s3server, transfer_range, [(s3server, key.bucket.name, key.name, partial, offset, size) for _, offset, size in parts])
+        if os.path.getsize(partial) != key.size:
+            raise IOError("Downloaded file '%s' doesn't have the size of key '%s'" % (dest, key.name))
+        etag = key.etag.strip('"')
+        if '-' not in etag and part_md5(partial, 0, key.size) != etag:
+            raise IOError("Downloaded file '%s' doesn't match the checksum of key '%s'" % (dest, key.name))
+        os.rename(partial, dest)
+    except Exception:
+        os.unlink(partial)
+        raise
@@ -4,6 +4,7 @@ from __future__ import absolute_import
 import logging
 
 from galaxy.tool_util.loader import load_tool_with_refereces
+from galaxy.util import xml_to_string
 from galaxy.util.yaml_util import ordered_load
 from .cwl import CwlToolSource
 from .interface import InputSource
@@ -46,6 +47,21 @@ def get_tool_source(config_file=None, xml_tree=None, enable_beta_formats=True, t
         return XmlToolSource(tree, source_path=config_file, macro_paths=macro_paths)
 
 
+def expand_tool_xml(config_file):
+    """Return ``(config_file, xml, macro_paths)`` for the XML tool at
+    ``config_file`` with its macros expanded, ``xml`` being None if the tool
+    can't be loaded.
+
+    The result can be pickled, so tools can be parsed in worker processes and
+    turned into tool sources with ``get_tool_source(xml_tree=...)``.
+    """
+    try:
+        tree, macro_paths = load_tool_with_refereces(config_file)
+        return config_file, xml_to_string(tree.getroot()), macro_paths
+    except Exception:
+        return config_file, None, None
+
+
 def get_tool_source_from_representation(tool_format, tool_representation):
     # TODO: make sure whatever is consuming this method uses ordered load.
     log.info("Loading dynamic tool - this is experimental - tool may not function in future.")
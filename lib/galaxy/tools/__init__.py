@@ -4,6 +4,7 @@ Classes encapsulating galaxy tools and tool configuration.
 import itertools
 import json
 import logging
+import multiprocessing
 import os
 import re
 import tarfile
@@ -11,6 +12,7 @@ import tempfile
 import threading
 from collections import OrderedDict
 from datetime import datetime
+from functools import wraps
 try:
     from pathlib import Path
 except ImportError:
@@ -49,6 +51,7 @@ from galaxy.tool_util.parser import (
     get_tool_source_from_representation,
     ToolOutputCollectionPart
 )
+from galaxy.tool_util.parser.factory import expand_tool_xml
 from galaxy.tool_util.parser.xml import XmlPageSource
 from galaxy.tool_util.provided_metadata import parse_tool_provided_metadata
 from galaxy.tools import expressions
@@ -86,6 +89,9 @@ from galaxy.tools.parameters.wrapped_json import json_wrap
 from galaxy.tools.test import parse_tests
 from galaxy.tools.toolbox import BaseGalaxyToolBox
 from galaxy.util import (
+    etree,
+    ExecutionTimer,
+    get_executable,
     in_directory,
     listify,
     Params,
@@ -221,6 +227,22 @@ class ToolNotFoundException(Exception):
     pass
 
 
+def _tool_in_use(func):
+    """
+    Keep the tool finalized while ``func`` runs, see ``ToolBox.tool_finalized``.
+    """
+    @wraps(func)
+    def wrapper(self, *args, **kwds):
+        with self._finalize_lock:
+            self._use_count += 1
+        try:
+            return func(self, *args, **kwds)
+        finally:
+            with self._finalize_lock:
+                self._use_count -= 1
+    return wrapper
+
+
 def create_tool_from_source(app, tool_source, config_file=None, **kwds):
     # Allow specifying a different tool subclass to instantiate
     tool_module = tool_source.parse_tool_module()
@@ -248,6 +270,13 @@ class ToolBox(BaseGalaxyToolBox):
         self._reload_count = 0
         self.tool_location_fetcher = ToolLocationFetcher()
         self.cache_regions = {}
+        # Set while the whole toolbox is loaded, see ToolSourceBackend.begin_sweep
+        self._tool_cache_sweep = False
+        # Tool sources parsed by _preload_tool_sources, by path
+        self._preloaded_tool_sources = {}
+        # Finalized tools by id(tool), least recently used first, see tool_finalized
+        self._finalized_tools = OrderedDict()
+        self._finalized_tools_lock = threading.Lock()
         if not os.path.exists(app.config.tool_cache_data_dir):
             os.makedirs(app.config.tool_cache_data_dir)
         # This is here to deal with the old default value, which doesn't make
@@ -288,9 +317,106 @@ class ToolBox(BaseGalaxyToolBox):
         # Deprecated method, TODO - eliminate calls to this in test/.
         return self._tools_by_id
 
+    def _init_tools_from_configs(self, config_filenames):
+        self._tool_cache_sweep = True
+        try:
+            super(ToolBox, self)._init_tools_from_configs(config_filenames)
+        finally:
+            self._tool_cache_sweep = False
+            self._preloaded_tool_sources = {}
+            for region in self.cache_regions.values():
+                region.backend.end_sweep()
+
+    def _preload_tool_sources(self, paths, tool_cache_data_dir=None):
+        """
+        Parse the XML tools at ``paths`` that are neither loaded nor cached in
+        ``tool_parsing_processes`` worker processes. The tools are still
+        created and registered one by one in panel order, from these tool
+        sources.
+        """
+        processes = self.app.config.tool_parsing_processes
+        if processes <= 1:
+            return
+        cache = self.get_cache_region(tool_cache_data_dir or self.app.config.tool_cache_data_dir)
+        paths = [path for path in OrderedDict.fromkeys(paths)
+                 if path.endswith('.xml') and path not in self._preloaded_tool_sources and os.path.exists(path)
+                 and not self.load_tool_from_cache(path) and not cache.backend.has_current(path)]
+        if len(paths) < 2:
+            return
+        execution_timer = ExecutionTimer()
+        preloaded_tool_sources = {}
+        try:
+            if hasattr(multiprocessing, 'get_context'):
+                from multiprocessing import spawn
+                # Don't fork the threads of this process. Under uWSGI,
+                # sys.executable is the uwsgi binary, but the executable of
+                # new processes is process-global, even when set on a
+                # context, so it is only set while the pool is started.
+                context = multiprocessing.get_context('forkserver')
+                executable = spawn.get_executable()
+                context.set_executable(get_executable())
+                try:
+                    pool = context.Pool(min(processes, len(paths)))
+                finally:
+                    context.set_executable(executable)
+            else:
+                pool = multiprocessing.Pool(min(processes, len(paths)))
+            try:
+                for config_file, xml, macro_paths in pool.imap_unordered(expand_tool_xml, paths, chunksize=8):
+                    if xml is not None:
+                        # Tools that failed to parse are parsed again when loaded to record their errors
+                        preloaded_tool_sources[config_file] = get_tool_source(
+                            config_file=config_file,
+                            xml_tree=etree.ElementTree(etree.fromstring(xml)),
+                            macro_paths=macro_paths,
+                        )
+            finally:
+                pool.close()
+                pool.join()
+        except Exception:
+            log.exception("Failed to parse tools in %d processes, parsing them one by one", processes)
+            return
+        self._preloaded_tool_sources.update(preloaded_tool_sources)
+        log.debug("Parsed %d tools in %d processes %s", len(paths), processes, execution_timer)
+
+    def get_tool(self, *args, **kwds):
+        tool = super(ToolBox, self).get_tool(*args, **kwds)
+        if isinstance(tool, Tool) and id(tool) in self._finalized_tools:
+            self._use_finalized_tool(tool)
+        return tool
+
+    def tool_finalized(self, tool):
+        """
+        Keep at most ``finalized_tool_cache_size`` tools finalized when tools
+        are initialized on first use (``delay_tool_initialization``), releasing
+        the least recently used ones.
+        """
+        if self.app.config.delay_tool_initialization and self.app.config.finalized_tool_cache_size:
+            self._use_finalized_tool(tool)
+
+    def _use_finalized_tool(self, tool):
+        released = []
+        with self._finalized_tools_lock:
+            self._finalized_tools.pop(id(tool), None)
+            self._finalized_tools[id(tool)] = tool
+            # Tools in use are kept finalized
+            for key, finalized_tool in list(self._finalized_tools.items()):
+                if len(self._finalized_tools) <= self.app.config.finalized_tool_cache_size:
+                    break
+                if finalized_tool is not tool and not finalized_tool.in_use:
+                    released.append(self._finalized_tools.pop(key))
+        for released_tool in released:
+            if not released_tool.release() and released_tool.finalized:
+                # The tool came into use in the meantime
+                with self._finalized_tools_lock:
+                    self._finalized_tools.setdefault(id(released_tool), released_tool)
+
     def get_cache_region(self, tool_cache_data_dir):
         if tool_cache_data_dir not in self.cache_regions:
-            self.cache_regions[tool_cache_data_dir] = create_cache_region(tool_cache_data_dir)
+            region = create_cache_region(tool_cache_data_dir)
+            if self._tool_cache_sweep:
+                region.backend.begin_sweep()
+            self.cache_regions[tool_cache_data_dir] = region
         return self.cache_regions[tool_cache_data_dir]
 
     def create_tool(self, config_file, tool_cache_data_dir=None, **kwds):
@@ -305,6 +431,8 @@ class ToolBox(BaseGalaxyToolBox):
         return tool
 
     def get_expanded_tool_source(self, config_file):
+        if config_file in self._preloaded_tool_sources:
+            return self._preloaded_tool_sources.pop(config_file)
         try:
             return get_tool_source(
                 config_file,
@@ -465,6 +593,9 @@ class Tool(Dictifiable):
             self.tool_dir = None
 
         self.app = app
+        # Guards finalizing and releasing the tool, see assert_finalized
+        self._finalize_lock = threading.RLock()
+        self._use_count = 0
         self.repository_id = repository_id
         self._allow_code_files = allow_code_files
         # setup initial attribute values
@@ -525,43 +656,90 @@ class Tool(Dictifiable):
         if self.app.name == 'galaxy':
             self.job_search = JobSearch(app=self.app)
 
+    # Attributes set when the tool is finalized, see assert_finalized
+    lazy_attributes = frozenset([
+        'action',
+        'check_values',
+        'display',
+        'display_by_page',
+        'enctype',
+        'has_multiple_pages',
+        'inputs',
+        'inputs_by_page',
+        'last_page',
+        'method',
+        'npages',
+        'nginx_upload',
+        'target',
+        'template_macro_params',
+        'outputs',
+        'output_collections'
+    ])
+    # Attributes with defaults set in __init__ that finalizing the tool may change
+    finalized_defaults = ('action', 'check_values', 'input_required', 'method', 'nginx_upload', 'target')
+
     def __getattr__(self, name):
-        lazy_attributes = {
-            'action',
-            'check_values',
-            'display_by_page',
-            'enctype',
-            'has_multiple_pages',
-            'inputs',
-            'inputs_by_page',
-            'last_page',
-            'method',
-            'npages',
-            'nginx_upload',
-            'target',
-            'template_macro_params',
-            'outputs',
-            'output_collections'
-        }
-        if name in lazy_attributes:
+        if name in self.lazy_attributes:
             self.assert_finalized()
             return getattr(self, name)
         raise AttributeError(name)
 
     def assert_finalized(self, raise_if_invalid=False):
         if self.finalized is False:
-            try:
-                self.parse_inputs(self.tool_source)
-                self.parse_outputs(self.tool_source)
-                self.finalized = True
-            except Exception:
+            with self._finalize_lock:
+                finalized = self.finalized is False and self._finalize(raise_if_invalid)
+            if finalized:
+                # Outside of the lock, this may release other tools
                 toolbox = getattr(self.app, 'toolbox', None)
-                if toolbox:
-                    toolbox.remove_tool_by_id(self.id)
-                if raise_if_invalid:
-                    raise
-                else:
-                    log.warning("An error occured while parsing the tool wrapper xml, the tool is not functional", exc_info=True)
+                if isinstance(toolbox, ToolBox):
+                    toolbox.tool_finalized(self)
+
+    def _finalize(self, raise_if_invalid):
+        try:
+            defaults = {name: self.__dict__[name] for name in self.finalized_defaults if name in self.__dict__}
+            # Pages are appended to by parse_inputs
+            self.inputs_by_page = list()
+            self.display_by_page = list()
+            self.parse_inputs(self.tool_source)
+            self.parse_outputs(self.tool_source)
+            self._unfinalized_defaults = defaults
+            self.finalized = True
+            return True
+        except Exception:
+            toolbox = getattr(self.app, 'toolbox', None)
+            if toolbox:
+                toolbox.remove_tool_by_id(self.id)
+            if raise_if_invalid:
+                raise
+            else:
+                log.warning("An error occured while parsing the tool wrapper xml, the tool is not functional", exc_info=True)
+            return False
+
+    @property
+    def in_use(self):
+        return self._use_count > 0
+
+    def release(self):
+        """
+        Drop the inputs, outputs, help and tests of a finalized tool, they are
+        parsed again from the tool source when needed. Tools in use are kept
+        finalized, returns whether the tool was released.
+        """
+        with self._finalize_lock:
+            if not self.finalized or self.in_use:
+                return False
+            # Unfinalize first, so that threads not holding the lock that miss
+            # the attributes dropped below wait for the tool to be finalized again
+            self.finalized = False
+            # Finalized attributes are dropped rather than emptied, so they are
+            # parsed again on access
+            for name in self.lazy_attributes:
+                self.__dict__.pop(name, None)
+            self.__dict__.update(self._unfinalized_defaults)
+            self.parse_help(self.tool_source)
+            self.__tests = None
+            self.__tests_populated = False
+            return True
 
     def remove_from_cache(self):
         source_path = self.tool_source._source_path
@@ -1539,6 +1717,7 @@ class Tool(Dictifiable):
         log.info(validation_timer)
         return all_params, all_errors, rerun_remap_job_id, collection_info
 
+    @_tool_in_use
     def handle_input(self, trans, incoming, history=None, use_cached_job=False):
         """
         Process incoming parameters for this tool from the dict `incoming`,
@@ -1672,6 +1851,7 @@ class Tool(Dictifiable):
                 raise Exception("Unexpected parameter type")
         return args
 
+    @_tool_in_use
     def execute(self, trans, incoming=None, set_output_hid=True, history=None, **kwargs):
         """
         Execute the tool using parameter values in `incoming`. This just
@@ -2053,6 +2233,7 @@ class Tool(Dictifiable):
 
         return tool_dict
 
+    @_tool_in_use
     def to_json(self, trans, kwd=None, job=None, workflow_building_mode=False):
         """
         Recursively creates a tool dictionary containing repeats, dynamic options and updated states.
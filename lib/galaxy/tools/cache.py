@@ -1,6 +1,8 @@
+import base64
 import json
 import logging
 import os
+import zlib
 from collections import defaultdict
 from threading import Lock
 
@@ -17,59 +19,151 @@ from sqlalchemy.orm import (
 )
 
 from galaxy.tool_util.parser import get_tool_source
-from galaxy.util import unicodify
+from galaxy.util import (
+    smart_str,
+    unicodify,
+)
 from galaxy.util.hash_util import md5_hash_file
 
 log = logging.getLogger(__name__)
 
-CURRENT_TOOL_CACHE_VERSION = 2
+CURRENT_TOOL_CACHE_VERSION = 4
+
 
+class ToolSourceBackend(ProxyBackend):
+    """
+    Store expanded tool sources as JSON records with a compressed payload,
+    validated with the modification time, size and content hash of the tool
+    and macro files they were read from. Records of files touched without
+    being changed are rewritten with their new modification time.
+
+    Between ``begin_sweep`` and ``end_sweep`` (while a whole toolbox is
+    loaded) all records are read with a single pass over the dbm file and
+    each file is stat'ed (and hashed, if needed) at most once, no matter how
+    many tools include it.
+    """
 
-class JSONBackend(ProxyBackend):
+    def __init__(self):
+        super(ToolSourceBackend, self).__init__()
+        self._records = None
+        self._file_states = None
+
+    def begin_sweep(self):
+        with self.proxied._dbm_file(False) as dbm:
+            self._records = {key: dbm[key] for key in dbm.keys()}
+        self._file_states = {}
+
+    def end_sweep(self):
+        self._records = None
+        self._file_states = None
+
+    def _file_state(self, path):
+        """Return the mutable [modtime, size, hash] of ``path``, the hash is computed on demand."""
+        file_states = self._file_states if self._file_states is not None else {}
+        if path not in file_states:
+            stat = os.stat(path)
+            file_states[path] = [stat.st_mtime, stat.st_size, None]
+        return file_states[path]
+
+    def _file_hash(self, path):
+        state = self._file_state(path)
+        if state[2] is None:
+            state[2] = md5_hash_file(path)
+        return state[2]
+
+    def _is_current(self, path, modtime, size, file_hash):
+        try:
+            state = self._file_state(path)
+        except OSError:
+            return False
+        if state[0] == modtime and state[1] == size:
+            return True
+        # Touched or copied files are still current if their content didn't change
+        return state[1] == size and self._file_hash(path) == file_hash
 
     def set(self, key, value):
+        files = {}
+        paths = list(value.payload.macro_paths)
+        if value.payload.source_path:
+            paths.append(value.payload.source_path)
+        for path in paths:
+            modtime, size, _ = self._file_state(path)
+            files[path] = [modtime, size, self._file_hash(path)]
+        self._set_record(key, {
+            'metadata': value.metadata,
+            'payload': unicodify(base64.b64encode(zlib.compress(self.value_encode(value)))),
+            'macro_paths': value.payload.macro_paths,
+            'files': files,
+            'tool_cache_version': CURRENT_TOOL_CACHE_VERSION
+        })
+
+    def _set_record(self, key, v):
+        record = json.dumps(v)
         with self.proxied._dbm_file(True) as dbm:
-            dbm[key] = json.dumps({
-                'metadata': value.metadata,
-                'payload': self.value_encode(value),
-                'macro_paths': value.payload.macro_paths,
-                'paths_and_modtimes': value.payload.paths_and_modtimes(),
-                'tool_cache_version': CURRENT_TOOL_CACHE_VERSION
-            })
+            dbm[key] = record
+        if self._records is not None:
+            self._records[smart_str(key)] = smart_str(record)
 
-    def get(self, key):
+    def _get_record(self, key):
+        if self._records is not None:
+            return self._records.get(smart_str(key), NO_VALUE)
         with self.proxied._dbm_file(False) as dbm:
             if hasattr(dbm, "get"):
-                value = dbm.get(key, NO_VALUE)
-            else:
-                # gdbm objects lack a .get method
-                try:
-                    value = dbm[key]
-                except KeyError:
-                    value = NO_VALUE
-            if value is not NO_VALUE:
-                value = self.value_decode(key, value)
-            return value
+                return dbm.get(key, NO_VALUE)
+            # gdbm objects lack a .get method
+            try:
+                return dbm[key]
+            except KeyError:
+                return NO_VALUE
 
-    def value_decode(self, k, v):
+    def _load_record(self, key, v):
+        """Return the decoded record ``v`` of ``key`` or None if it is outdated."""
         if not v or v is NO_VALUE:
+            return None
+        try:
+            # v is returned as bytestring, so we need to `unicodify` on python < 3.6 before we can use json.loads
+            v = json.loads(unicodify(v))
+        except ValueError:
+            # Records written by previous cache versions
+            return None
+        if not isinstance(v, dict) or v.get('tool_cache_version', 0) != CURRENT_TOOL_CACHE_VERSION:
+            return None
+        touched = False
+        for path, (modtime, size, file_hash) in v['files'].items():
+            if not self._is_current(path, modtime, size, file_hash):
+                return None
+            current_modtime = self._file_state(path)[0]
+            if current_modtime != modtime:
+                # Don't hash the unchanged file again on every load
+                v['files'][path] = [current_modtime, size, file_hash]
+                touched = True
+        if touched:
+            self._set_record(key, v)
+        return v
+
+    def has_current(self, key):
+        """Return True if an up to date record is stored for ``key``, without parsing its tool source."""
+        return self._load_record(key, self._get_record(key)) is not None
+
+    def get(self, key):
+        value = self._get_record(key)
+        if value is not NO_VALUE:
+            value = self.value_decode(key, value)
+        return value
+
+    def value_decode(self, k, v):
+        v = self._load_record(k, v)
+        if v is None:
             return NO_VALUE
-        # v is returned as bytestring, so we need to `unicodify` on python < 3.6 before we can use json.loads
-        v = json.loads(unicodify(v))
-        if v.get('tool_cache_version', 0) != CURRENT_TOOL_CACHE_VERSION:
-            return NO_VALUE
-        for path, modtime in v['paths_and_modtimes'].items():
-            if os.path.getmtime(path) != modtime:
-                return NO_VALUE
         payload = get_tool_source(
             config_file=k,
-            xml_tree=etree.ElementTree(etree.fromstring(v['payload'].encode('utf-8'))),
+            xml_tree=etree.ElementTree(etree.fromstring(zlib.decompress(base64.b64decode(v['payload'])))),
             macro_paths=v['macro_paths']
         )
         return CachedValue(metadata=v['metadata'], payload=payload)
 
     def value_encode(self, v):
-        return unicodify(v.payload.to_string())
+        return smart_str(v.payload.to_string())
 
 
 def create_cache_region(tool_cache_data_dir):
@@ -80,7 +174,7 @@ def create_cache_region(tool_cache_data_dir):
         'dogpile.cache.dbm',
         arguments={"filename": os.path.join(tool_cache_data_dir, "cache.dbm")},
         expiration_time=-1,
-        wrap=[JSONBackend],
+        wrap=[ToolSourceBackend],
         replace_existing_backend=True,
     )
     return region
@@ -5,6 +5,7 @@ collections from matched collections.
 """
 import collections
 import logging
+import time
 
 import six
 import six.moves
@@ -29,12 +30,13 @@ class PartialJobExecution(Exception):
 MappingParameters = collections.namedtuple("MappingParameters", ["param_template", "param_combinations"])
 
 
-def execute(trans, tool, mapping_params, history, rerun_remap_job_id=None, collection_info=None, workflow_invocation_uuid=None, invocation_step=None, max_num_jobs=None, job_callback=None, completed_jobs=None, workflow_resource_parameters=None, validate_outputs=False):
+def execute(trans, tool, mapping_params, history, rerun_remap_job_id=None, collection_info=None, workflow_invocation_uuid=None, invocation_step=None, max_num_jobs=None, deadline=None, job_callback=None, completed_jobs=None, workflow_resource_parameters=None, validate_outputs=False):
     """
     Execute a tool and return object containing summary (output data, number of
-    failures, etc...).
+    failures, etc...). Workflow steps stop creating jobs after ``max_num_jobs``
+    jobs or once ``time.time()`` passes ``deadline``, raising ``PartialJobExecution``.
     """
-    if max_num_jobs:
+    if max_num_jobs or deadline is not None:
         assert invocation_step is not None
     if rerun_remap_job_id:
         assert invocation_step is None
@@ -98,8 +100,13 @@ def execute(trans, tool, mapping_params, history, rerun_remap_job_id=None, colle
         if max_num_jobs and jobs_executed >= max_num_jobs:
             has_remaining_jobs = True
             break
+        elif deadline is not None and jobs_executed and time.time() >= deadline:
+            # At least one job is created per iteration so that scheduling progresses
+            has_remaining_jobs = True
+            break
         else:
             execute_single_job(execution_slice, completed_jobs[i])
+            jobs_executed += 1
 
     if has_remaining_jobs:
         raise PartialJobExecution(execution_tracker)
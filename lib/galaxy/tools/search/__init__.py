@@ -7,6 +7,8 @@ through the library docs at https://whoosh.readthedocs.io.
 import logging
 import os
 import re
+import threading
+from collections import OrderedDict
 
 from whoosh import (
     analysis,
@@ -48,6 +50,8 @@ class ToolBoxSearch(object):
     Support searching tools in a toolbox. This implementation uses
     the Whoosh search library.
     """
+    # Number of search results cached
+    result_cache_size = 1000
 
     def __init__(self, toolbox, index_dir=None, index_help=True):
         self.schema = Schema(id=ID(stored=True),
@@ -58,9 +62,26 @@ class ToolBoxSearch(object):
                              help=TEXT,
                              labels=KEYWORD)
         self.rex = analysis.RegexTokenizer()
+        # Use OrGroup to change the default operation for joining multiple terms to logical OR.
+        # This means e.g. for search 'bowtie of king arthur' a document that only has 'bowtie' will be a match.
+        # https://whoosh.readthedocs.io/en/latest/api/qparser.html#whoosh.qparser.MultifieldPlugin
+        # However this changes scoring i.e. searching 'bowtie of king arthur' a document with 'arthur arthur arthur'
+        # would have a higher score than a document with 'bowtie arthur' which is usually unexpected for a user.
+        # Hence we introduce a bonus on multi-hits using the 'factory()' method using a scaling factor between 0-1.
+        # https://whoosh.readthedocs.io/en/latest/parsing.html#searching-for-any-terms-instead-of-all-terms-by-default
+        og = OrGroup.factory(0.9)
+        self.parser = MultifieldParser(['name', 'description', 'section', 'help', 'labels', 'stub'], schema=self.schema, group=og)
         self.index_dir = index_dir
         self.toolbox = toolbox
         self.index = self._index_setup()
+        # Idle searchers by field boosts and search results (least recently
+        # used first) are kept until the index changes, which bumps the
+        # generation. Searches run outside of the lock, each with a searcher
+        # of its own.
+        self._lock = threading.Lock()
+        self._searchers = {}
+        self._results = OrderedDict()
+        self._generation = 0
         # We keep track of how many times the tool index has been rebuilt.
         # We start at -1, so that after the first index the count is at 0,
         # which is the same as the toolbox reload count. This way we can skip
@@ -90,6 +111,8 @@ class ToolBoxSearch(object):
                 if tool and tool.is_latest_version:
                     add_doc_kwds = self._create_doc(tool_id=tool_id, tool=tool, index_help=index_help)
                     writer.add_document(**add_doc_kwds)
+        with self._lock:
+            self._clear_searchers()
         log.debug("Toolbox index finished %s", execution_timer)
 
     def _create_doc(self, tool_id, tool, index_help=True):
@@ -133,40 +156,91 @@ class ToolBoxSearch(object):
         """
         Perform search on the in-memory index. Weight in the given boosts.
         """
+        boosts = (float(tool_name_boost), float(tool_section_boost), float(tool_description_boost),
+                  float(tool_label_boost), float(tool_stub_boost), float(tool_help_boost))
+        key = (q, boosts, tool_search_limit, tool_enable_ngram_search, tool_ngram_minsize, tool_ngram_maxsize)
+        with self._lock:
+            searcher = self._checkout_searcher(boosts)
+            if key in self._results:
+                # Move to the end of the LRU
+                rval = self._results[key] = self._results.pop(key)
+                self._return_searcher(boosts, searcher)
+                return list(rval)
+            generation = self._generation
+        if searcher is None:
+            searcher = self._create_searcher(boosts)
+        try:
+            cleaned_query = q.lower()
+            # Replace hyphens, since they are wildcards in Whoosh causing false positives
+            if cleaned_query.find('-') != -1:
+                cleaned_query = (' ').join(token.text for token in self.rex(to_unicode(cleaned_query)))
+            if tool_enable_ngram_search is True:
+                rval = self._search_ngrams(searcher, cleaned_query, tool_ngram_minsize, tool_ngram_maxsize, tool_search_limit)
+            else:
+                # Use asterisk Whoosh wildcard so e.g. 'bow' easily matches 'bowtie'
+                parsed_query = self.parser.parse(cleaned_query + '*')
+                hits = searcher.search(parsed_query, limit=float(tool_search_limit), sortedby='')
+                rval = [hit['id'] for hit in hits]
+        except Exception:
+            searcher.close()
+            raise
+        with self._lock:
+            if generation == self._generation and searcher.up_to_date():
+                self._results[key] = rval
+                while len(self._results) > self.result_cache_size:
+                    self._results.popitem(last=False)
+            self._return_searcher(boosts, searcher, generation)
+        return list(rval)
+
+    def _checkout_searcher(self, boosts):
+        """
+        Take an idle searcher weighting fields with ``boosts``, if any. Finding
+        an outdated searcher means the index changed, which clears the cached
+        results. Must be called with the lock held.
+        """
+        searchers = self._searchers.get(boosts)
+        searcher = searchers.pop() if searchers else None
+        if searcher is not None and not searcher.up_to_date():
+            searcher.close()
+            self._clear_searchers()
+            searcher = None
+        return searcher
+
+    def _return_searcher(self, boosts, searcher, generation=None):
+        """
+        Keep ``searcher`` for the next search unless the index changed since it
+        was checked out. Must be called with the lock held.
+        """
+        if searcher is None:
+            return
+        if (generation is None or generation == self._generation) and searcher.up_to_date():
+            self._searchers.setdefault(boosts, []).append(searcher)
+        else:
+            searcher.close()
+
+    def _create_searcher(self, boosts):
+        name_B, section_B, description_B, labels_B, stub_B, help_B = boosts
         # Change field boosts for searcher
-        self.searcher = self.index.searcher(
+        return self.index.searcher(
             weighting=BM25F(
-                field_B={'name_B': float(tool_name_boost),
-                         'section_B': float(tool_section_boost),
-                         'description_B': float(tool_description_boost),
-                         'labels_B': float(tool_label_boost),
-                         'stub_B': float(tool_stub_boost),
-                         'help_B': float(tool_help_boost)}
+                field_B={'name_B': name_B,
+                         'section_B': section_B,
+                         'description_B': description_B,
+                         'labels_B': labels_B,
+                         'stub_B': stub_B,
+                         'help_B': help_B}
             )
         )
-        # Use OrGroup to change the default operation for joining multiple terms to logical OR.
-        # This means e.g. for search 'bowtie of king arthur' a document that only has 'bowtie' will be a match.
-        # https://whoosh.readthedocs.io/en/latest/api/qparser.html#whoosh.qparser.MultifieldPlugin
-        # However this changes scoring i.e. searching 'bowtie of king arthur' a document with 'arthur arthur arthur'
-        # would have a higher score than a document with 'bowtie arthur' which is usually unexpected for a user.
-        # Hence we introduce a bonus on multi-hits using the 'factory()' method using a scaling factor between 0-1.
-        # https://whoosh.readthedocs.io/en/latest/parsing.html#searching-for-any-terms-instead-of-all-terms-by-default
-        og = OrGroup.factory(0.9)
-        self.parser = MultifieldParser(['name', 'description', 'section', 'help', 'labels', 'stub'], schema=self.schema, group=og)
-        cleaned_query = q.lower()
-        # Replace hyphens, since they are wildcards in Whoosh causing false positives
-        if cleaned_query.find('-') != -1:
-            cleaned_query = (' ').join(token.text for token in self.rex(to_unicode(cleaned_query)))
-        if tool_enable_ngram_search is True:
-            rval = self._search_ngrams(cleaned_query, tool_ngram_minsize, tool_ngram_maxsize, tool_search_limit)
-            return rval
-        else:
-            # Use asterisk Whoosh wildcard so e.g. 'bow' easily matches 'bowtie'
-            parsed_query = self.parser.parse(cleaned_query + '*')
-            hits = self.searcher.search(parsed_query, limit=float(tool_search_limit), sortedby='')
-            return [hit['id'] for hit in hits]
 
-    def _search_ngrams(self, cleaned_query, tool_ngram_minsize, tool_ngram_maxsize, tool_search_limit):
+    def _clear_searchers(self):
+        for searchers in self._searchers.values():
+            for searcher in searchers:
+                searcher.close()
+        self._searchers = {}
+        self._results = OrderedDict()
+        self._generation += 1
+
+    def _search_ngrams(self, searcher, cleaned_query, tool_ngram_minsize, tool_ngram_maxsize, tool_search_limit):
         """
         Break tokens into ngrams and search on those instead.
         This should make searching more resistant to typos and unfinished words.
@@ -177,19 +251,11 @@ class ToolBoxSearch(object):
         ngrams = [token.text for token in token_analyzer(cleaned_query)]
         for query in ngrams:
             # Get the tool list with respective scores for each qgram
-            curr_hits = self.searcher.search(self.parser.parse('*' + query + '*'), limit=float(tool_search_limit))
+            curr_hits = searcher.search(self.parser.parse('*' + query + '*'), limit=float(tool_search_limit))
             for i, curr_hit in enumerate(curr_hits):
-                is_present = False
-                for prev_hit in hits_with_score:
-                    # Check if the tool appears again for the next qgram search
-                    if curr_hit['id'] == prev_hit:
-                        is_present = True
-                        # Add the current score with the previous one if the
-                        # tool appears again for the next qgram
-                        hits_with_score[prev_hit] = curr_hits.score(i) + hits_with_score[prev_hit]
-                # Add the tool if not present to the collection with its score
-                if not is_present:
-                    hits_with_score[curr_hit['id']] = curr_hits.score(i)
+                # Add the current score to the previous ones if the tool appears again for the next qgram
+                tool_id = curr_hit['id']
+                hits_with_score[tool_id] = hits_with_score.get(tool_id, 0) + curr_hits.score(i)
         # Sort the results based on aggregated BM25 score in decreasing order of scores
         hits_with_score = sorted(hits_with_score.items(), key=lambda x: x[1], reverse=True)
         # Return the tool ids
@@ -1,4 +1,5 @@
 import errno
+import hashlib
 import logging
 import os
 import string
@@ -27,11 +28,13 @@ from galaxy.util import (
     ExecutionTimer,
     listify,
     parse_xml,
+    smart_str,
     string_as_bool,
     unicodify,
 )
 from galaxy.util.bunch import Bunch
 from galaxy.util.dictifiable import Dictifiable
+from galaxy.util.json import safe_dumps
 from .filters import FilterFactory
 from .integrated_panel import ManagesIntegratedToolPanelMixin
 from .lineages import LineageMap
@@ -94,6 +97,10 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
         # Cache for tool's to_dict calls specific to toolbox. Invalidates on toolbox reload.
         self._tool_to_dict_cache = {}
         self._tool_to_dict_cache_admin = {}
+        # Cache for JSON encoded tool panels by filters, see to_json. Invalidates on tool panel changes,
+        # which also bump the generation so panels built during a change aren't cached.
+        self._panel_json_cache = {}
+        self._panel_json_generation = 0
         # In-memory dictionary that defines the layout of the tool panel.
         self._tool_panel = ToolPanelElements()
         self._index = 0
@@ -201,7 +208,9 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
         tool_path = self.__resolve_tool_path(tool_path, config_filename)
         # Only load the panel_dict under certain conditions.
         load_panel_dict = not self._integrated_tool_panel_config_has_contents
-        for item in tool_conf_source.parse_items():
+        items = list(tool_conf_source.parse_items())
+        self._preload_tool_sources(self._tool_item_paths(items, tool_path), tool_cache_data_dir=tool_cache_data_dir)
+        for item in items:
             index = self._index
             self._index += 1
             if parsing_shed_tool_conf:
@@ -221,6 +230,28 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
                                        config_elems=config_elems)
             self._dynamic_tool_confs.append(shed_tool_conf_dict)
 
+    def _tool_item_paths(self, items, tool_path):
+        """Return the paths of the tools referenced by ``items``, including the tools in sections."""
+        paths = []
+        for item in items:
+            item = ensure_tool_conf_item(item)
+            if item.type == 'tool':
+                paths.append(os.path.join(tool_path, self._tool_item_path(item)))
+            elif item.type == 'section':
+                paths.extend(self._tool_item_paths(item.items, tool_path))
+        return paths
+
+    def _tool_item_path(self, item):
+        path_template = item.get("file")
+        template_kwds = self._path_template_kwds()
+        return string.Template(path_template).safe_substitute(**template_kwds)
+
+    def _preload_tool_sources(self, paths, tool_cache_data_dir=None):
+        """
+        Hook to parse the tools at ``paths`` up front, before they are loaded
+        one by one in panel order.
+        """
+
     def _get_tool_by_uuid(self, tool_uuid):
         if tool_uuid in self._tools_by_uuid:
             return self._tools_by_uuid[tool_uuid]
@@ -242,6 +273,7 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
 
     def load_item(self, item, tool_path, panel_dict=None, integrated_panel_dict=None, load_panel_dict=True, guid=None, index=None, tool_cache_data_dir=None):
         with self.app._toolbox_lock:
+            self._clear_panel_json_cache()
             item = ensure_tool_conf_item(item)
             item_type = item.type
             if panel_dict is None:
@@ -303,6 +335,7 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
         return tool_panel_section_key, tool_section
 
     def create_section(self, section_dict):
+        self._clear_panel_json_cache()
         tool_section = ToolSection(section_dict)
         self._tool_panel.append_section(tool_section.id, tool_section)
         log.debug("Loading new tool panel section: %s" % str(tool_section.name))
@@ -396,6 +429,7 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
 
     def _load_tool_panel(self):
         execution_timer = ExecutionTimer()
+        self._clear_panel_json_cache()
         for key, item_type, val in self._integrated_tool_panel.panel_items_iter():
             if item_type == panel_item_types.TOOL:
                 tool_id = key.replace('tool_', '', 1)
@@ -630,9 +664,7 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
 
     def _load_tool_tag_set(self, item, panel_dict, integrated_panel_dict, tool_path, load_panel_dict, guid=None, index=None, tool_cache_data_dir=None):
         try:
-            path_template = item.get("file")
-            template_kwds = self._path_template_kwds()
-            path = string.Template(path_template).safe_substitute(**template_kwds)
+            path = self._tool_item_path(item)
             concrete_path = os.path.join(tool_path, path)
             if not os.path.exists(concrete_path):
                 # This is a lot faster than attempting to load a non-existing tool
@@ -901,6 +933,7 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
         return tool
 
     def register_tool(self, tool):
+        self._clear_panel_json_cache()
         tool_id = tool.id
         version = tool.version or None
         if tool_id not in self._tool_versions_by_id:
@@ -981,6 +1014,7 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
         else:
             tool = self._tools_by_id[tool_id]
             del self._tools_by_id[tool_id]
+            self._clear_panel_json_cache()
             tool_cache = getattr(self.app, 'tool_cache', None)
             if tool_cache:
                 tool_cache.expire_tool(tool_id)
@@ -1039,7 +1073,7 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
     def tool_panel_contents(self, trans, **kwds):
         """ Filter tool_panel contents for displaying for user.
         """
-        filter_method = self._build_filter_method(trans)
+        filter_method = self._build_filter_method(trans, **kwds)
         for _, item_type, elt in self._tool_panel.panel_items_iter():
             elt = filter_method(elt, item_type)
             if elt:
@@ -1083,7 +1117,7 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
                     kwargs = dict(trans=trans, link_details=True, tool_help=tool_help, toolbox=self)
                     rval.append(elt.to_dict(**kwargs))
         else:
-            filter_method = self._build_filter_method(trans)
+            filter_method = self._build_filter_method(trans, **kwds)
             for id, tool in self._tools_by_id.items():
                 tool = filter_method(tool, panel_item_types.TOOL)
                 if not tool:
@@ -1091,6 +1125,33 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
                 rval.append(self.get_tool_to_dict(trans, tool, tool_help=tool_help))
         return rval
 
+    def to_json(self, trans, in_panel=True, tool_help=False, **kwds):
+        """
+        Return a tuple of an ETag and the JSON encoded ``to_dict`` of the
+        toolbox. Encoded panels are cached unless a filter in effect depends
+        on more than whether the user is anonymous or an admin.
+        """
+        filters_key = self._filter_factory.cache_key(self._filter_factory.build_filters(trans, **kwds))
+        key = None
+        if filters_key is not None:
+            key = (filters_key, trans.user is None, trans.user_is_admin, in_panel, tool_help, getattr(self, '_reload_count', 0))
+            rval = self._panel_json_cache.get(key)
+            if rval is not None:
+                return rval
+        generation = self._panel_json_generation
+        panel_json = safe_dumps(self.to_dict(trans, in_panel=in_panel, tool_help=tool_help, **kwds))
+        rval = ('"%s"' % hashlib.md5(smart_str(panel_json)).hexdigest(), panel_json)
+        if key is not None:
+            with self.app._toolbox_lock:
+                if generation == self._panel_json_generation:
+                    self._panel_json_cache[key] = rval
+        return rval
+
+    def _clear_panel_json_cache(self):
+        with self.app._toolbox_lock:
+            self._panel_json_generation += 1
+            self._panel_json_cache.clear()
+
     def _lineage_in_panel(self, panel_dict, tool=None, tool_lineage=None):
         """ If tool with same lineage already in panel (or section) - find
         and return it. Otherwise return None.
@@ -1121,9 +1182,9 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
         else:
             return self._tool_versions_by_id.get(lineage_tool_version.id, {}).get(lineage_tool_version.version, None)
 
-    def _build_filter_method(self, trans):
+    def _build_filter_method(self, trans, **kwds):
         context = Bunch(toolbox=self, trans=trans)
-        filters = self._filter_factory.build_filters(trans)
+        filters = self._filter_factory.build_filters(trans, **kwds)
         return lambda element, item_type: _filter_for_panel(element, item_type, filters, context)
 
 
@@ -51,6 +51,20 @@ class FilterFactory(object):
 
         return filters
 
+    def cache_key(self, filters):
+        """
+        Return a hashable key identifying ``filters`` or None if some filter
+        may depend on more than whether the user is anonymous or an admin,
+        in which case filtered panels shouldn't be cached.
+        """
+        key = []
+        for category in sorted(filters):
+            for filter_function in filters[category]:
+                if not getattr(filter_function, 'cacheable', False):
+                    return None
+                key.append((category, filter_function.__module__, filter_function.__name__))
+        return tuple(key)
+
     def __init_filters(self, key, filters, toolbox_filters, validate=None):
         for filter in filters:
             if validate is None or filter in validate or filter in self.default_filters:
@@ -89,11 +103,23 @@ class FilterFactory(object):
         log.warning("Failed to load module for '%s.%s'.", module_name, function_name, exc_info=True)
 
 
+def cacheable(filter_function):
+    """
+    Mark a filter function as depending only on the filtered item and on
+    whether the user is anonymous or an admin so the toolbox can cache the
+    panels it filters.
+    """
+    filter_function.cacheable = True
+    return filter_function
+
+
 # Stock Filter Functions
+@cacheable
 def _not_hidden(context, tool):
     return not tool.hidden
 
 
+@cacheable
 def _handle_authorization(context, tool):
     user = context.trans.user
     if tool.require_login and not user:
@@ -103,5 +129,6 @@ def _handle_authorization(context, tool):
     return True
 
 
+@cacheable
 def _has_trackster_conf(context, tool):
     return tool.trackster_conf
@@ -14,6 +14,7 @@ from sqlalchemy.orm import object_session
 
 from galaxy.exceptions import HandlerAssignmentError
 from galaxy.util import (
+    asbool,
     ExecutionTimer,
     listify
 )
@@ -81,6 +82,9 @@ class ConfiguresHandlers(object):
             max_grab_str = config_element.attrib.get('max_grab', None)
             if max_grab_str:
                 handling_config_dict["max_grab"] = int(max_grab_str)
+            grab_notify_str = config_element.attrib.get('grab_notify', None)
+            if grab_notify_str:
+                handling_config_dict["grab_notify"] = asbool(grab_notify_str)
 
         return handling_config_dict
 
@@ -127,6 +131,7 @@ class ConfiguresHandlers(object):
             self.handler_max_grab = handling_config_dict.get('max_grab', self.handler_max_grab)
             if self.handler_max_grab is not None:
                 self.handler_max_grab = int(self.handler_max_grab)
+            self.handler_grab_notify = asbool(handling_config_dict.get('grab_notify', self.handler_grab_notify))
 
     def _set_default_handler_assignment_methods(self):
         if not self.handler_assignment_methods_configured:
@@ -235,6 +240,14 @@ class ConfiguresHandlers(object):
                 HANDLER_ASSIGNMENT_METHODS.DB_PREASSIGN,
             ), self.handler_assignment_methods))
 
+    @property
+    def grab_handler_assignment(self):
+        # Whether handlers grab unassigned objects from the database, in which case they can be notified of new ones
+        return any(x in (
+            HANDLER_ASSIGNMENT_METHODS.DB_TRANSACTION_ISOLATION,
+            HANDLER_ASSIGNMENT_METHODS.DB_SKIP_LOCKED,
+        ) for x in self.handler_assignment_methods)
+
     def _get_is_handler(self):
         """Indicate whether the current server is configured as a handler.
 
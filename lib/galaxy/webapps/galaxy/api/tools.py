@@ -11,6 +11,7 @@ from galaxy.web import (
     expose_api_anonymous_and_sessionless,
     expose_api_raw_anonymous_and_sessionless,
 )
+from galaxy.web.framework.decorators import format_return_as_json
 from galaxy.webapps.base.controller import BaseAPIController
 from galaxy.webapps.base.controller import UsesVisualizationMixin
 from ._fetch_util import validate_and_normalize_targets
@@ -34,7 +35,7 @@ class ToolsController(BaseAPIController, UsesVisualizationMixin):
         self.history_manager = managers.histories.HistoryManager(app)
         self.hda_manager = managers.hdas.HDAManager(app)
 
-    @expose_api_anonymous_and_sessionless
+    @expose_api_raw_anonymous_and_sessionless
     def index(self, trans, **kwds):
         """
         GET /api/tools: returns a list of tools defined by parameters::
@@ -48,6 +49,9 @@ class ToolsController(BaseAPIController, UsesVisualizationMixin):
                 q         - if present search on the given query will be performed
                 tool_id   - if present the given tool_id will be searched for
                             all installed versions
+
+            The tool panel is sent with an ETag header, requests with a
+            matching If-None-Match header get an empty 304 response.
         """
 
         # Read params.
@@ -78,18 +82,25 @@ class ToolsController(BaseAPIController, UsesVisualizationMixin):
                         pass
                     except exceptions.ObjectNotFound:
                         pass
-            return results
+            return format_return_as_json(results, pretty=trans.debug)
 
         # Find whether to detect.
         if tool_id:
             detected_versions = self._detect(trans, tool_id)
-            return detected_versions
+            return format_return_as_json(detected_versions, pretty=trans.debug)
 
         # Return everything.
         try:
-            return self.app.toolbox.to_dict(trans, in_panel=in_panel, trackster=trackster, tool_help=tool_help)
+            etag, panel_json = self.app.toolbox.to_json(trans, in_panel=in_panel, trackster=trackster, tool_help=tool_help)
         except Exception:
             raise exceptions.InternalServerError("Error: Could not convert toolbox to dictionary")
+        # Let clients revalidate the panel instead of refetching it
+        trans.response.headers['Cache-Control'] = "max-age=0,no-cache"
+        trans.response.headers['ETag'] = etag
+        if etag in [tag.strip() for tag in trans.request.headers.get('If-None-Match', '').split(',')]:
+            trans.response.status = 304
+            return ''
+        return panel_json
 
     @expose_api_anonymous_and_sessionless
     def show(self, trans, id, **kwd):
@@ -1751,6 +1751,7 @@ class ToolModule(WorkflowModule):
                 workflow_invocation_uuid=invocation.uuid.hex,
                 invocation_step=invocation_step,
                 max_num_jobs=max_num_jobs,
+                deadline=progress.scheduling_deadline,
                 validate_outputs=validate_outputs,
                 job_callback=lambda job: self._handle_post_job_actions(step, job, invocation.replacement_dict),
                 completed_jobs=completed_jobs,
@@ -1,4 +1,5 @@
 import logging
+import time
 import uuid
 from collections import OrderedDict
 
@@ -114,6 +115,13 @@ def queue_invoke(trans, workflow, workflow_run_config, request_params={}, popula
     return trans.app.workflow_scheduling_manager.queue(workflow_invocation, request_params)
 
 
+def _scheduling_deadline(config):
+    time_slice = config.workflow_scheduling_time_slice
+    if time_slice > 0:
+        return time.time() + time_slice
+    return None
+
+
 class WorkflowInvoker(object):
 
     def __init__(self, trans, workflow, workflow_run_config, workflow_invocation=None, progress=None):
@@ -172,11 +180,19 @@ class WorkflowInvoker(object):
             raise modules.CancelWorkflowEvaluation()
 
         remaining_steps = self.progress.remaining_steps()
+        if self.progress.scheduling_deadline is None:
+            # Subworkflows share the deadline of their parent, the time spent
+            # finding the remaining steps doesn't count against the time slice
+            self.progress.scheduling_deadline = _scheduling_deadline(config)
         delayed_steps = False
+        steps_invoked = 0
         for (step, workflow_invocation_step) in remaining_steps:
             step_delayed = False
             step_timer = ExecutionTimer()
             try:
+                if steps_invoked and self.progress.scheduling_time_slice_used:
+                    # Leave the remaining steps to the next iteration so other invocations get their turn
+                    raise modules.DelayedWorkflowEvaluation(why="scheduling time slice used up")
                 self.__check_implicitly_dependent_steps(step)
 
                 if not workflow_invocation_step:
@@ -188,6 +204,7 @@ class WorkflowInvoker(object):
                     workflow_invocation.steps.append(workflow_invocation_step)
 
                 incomplete_or_none = self._invoke_step(workflow_invocation_step)
+                steps_invoked += 1
                 if incomplete_or_none is False:
                     step_delayed = delayed_steps = True
                     workflow_invocation_step.state = 'ready'
@@ -272,7 +289,7 @@ STEP_OUTPUT_DELAYED = object()
 
 class WorkflowProgress(object):
 
-    def __init__(self, workflow_invocation, inputs_by_step_id, module_injector, param_map, jobs_per_scheduling_iteration=-1):
+    def __init__(self, workflow_invocation, inputs_by_step_id, module_injector, param_map, jobs_per_scheduling_iteration=-1, scheduling_deadline=None):
         self.outputs = OrderedDict()
         self.module_injector = module_injector
         self.workflow_invocation = workflow_invocation
@@ -280,6 +297,12 @@ class WorkflowProgress(object):
         self.param_map = param_map
         self.jobs_per_scheduling_iteration = jobs_per_scheduling_iteration
         self.jobs_scheduled_this_iteration = 0
+        # Time after which this scheduling iteration stops creating jobs, see workflow_scheduling_time_slice
+        self.scheduling_deadline = scheduling_deadline
+
+    @property
+    def scheduling_time_slice_used(self):
+        return self.scheduling_deadline is not None and time.time() >= self.scheduling_deadline
 
     @property
     def maximum_jobs_to_schedule_or_none(self):
@@ -510,7 +533,8 @@ class WorkflowProgress(object):
             subworkflow_invocation,
             subworkflow_inputs,
             self.module_injector,
-            param_map=param_map
+            param_map=param_map,
+            scheduling_deadline=self.scheduling_deadline,
         )
 
     def _recover_mapping(self, step_invocation):
@@ -1,9 +1,18 @@
 import os
+import threading
+import time
+from collections import OrderedDict
 from functools import partial
 
+from six.moves.queue import Queue
+
 import galaxy.workflow.schedulers
 from galaxy import model
 from galaxy.exceptions import HandlerAssignmentError
+from galaxy.model.database_notify import (
+    DatabaseNotificationListener,
+    send_notification,
+)
 from galaxy.util import (
     parse_xml,
     plugin_config,
@@ -24,6 +33,12 @@ EXCEPTION_MESSAGE_NO_DEFAULT_SCHEDULER = "Failed to defined workflow schedulers
 EXCEPTION_MESSAGE_DUPLICATE_SCHEDULERS = "Failed to defined workflow schedulers - workflow scheduling plugin id '%s' duplicated."
 EXCEPTION_MESSAGE_SERIALIZE = "Parallelization is not desired but handler assignment methods are non-deterministic. Set DB_PREASSIGN in workflow_schedulers_conf.xml."
 
+STOP_SIGNAL = object()
+
+WORKFLOW_SCHEDULING_NOTIFY_CHANNEL = 'galaxy_workflow_scheduling'
+# How often parked workflow invocations are scheduled anyway, in case a notification is missed
+WORKFLOW_SCHEDULING_NOTIFY_FALLBACK_INTERVAL = 60
+
 
 class WorkflowSchedulingManager(ConfiguresHandlers):
     """ A workflow scheduling manager based loosely on pattern established by
@@ -50,6 +65,7 @@ class WorkflowSchedulingManager(ConfiguresHandlers):
         self.handler_assignment_methods_configured = False
         self.handler_assignment_methods = None
         self.handler_max_grab = None
+        self.handler_grab_notify = False
         self.default_handler_id = None
 
         self.__plugin_classes = self.__plugins_dict()
@@ -160,8 +176,36 @@ class WorkflowSchedulingManager(ConfiguresHandlers):
         except HandlerAssignmentError:
             raise RuntimeError("Unable to set a handler for workflow invocation '%s'" % workflow_invocation.id)
 
+        self.notify_invocation(workflow_invocation.id)
         return workflow_invocation
 
+    def notify_invocation(self, workflow_invocation_id):
+        """
+        If ``workflow_scheduling_notify`` is enabled, wake the handler scheduling
+        workflow invocation ``workflow_invocation_id`` so that it is scheduled
+        on the next iteration. May be called from any thread of any process.
+        """
+        if not self.app.config.workflow_scheduling_notify:
+            return
+        try:
+            send_notification(self.app.model.context, WORKFLOW_SCHEDULING_NOTIFY_CHANNEL, str(workflow_invocation_id))
+        except Exception:
+            log.exception("Failed to send notification for workflow invocation [%s]", workflow_invocation_id)
+        if self.request_monitor:
+            self.request_monitor.wake_invocation(workflow_invocation_id)
+
+    def notify_job_terminal(self, job_id):
+        """
+        If ``workflow_scheduling_notify`` is enabled, wake the workflow
+        invocations that created job ``job_id`` or wait for its outputs, and
+        their parent invocations, now that it has reached a terminal state.
+        """
+        if not self.app.config.workflow_scheduling_notify:
+            return
+        sa_session = self.app.model.context
+        for workflow_invocation_id in model.WorkflowInvocation.poll_workflow_ids_for_job(sa_session, job_id):
+            self.notify_invocation(workflow_invocation_id)
+
     def __start_schedulers(self):
         for workflow_scheduler in self.workflow_schedulers.values():
             workflow_scheduler.startup(self.app)
@@ -267,6 +311,48 @@ class WorkflowRequestMonitor(Monitors):
         self.app = app
         self.workflow_scheduling_manager = workflow_scheduling_manager
         self._init_monitor_thread(name="WorkflowRequestMonitor.monitor_thread", target=self.__monitor, config=app.config)
+        self.__init_scheduling_workers()
+        self.__init_notifications()
+
+    def __init_notifications(self):
+        # If workflow_scheduling_notify is set, invocations whose scheduling
+        # iteration made no progress are parked and not scheduled again until
+        # woken by wake_invocation() (one of their jobs reached a terminal
+        # state, a step was acted upon, ...), or the fallback interval passes.
+        # The monitor then only polls every second while there are unparked
+        # invocations. Invocations woken while they are being scheduled are
+        # not parked at the end of that scheduling iteration.
+        self.notify = self.app.config.workflow_scheduling_notify
+        self.parked_invocations = {}
+        # Invocation being scheduled -> [history id, whether it was woken since]
+        self.scheduling_invocations = {}
+        self.parked_invocations_lock = threading.Lock()
+        self.schedule_again = False
+        self.listener = None
+        if self.notify:
+            self.listener = DatabaseNotificationListener(
+                self.app.model.engine, WORKFLOW_SCHEDULING_NOTIFY_CHANNEL, self.__handle_notification)
+
+    def __init_scheduling_workers(self):
+        # If workflow_scheduling_workers is set, the monitor thread only polls
+        # for active invocations and hands them to a pool of worker threads.
+        # Invocations that must be scheduled serially (by default, those in
+        # the same history) are handed over together and are not handed over
+        # again until the worker is done with them. With
+        # workflow_scheduling_time_slice, large invocations yield to the
+        # others queued after them.
+        self.work_queue = None
+        self.work_threads = []
+        self.scheduling_keys = set()
+        self.scheduling_keys_lock = threading.Lock()
+        nworkers = self.app.config.workflow_scheduling_workers
+        if nworkers <= 0:
+            return
+        self.work_queue = Queue()
+        for i in range(nworkers):
+            worker = threading.Thread(name="WorkflowRequestMonitor.work_thread-%d" % i, target=self.__work)
+            worker.daemon = True
+            self.work_threads.append(worker)
 
     def __monitor(self):
         to_monitor = self.workflow_scheduling_manager.active_workflow_schedulers
@@ -282,23 +368,144 @@ class WorkflowRequestMonitor(Monitors):
                 self.__schedule(workflow_scheduler_id, workflow_scheduler)
 
             log.trace(monitor_step_timer.to_str())
-            self._monitor_sleep(1)
+            self._monitor_sleep(self.__sleep_time())
+
+    def __sleep_time(self):
+        if not self.notify:
+            return 1
+        with self.scheduling_keys_lock:
+            in_progress = bool(self.scheduling_keys)
+        schedule_again = self.schedule_again
+        self.schedule_again = False
+        if in_progress or schedule_again:
+            return 1
+        return WORKFLOW_SCHEDULING_NOTIFY_FALLBACK_INTERVAL
+
+    def __handle_notification(self, payload):
+        try:
+            workflow_invocation_id = int(payload)
+        except ValueError:
+            log.warning("Invalid workflow scheduling notification payload: %s", payload)
+            return
+        self.wake_invocation(workflow_invocation_id)
+
+    def wake_invocation(self, workflow_invocation_id):
+        """
+        Unpark workflow invocation ``workflow_invocation_id`` (if it is parked)
+        and wake the monitor thread. May be called from any thread.
+        """
+        with self.parked_invocations_lock:
+            self.parked_invocations.pop(workflow_invocation_id, None)
+            scheduling = self.scheduling_invocations.get(workflow_invocation_id)
+            if scheduling is not None:
+                scheduling[1] = True
+        self.schedule_again = True
+        self.sleeper.wake()
+
+    def __start_scheduling(self, workflow_invocation_id):
+        # Called before the state of the invocation is read, so that wakes
+        # from then on prevent parking it
+        with self.parked_invocations_lock:
+            self.scheduling_invocations[workflow_invocation_id] = [None, False]
+
+    def __end_scheduling(self, workflow_invocation_id):
+        with self.parked_invocations_lock:
+            self.scheduling_invocations.pop(workflow_invocation_id, None)
+
+    def __park(self, workflow_invocation):
+        """
+        Park ``workflow_invocation`` unless it was woken since its scheduling
+        started, returns whether it was parked.
+        """
+        with self.parked_invocations_lock:
+            scheduling = self.scheduling_invocations.get(workflow_invocation.id)
+            if scheduling is not None and scheduling[1]:
+                return False
+            self.parked_invocations[workflow_invocation.id] = (workflow_invocation.history_id, time.time())
+            return True
+
+    def __wake_history(self, history_id):
+        with self.parked_invocations_lock:
+            for workflow_invocation_id, (parked_history_id, _) in list(self.parked_invocations.items()):
+                if parked_history_id == history_id:
+                    del self.parked_invocations[workflow_invocation_id]
+            for scheduling in self.scheduling_invocations.values():
+                if scheduling[0] == history_id:
+                    scheduling[1] = True
+
+    def __is_parked(self, workflow_invocation_id):
+        if not self.notify:
+            return False
+        with self.parked_invocations_lock:
+            parked = self.parked_invocations.get(workflow_invocation_id)
+            if parked is None:
+                return False
+            if time.time() - parked[1] >= WORKFLOW_SCHEDULING_NOTIFY_FALLBACK_INTERVAL:
+                del self.parked_invocations[workflow_invocation_id]
+                return False
+            return True
 
     def __schedule(self, workflow_scheduler_id, workflow_scheduler):
-        invocation_ids = self.__active_invocation_ids(workflow_scheduler_id)
-        for invocation_id in invocation_ids:
+        if self.work_queue is not None:
+            return self.__dispatch(workflow_scheduler_id, workflow_scheduler)
+        active_invocations = self.__active_invocations(workflow_scheduler_id)
+        for invocation_id, _ in active_invocations:
+            if self.__is_parked(invocation_id):
+                continue
             log.debug("Attempting to schedule workflow invocation [%s]", invocation_id)
             self.__attempt_schedule(invocation_id, workflow_scheduler)
             if not self.monitor_running:
                 return
 
+    def __dispatch(self, workflow_scheduler_id, workflow_scheduler):
+        active_invocations = self.__active_invocations(workflow_scheduler_id)
+        self.app.model.context.expunge_all()
+        serial_within_histories = self.app.config.history_local_serial_workflow_scheduling or \
+            not self.app.config.parallelize_workflow_scheduling_within_histories
+        invocation_ids_by_key = OrderedDict()
+        for invocation_id, history_id in active_invocations:
+            if self.__is_parked(invocation_id):
+                continue
+            key = ('history', history_id) if serial_within_histories else ('invocation', invocation_id)
+            invocation_ids_by_key.setdefault(key, []).append(invocation_id)
+        for key, invocation_ids in invocation_ids_by_key.items():
+            with self.scheduling_keys_lock:
+                if key in self.scheduling_keys:
+                    # Previous scheduling iteration still in progress
+                    continue
+                self.scheduling_keys.add(key)
+            self.work_queue.put((key, invocation_ids, workflow_scheduler))
+
+    def __work(self):
+        while True:
+            work = self.work_queue.get()
+            if work is STOP_SIGNAL:
+                return
+            key, invocation_ids, workflow_scheduler = work
+            try:
+                for invocation_id in invocation_ids:
+                    if not self.monitor_running:
+                        break
+                    log.debug("Attempting to schedule workflow invocation [%s]", invocation_id)
+                    self.__attempt_schedule(invocation_id, workflow_scheduler)
+            except Exception:
+                log.exception("Exception raised while attempting to schedule workflow requests.")
+            finally:
+                with self.scheduling_keys_lock:
+                    self.scheduling_keys.discard(key)
+
     def __attempt_schedule(self, invocation_id, workflow_scheduler):
         sa_session = self.app.model.context
+        if self.notify:
+            self.__start_scheduling(invocation_id)
         workflow_invocation = sa_session.query(model.WorkflowInvocation).get(invocation_id)
 
         try:
             if not workflow_invocation or not workflow_invocation.active:
                 return False
+            if self.notify:
+                with self.parked_invocations_lock:
+                    self.scheduling_invocations[invocation_id][0] = workflow_invocation.history_id
 
             # This ensures we're only ever working on the 'first' active
             # workflow invocation in a given history, to force sequential
@@ -306,30 +513,66 @@ class WorkflowRequestMonitor(Monitors):
             if self.app.config.history_local_serial_workflow_scheduling:
                 for i in workflow_invocation.history.workflow_invocations:
                     if i.active and i.id < workflow_invocation.id:
+                        if self.notify:
+                            # Woken when the active invocation is done scheduling
+                            self.__park(workflow_invocation)
                         return False
+            progress = self.notify and _scheduling_progress(sa_session, workflow_invocation)
             workflow_scheduler.schedule(workflow_invocation)
             log.debug("Workflow invocation [%s] scheduled", workflow_invocation.id)
+            if self.notify:
+                if not workflow_invocation.active:
+                    self.__wake_history(workflow_invocation.history_id)
+                elif _scheduling_progress(sa_session, workflow_invocation) == progress:
+                    if self.__park(workflow_invocation):
+                        log.debug("Workflow invocation [%s] made no progress, parked until notified", workflow_invocation.id)
+                else:
+                    self.schedule_again = True
+                    self.sleeper.wake()
         except Exception:
             # TODO: eventually fail this - or fail it right away?
             log.exception("Exception raised while attempting to schedule workflow request.")
             return False
         finally:
+            if self.notify:
+                self.__end_scheduling(invocation_id)
             sa_session.expunge_all()
 
         # A workflow was obtained and scheduled...
         return True
 
-    def __active_invocation_ids(self, scheduler_id):
+    def __active_invocations(self, scheduler_id):
         sa_session = self.app.model.context
         handler = self.app.config.server_name
         return model.WorkflowInvocation.poll_active_workflow_ids(
             sa_session,
             scheduler=scheduler_id,
             handler=handler,
+            include_history_id=True,
         )
 
     def start(self):
+        for worker in self.work_threads:
+            worker.start()
         self.monitor_thread.start()
+        if self.listener is not None:
+            self.listener.start()
 
     def shutdown(self):
+        if self.listener is not None:
+            self.listener.shutdown()
         self.shutdown_monitor()
+        for _ in self.work_threads:
+            self.work_queue.put(STOP_SIGNAL)
+        if self.monitor_join:
+            for worker in self.work_threads:
+                worker.join(self.monitor_join_sleep)
+
+
+def _scheduling_progress(sa_session, workflow_invocation):
+    """Summarize how far scheduling of ``workflow_invocation`` has come: its
+    state, the state of its steps and the number of jobs created for steps that
+    are not completely scheduled yet.
+    """
+    sa_session.flush()
+    return workflow_invocation.state, model.WorkflowInvocation.scheduling_progress(sa_session, workflow_invocation.id)
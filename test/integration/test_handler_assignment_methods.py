@@ -10,11 +10,12 @@ HANDLER_TEMPLATE_JOB_CONFIG_FILE = os.path.join(SCRIPT_DIRECTORY, "handler_templ
 
 class WritesConfig(object):
 
-    def _with_handlers_config(self, assign_with=None, default=None, handlers=None):
+    def _with_handlers_config(self, assign_with=None, default=None, handlers=None, grab_notify=None):
         handlers = handlers or []
         template = {
             'assign_with': ' assign_with="%s"' % assign_with if assign_with is not None else '',
             'default': ' default="%s"' % default if default is not None else '',
+            'grab_notify': ' grab_notify="%s"' % grab_notify if grab_notify is not None else '',
             'handlers': '\n'.join(
                 '<handler id="{id}"{tags}/>'.format(
                     id=x['id'],
@@ -78,3 +79,15 @@ class DBSkipLockedHandlerAssignmentMethodIntegrationTestCase(BaseHandlerAssignme
         self._skip_unless_postgres()
         tool_id = 'config_vars'
         self._run_tool_test(tool_id)
+
+
+class DBSkipLockedGrabNotifyHandlerAssignmentMethodIntegrationTestCase(BaseHandlerAssignmentMethodIntegrationTestCase):
+
+    def setUp(self):
+        self._with_handlers_config(assign_with='db-skip-locked', handlers=[{'id': 'main'}], grab_notify='true')
+        super(DBSkipLockedGrabNotifyHandlerAssignmentMethodIntegrationTestCase, self).setUp()
+
+    def test_handler_assignment(self):
+        self._skip_unless_postgres()
+        tool_id = 'config_vars'
+        self._run_tool_test(tool_id)
@@ -0,0 +1,61 @@
+"""Integration tests for batched job dispatch in job handlers."""
+
+from galaxy_test.base.populators import DatasetPopulator
+from galaxy_test.driver import integration_util
+
+
+class BatchDispatchIntegrationTestCase(integration_util.IntegrationTestCase):
+
+    framework_tool_and_types = True
+
+    def setUp(self):
+        super(BatchDispatchIntegrationTestCase, self).setUp()
+        self.dataset_populator = DatasetPopulator(self.galaxy_interactor)
+
+    @classmethod
+    def handle_galaxy_config_kwds(cls, config):
+        config["job_handler_batch_dispatch"] = True
+
+    def test_dispatch_many_jobs(self):
+        with self.dataset_populator.test_history() as history_id:
+            hda1 = self.dataset_populator.new_dataset(history_id, content="1 2 3")
+            outputs = []
+            for _ in range(5):
+                response = self.dataset_populator.run_tool(
+                    "cat",
+                    {"input1": {"src": "hda", "id": hda1["id"]}},
+                    history_id,
+                )
+                outputs.append(response["outputs"][0])
+            self.dataset_populator.wait_for_history(history_id, assert_ok=True)
+            for output in outputs:
+                content = self.dataset_populator.get_history_dataset_content(history_id, dataset=output)
+                assert content.strip() == "1 2 3"
+
+    def test_deleted_input_pauses_job(self):
+        with self.dataset_populator.test_history() as history_id:
+            hda1 = self.dataset_populator.new_dataset(history_id, content="1 2 3", wait=True)
+            first_response = self.dataset_populator.run_tool(
+                "cat_data_and_sleep",
+                {"input1": {"src": "hda", "id": hda1["id"]}, "sleep_time": 5},
+                history_id,
+            )
+            first_output = first_response["outputs"][0]
+            second_response = self.dataset_populator.run_tool(
+                "cat",
+                {"input1": {"src": "hda", "id": first_output["id"]}},
+                history_id,
+            )
+            # Delete the input of the second job while the first job is still running
+            sa_session = self._app.model.context.current
+            hda = sa_session.query(self._app.model.HistoryDatasetAssociation).get(self._app.security.decode_id(first_output["id"]))
+            hda.deleted = True
+            sa_session.flush()
+            job_id = second_response["jobs"][0]["id"]
+            self.galaxy_interactor.wait_for(lambda: self._get("jobs/%s" % job_id).json()['state'] == 'new',
+                                            what="Wait for job to be paused",
+                                            maxseconds=60)
+            assert self._get("jobs/%s" % job_id).json()['state'] == 'paused'
+            output = self.dataset_populator.get_history_dataset_details(history_id, dataset=second_response["outputs"][0], wait=False)
+            assert output["state"] == "paused"
+            assert "was deleted before the job started" in output["misc_info"]
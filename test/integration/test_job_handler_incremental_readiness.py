@@ -0,0 +1,38 @@
+"""Integration tests for incremental job readiness tracking in job handlers."""
+
+from galaxy_test.base.populators import DatasetPopulator
+from galaxy_test.driver import integration_util
+
+
+class IncrementalReadinessIntegrationTestCase(integration_util.IntegrationTestCase):
+
+    framework_tool_and_types = True
+
+    def setUp(self):
+        super(IncrementalReadinessIntegrationTestCase, self).setUp()
+        self.dataset_populator = DatasetPopulator(self.galaxy_interactor)
+
+    @classmethod
+    def handle_galaxy_config_kwds(cls, config):
+        config["job_handler_incremental_readiness"] = True
+        # Make sure dependent jobs are only picked up via the handler's own notifications.
+        config["job_handler_readiness_full_scan_interval"] = 100000
+
+    def test_chained_jobs(self):
+        with self.dataset_populator.test_history() as history_id:
+            hda1 = self.dataset_populator.new_dataset(history_id, content="1 2 3")
+            first_response = self.dataset_populator.run_tool(
+                "cat",
+                {"input1": {"src": "hda", "id": hda1["id"]}},
+                history_id,
+            )
+            first_output = first_response["outputs"][0]
+            # Queued before the first job completes, so this job can only become ready once its input is finished.
+            second_response = self.dataset_populator.run_tool(
+                "cat",
+                {"input1": {"src": "hda", "id": first_output["id"]}},
+                history_id,
+            )
+            self.dataset_populator.wait_for_history(history_id, assert_ok=True)
+            content = self.dataset_populator.get_history_dataset_content(history_id, dataset=second_response["outputs"][0])
+            assert content.strip() == "1 2 3"
@@ -89,3 +89,82 @@ steps:
             self.workflow_populator.wait_for_workflow(history_id, workflow_id, invocation_id)
             self.dataset_populator.wait_for_history(history_id, assert_ok=True)
             self.assertEqual("a\nc\nb\nd\ne\ng\nf\nh\n", self.dataset_populator.get_history_dataset_content(history_id, hid=0))
+
+
+class WorkflowSchedulingWorkersTestCase(integration_util.IntegrationTestCase):
+
+    framework_tool_and_types = True
+
+    def setUp(self):
+        super(WorkflowSchedulingWorkersTestCase, self).setUp()
+        self.dataset_populator = DatasetPopulator(self.galaxy_interactor)
+        self.workflow_populator = WorkflowPopulator(self.galaxy_interactor)
+
+    @classmethod
+    def handle_galaxy_config_kwds(cls, config):
+        config["workflow_scheduling_workers"] = 2
+
+    def test_invocations_scheduled(self):
+        workflow_id = self.workflow_populator.upload_yaml_workflow("""
+class: GalaxyWorkflow
+steps:
+  - type: input
+  - tool_id: cat1
+    state:
+      input1:
+        $link: 0
+""")
+        with self.dataset_populator.test_history() as history_id:
+            hda1 = self.dataset_populator.new_dataset(history_id, content="1 2 3", wait=True)
+            inputs = {
+                '0': {"src": "hda", "id": hda1["id"]},
+            }
+            invocation_ids = [self.workflow_populator.invoke_workflow(history_id, workflow_id, inputs) for _ in range(3)]
+            for invocation_id in invocation_ids:
+                self.workflow_populator.wait_for_workflow(history_id, workflow_id, invocation_id)
+            self.dataset_populator.wait_for_history(history_id, assert_ok=True)
+            for hid in (2, 3, 4):
+                self.assertEqual("1 2 3\n", self.dataset_populator.get_history_dataset_content(history_id, hid=hid))
+
+
+class WorkflowSchedulingNotifyTestCase(integration_util.IntegrationTestCase):
+
+    framework_tool_and_types = True
+
+    def setUp(self):
+        super(WorkflowSchedulingNotifyTestCase, self).setUp()
+        self.dataset_populator = DatasetPopulator(self.galaxy_interactor)
+        self.workflow_populator = WorkflowPopulator(self.galaxy_interactor)
+
+    @classmethod
+    def handle_galaxy_config_kwds(cls, config):
+        config["workflow_scheduling_notify"] = True
+
+    def test_invocation_woken_by_job_completion(self):
+        # The second step can only be scheduled once the first step's job is
+        # complete, so the invocation is parked in between.
+        workflow_id = self.workflow_populator.upload_yaml_workflow("""
+class: GalaxyWorkflow
+steps:
+  - type: input
+  - tool_id: cat1
+    state:
+      input1:
+        $link: 0
+  - tool_id: cat1
+    state:
+      input1:
+        $link: 1#out_file1
+""")
+        with self.dataset_populator.test_history() as history_id:
+            hda1 = self.dataset_populator.new_dataset(history_id, content="1 2 3", wait=True)
+            inputs = {
+                '0': {"src": "hda", "id": hda1["id"]},
+            }
+            start = time.time()
+            invocation_id = self.workflow_populator.invoke_workflow(history_id, workflow_id, inputs)
+            self.workflow_populator.wait_for_workflow(history_id, workflow_id, invocation_id)
+            self.dataset_populator.wait_for_history(history_id, assert_ok=True)
+            # Well before the fallback interval
+            assert time.time() - start < 45
+            self.assertEqual("1 2 3\n", self.dataset_populator.get_history_dataset_content(history_id, hid=3))
@@ -1,12 +1,19 @@
+import gzip
+import os
 import tempfile
 
 import pytest
 
+from galaxy.datatypes.registry import example_datatype_registry_for_sample
 from galaxy.datatypes.sniff import (
     convert_newlines,
     convert_newlines_sep2tabs,
+    FilePrefix,
     get_test_fname,
+    run_sniffers_raw,
+    SniffIndex,
 )
+from galaxy.util import compression_utils
 
 
 def assert_converts_to_1234_convert_sep2tabs(content, expected='1\t2\n3\t4\n'):
@@ -76,3 +83,79 @@ def test_convert_sep2tabs(source, expected):
         assert_converts_to_1234_convert_sep2tabs(source, expected=expected)
     else:
         assert_converts_to_1234_convert_sep2tabs(source)
+
+
+def _run_sniffers_sequentially(fname, sniff_order, is_binary=False):
+    # Reference implementation, every sniffer called in order without any index.
+    file_prefix = FilePrefix(fname)
+    for datatype in sniff_order:
+        try:
+            if hasattr(datatype, "sniff_prefix"):
+                datatype_compressed = getattr(datatype, "compressed", False)
+                if datatype_compressed != bool(file_prefix.compressed_format):
+                    continue
+                if file_prefix.compressed_format and getattr(datatype, "compressed_format"):
+                    if file_prefix.compressed_format != datatype.compressed_format:
+                        continue
+                if datatype.sniff_prefix(file_prefix):
+                    return datatype.file_ext
+            elif is_binary and not datatype.is_binary:
+                continue
+            elif datatype.sniff(fname):
+                return datatype.file_ext
+        except Exception:
+            pass
+    return None
+
+
+def test_sniff_index_matches_sequential_sniffing():
+    sniff_order = example_datatype_registry_for_sample().sniff_order
+    sniff_index = SniffIndex(sniff_order)
+    test_dir = os.path.dirname(get_test_fname("1.bed"))
+    for name in sorted(os.listdir(test_dir)):
+        fname = os.path.join(test_dir, name)
+        if not os.path.isfile(fname):
+            continue
+        for is_binary in (False, True):
+            expected = _run_sniffers_sequentially(fname, sniff_order, is_binary=is_binary)
+            assert run_sniffers_raw(fname, sniff_index, is_binary=is_binary) == expected, name
+
+
+def test_file_prefix_reads_lazily():
+    with tempfile.NamedTemporaryFile(delete=False, mode='wb') as tf:
+        tf.write(b"MAGIC" + b"\0" * 10000 + b"\xff")
+    file_prefix = FilePrefix(tf.name)
+    assert file_prefix.bytes_view(5).tobytes() == b"MAGIC"
+    assert not file_prefix._complete
+    assert file_prefix.compressed_format is None
+    assert file_prefix.binary
+    assert len(file_prefix.bytes_view()) == 10006
+
+
+def test_file_prefix_extends_partial_read(monkeypatch):
+    with tempfile.NamedTemporaryFile(delete=False, mode='wb', suffix='.gz') as tf:
+        with gzip.GzipFile(fileobj=tf, mode='wb') as gz:
+            gz.write(b"".join(b"%d\t%d\n" % (i, i) for i in range(5000)))
+    opened = []
+    get_fileobj_raw = compression_utils.get_fileobj_raw
+
+    def counting_get_fileobj_raw(*args):
+        opened.append(args)
+        return get_fileobj_raw(*args)
+
+    monkeypatch.setattr(compression_utils, 'get_fileobj_raw', counting_get_fileobj_raw)
+    with FilePrefix(tf.name) as file_prefix:
+        assert file_prefix.bytes_view(4).tobytes() == b"0\t0\n"
+        assert file_prefix.compressed_format == 'gzip'
+        assert file_prefix._fh is not None
+        assert file_prefix.contents_header == "".join("%d\t%d\n" % (i, i) for i in range(5000))
+        assert file_prefix._fh is None
+    assert len(opened) == 1
+
+
+def test_file_prefix_split_lines_cached():
+    file_prefix = FilePrefix(get_test_fname("1.bed"))
+    rows = list(file_prefix.split_line_iterator("\t"))
+    rows[0].append("modified")
+    assert list(file_prefix.split_line_iterator("\t")) == [line.rstrip("\n").split("\t") for line in file_prefix.line_iterator()]
+    assert list(file_prefix.line_iterator()) == file_prefix.string_io().readlines()
@@ -0,0 +1,260 @@
+import io
+import json
+import os
+import random
+
+import pytest
+
+from galaxy import util
+from galaxy.datatypes.registry import Registry
+from galaxy.datatypes.tabular import (
+    _count_and_sample_lines,
+    ColumnTypesAccumulator,
+    Tabular,
+)
+from galaxy.datatypes.util.generic_util import (
+    read_line_offset,
+    write_line_offset_index,
+)
+from galaxy.datatypes.util.line_scan import DataLineCounter
+from galaxy.exceptions import RequestParameterInvalidException
+from galaxy.util.bunch import Bunch
+from .util import (
+    get_dataset,
+    get_input_files,
+    get_tmp_path,
+)
+
+
+class IndexedTabular(Tabular):
+    line_offset_index_min_size = 0
+    line_offset_index_interval = 3
+
+
+class SampledTabular(Tabular):
+    column_type_sampling_min_size = 0
+    column_type_sample_head_lines = 50
+    column_type_sample_blocks = 8
+    column_type_sample_block_size = 2048
+
+
+class VectorizedTabular(Tabular):
+    vectorized_column_types = True
+
+
+def _line_offsets(filename):
+    with open(filename, 'rb') as fh:
+        lines = fh.readlines()
+    return [sum(len(line) for line in lines[:i]) for i in range(len(lines) + 1)]
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 2 ** 20])
+def test_write_line_offset_index(block_size):
+    with get_input_files('1.bed') as input_files, get_tmp_path() as index_path:
+        write_line_offset_index(input_files[0], index_path, 2, block_size=block_size)
+        offsets = _line_offsets(input_files[0])
+        for line in range(len(offsets) + 3):
+            indexed_line = min(line // 2 * 2, (len(offsets) - 1) // 2 * 2)
+            assert read_line_offset(index_path, line) == (indexed_line, offsets[indexed_line])
+
+
+def test_line_offset_index_interval():
+    with get_input_files('1.bed') as input_files, get_tmp_path() as index_path:
+        offsets = _line_offsets(input_files[0])
+        # The interval is read from the index
+        write_line_offset_index(input_files[0], index_path, 7)
+        assert read_line_offset(index_path, 20) == (14, offsets[14])
+        # Indexes without a header are ignored
+        with open(index_path, 'wb') as fh:
+            fh.write(b'\0' * 64)
+        assert read_line_offset(index_path, 20) == (0, 0)
+
+
+def test_line_offset_index_min_size_from_config():
+    galaxy_dir = util.galaxy_directory()
+    sample_conf = os.path.join(galaxy_dir, "lib", "galaxy", "config", "sample", "datatypes_conf.xml.sample")
+    assert Tabular.line_offset_index_min_size is None
+    registry = Registry(Bunch(tabular_line_offset_index_min_size=1024))
+    registry.load_datatypes(root_dir=galaxy_dir, config=sample_conf)
+    assert registry.get_datatype_by_extension('tabular').line_offset_index_min_size == 1024
+    assert registry.get_datatype_by_extension('bed').line_offset_index_min_size == 1024
+    # The option is passed on to metadata setting with the registry
+    with get_tmp_path() as registry_path:
+        registry.to_xml_file(registry_path)
+        metadata_registry = Registry()
+        metadata_registry.load_datatypes(root_dir=galaxy_dir, config=registry_path)
+    assert metadata_registry.get_datatype_by_extension('tabular').line_offset_index_min_size == 1024
+
+
+def test_get_line_offset_with_index():
+    tabular = IndexedTabular()
+    with get_dataset('1.bed', index_attr='line_offset_index') as dataset:
+        tabular.set_line_offset_index(dataset)
+        assert os.path.exists(dataset.metadata.line_offset_index.file_name)
+        offsets = _line_offsets(dataset.file_name)
+        for line in range(len(offsets) + 2):
+            assert tabular.get_line_offset(dataset, line) == offsets[min(line, len(offsets) - 1)]
+
+
+def test_get_line_offset_without_index():
+    tabular = Tabular()
+    with get_dataset('1.bed', index_attr='line_offset_index') as dataset:
+        tabular.set_line_offset_index(dataset)
+        assert not os.path.exists(dataset.metadata.line_offset_index.file_name)
+        offsets = _line_offsets(dataset.file_name)
+        for line in range(len(offsets) + 2):
+            assert tabular.get_line_offset(dataset, line) == offsets[min(line, len(offsets) - 1)]
+
+
+def test_get_chunk():
+    with get_tmp_path() as path:
+        with open(path, 'w') as fh:
+            fh.write('a\tb\nc\td\ne\tf\n')
+        dataset = Bunch(file_name=path)
+        chunk = json.loads(Tabular().get_chunk(None, dataset, offset=0, ck_size=5))
+        # The partial last line is finished, without its newline
+        assert chunk['ck_data'] == 'a\tb\nc\td'
+        assert chunk['offset'] == 8
+        chunk = json.loads(Tabular().get_chunk(None, dataset, offset=chunk['offset'], ck_size=5))
+        assert chunk['ck_data'] == 'e\tf\n'
+        assert chunk['offset'] == 12
+
+
+@pytest.mark.parametrize('line', ['abc', '-1', '1.5'])
+def test_display_data_invalid_line(line):
+    with get_dataset('1.bed') as dataset:
+        with pytest.raises(RequestParameterInvalidException):
+            Tabular().display_data(None, dataset, line=line)
+
+
+def test_set_meta_feeds_line_accumulators():
+    tabular = Tabular()
+    counter = DataLineCounter()
+    with get_dataset('1.bed', index_attr='line_offset_index') as dataset:
+        tabular.set_meta(dataset, max_data_lines=10, line_accumulators=[counter])
+        # Column types are only guessed from the first lines, but accumulators see the whole file.
+        assert dataset.metadata.data_lines is None
+        assert dataset.metadata.columns == 6
+        assert counter.data_lines == 65
+
+
+def _write_tabular(path, rows, rare_every=None, seed=1):
+    rng = random.Random(seed)
+    with open(path, 'w') as fh:
+        fh.write('#header\tline\n')
+        for i in range(rows):
+            if i % 997 == 0:
+                fh.write('# comment\n')
+            if i % 1499 == 0:
+                fh.write('\n')
+            fields = [str(rng.randint(0, 10 ** 6)), '%.3f' % rng.random(), '1,2,%d' % i, 'chr%d' % rng.randint(1, 22)]
+            if rare_every and i % rare_every == rare_every - 1:
+                fields[0] = 'NA'
+            fh.write('\t'.join(fields) + '\n')
+
+
+def _set_meta(datatype, path, **kwd):
+    dataset = Bunch(file_name=path, has_data=lambda: True, metadata=Bunch(line_offset_index=None))
+    datatype.set_meta(dataset, **kwd)
+    return dataset.metadata
+
+
+@pytest.mark.parametrize('block_size', [64, 1000, 2 ** 20])
+def test_count_and_sample_lines(block_size):
+    with get_tmp_path() as path:
+        with open(path, 'wb') as fh:
+            fh.write(b'a\tb\n#c\n\n\r\nd\n\n\n#e\nf\tg\n\rh\ri\r\n\r#j\r' * 50 + b'last')
+        with open(path, 'rb') as fh:
+            lines, comment_lines, samples = _count_and_sample_lines(fh, 4, 32, random.Random(0), block_size=block_size)
+        # Lines are counted like when reading them in universal newlines mode
+        with io.open(path, 'r') as fh:
+            all_lines = fh.readlines()
+        assert lines == len(all_lines)
+        assert comment_lines == len([line for line in all_lines if not line.rstrip('\r\n') or line.startswith('#')])
+        assert 0 < len(samples) <= 4
+        assert all(sample.endswith((b'\n', b'\r')) or sample.endswith(b'last') for sample in samples)
+
+
+@pytest.mark.parametrize('rare_every', [None, 5000])
+def test_sampled_column_types_accuracy(rare_every):
+    # Compares sampled metadata with a full scan, line counts must be exact
+    # while column types are expected to match unless a value of a more
+    # general type is too rare to be sampled.
+    with get_tmp_path() as path:
+        _write_tabular(path, 20000, rare_every=rare_every)
+        full = _set_meta(Tabular(), path, max_data_lines=None)
+        sampled = _set_meta(SampledTabular(), path, max_data_lines=None)
+        assert sampled.data_lines == full.data_lines == 20000
+        assert sampled.comment_lines == full.comment_lines
+        assert sampled.columns == full.columns
+        matching = [a == b for a, b in zip(sampled.column_types, full.column_types)]
+        if rare_every is None:
+            assert all(matching)
+        else:
+            assert full.column_types[0] == 'float'
+            assert matching[1:] == [True, True, True]
+
+
+def test_sampled_line_counts_with_carriage_returns():
+    with get_tmp_path() as path:
+        with open(path, 'wb') as fh:
+            for i in range(2000):
+                fh.write(b'%d\t%d.5%s' % (i, i, (b'\r', b'\r\n', b'\n', b'\r\r')[i % 4]))
+        full = _set_meta(Tabular(), path, max_data_lines=None)
+        sampled = _set_meta(SampledTabular(), path, max_data_lines=None)
+        assert sampled.data_lines == full.data_lines == 2000
+        assert sampled.comment_lines == full.comment_lines == 500
+        assert sampled.column_types == full.column_types == ['int', 'float']
+
+
+def test_sampled_column_types_with_max_data_lines():
+    with get_tmp_path() as path:
+        _write_tabular(path, 20000)
+        sampled = _set_meta(SampledTabular(), path)
+        assert sampled.data_lines is None
+        assert sampled.column_types == ['int', 'float', 'list', 'str']
+
+
+@pytest.mark.parametrize('skip', [None, 0])
+@pytest.mark.parametrize('block_lines', [1, 3, 10000])
+def test_vectorized_column_types_match(skip, block_lines):
+    values = ['1', '-2', ' 7 ', '+3', '1_000', '9' * 30, '1.5', '1e5', 'nan', 'inf', 'NA', ' na ', '1,2', 'a,b', 'abc', '']
+    rng = random.Random(2)
+    lines = ['#comment', 'h1\th2\th3']
+    for _ in range(200):
+        lines.append('\t'.join(rng.choice(values) for _ in range(rng.randint(1, 5))))
+    # Columns holding only some of the values, in random order
+    for kinds in (values[:6], values[:11], values[:12] + ['1,2'], values[:13] + ['x']):
+        for _ in range(3):
+            lines.append('\t'.join(rng.choice(kinds) for _ in range(4)))
+    for i in range(0, len(lines), 7):
+        expected = ColumnTypesAccumulator(skip=skip)
+        vectorized = ColumnTypesAccumulator(skip=skip, vectorized=True, block_lines=block_lines)
+        for line in lines[i:] + lines[:i]:
+            expected.feed(line + '\n')
+            vectorized.feed(line + '\n')
+        assert vectorized.get_column_types() == expected.get_column_types()
+
+
+def test_vectorized_column_stats():
+    with get_tmp_path() as path:
+        with open(path, 'w') as fh:
+            fh.write('name\tcount\tscore\n1\t5\t0.5\n#comment\n2\t\tNA\n3\t-4\tnan\nx\t12\t2.5\textra\n')
+        metadata = _set_meta(VectorizedTabular(), path)
+        assert metadata.column_types == ['str', 'int', 'float', 'str']
+        assert metadata.column_mins == [None, -4, 0.5, None]
+        assert metadata.column_maxs == [None, 12, 2.5, None]
+        assert metadata.column_null_counts == [0, 1, 2, 3]
+        full = _set_meta(Tabular(), path)
+        assert full.column_types == metadata.column_types
+        assert 'column_mins' not in full
+
+
+def test_vectorized_column_stats_infinite_values():
+    with get_tmp_path() as path:
+        with open(path, 'w') as fh:
+            fh.write('a\tb\n1.5\tinf\n-inf\t-Infinity\n-2\tinf\n')
+        metadata = _set_meta(VectorizedTabular(), path)
+        assert metadata.column_types == ['float', 'float']
+        assert metadata.column_mins == [-2, None]
+        assert metadata.column_maxs == [1.5, None]
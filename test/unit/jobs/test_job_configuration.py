@@ -79,11 +79,12 @@ class BaseJobConfXmlParserTestCase(unittest.TestCase):
         self._uwsgi_opt = uwsgi_opt
         self._application_stack = UWSGIApplicationStack()
 
-    def _with_handlers_config(self, assign_with=None, default=None, handlers=None, base_pools=None):
+    def _with_handlers_config(self, assign_with=None, default=None, handlers=None, base_pools=None, grab_notify=None):
         handlers = handlers or []
         template = {
             'assign_with': ' assign_with="%s"' % assign_with if assign_with is not None else '',
             'default': ' default="%s"' % default if default is not None else '',
+            'grab_notify': ' grab_notify="%s"' % grab_notify if grab_notify is not None else '',
             'handlers': '\n'.join(
                 '<handler id="{id}"{tags}/>'.format(
                     id=x['id'],
@@ -208,6 +209,23 @@ class SimpleJobConfXmlParserTestCase(BaseJobConfXmlParserTestCase):
         assert self.job_config.default_handler_id is None
         assert self.job_config.handlers == {}
 
+    def test_db_skip_locked_grab_notify(self):
+        self._with_handlers_config(assign_with='db-skip-locked')
+        assert not self.job_config.handler_grab_notify
+        self._job_configuration = None
+        self._with_handlers_config(assign_with='db-skip-locked', grab_notify='true')
+        assert self.job_config.handler_assignment_methods == ['db-skip-locked']
+        assert self.job_config.handler_grab_notify
+        assert self.job_config.grab_handler_assignment
+
+    def test_grab_handler_assignment(self):
+        self._with_handlers_config(assign_with='db-preassign', handlers=[{'id': 'handler0'}], grab_notify='true')
+        assert self.job_config.handler_grab_notify
+        assert not self.job_config.grab_handler_assignment
+        self._job_configuration = None
+        self._with_handlers_config(assign_with='db-transaction-isolation', grab_notify='true')
+        assert self.job_config.grab_handler_assignment
+
     def test_explicit_db_skip_locked_handler_assign_with_uwsgi(self):
         self._with_handlers_config(assign_with='db-skip-locked', handlers=[{'id': 'handler0'}])
         self._with_uwsgi_application_stack(mule='lib/galaxy/main.py', farm='job-handlers:1')
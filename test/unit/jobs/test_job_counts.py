@@ -0,0 +1,79 @@
+from galaxy import model
+from galaxy.jobs.handler import ActiveJobCounts
+from galaxy.model import mapping
+
+
+def test_reconcile():
+    sa_session = __sa_session()
+    user1, user2 = __add_users(sa_session)
+    __add_job(sa_session, user1, "local", model.Job.states.QUEUED)
+    __add_job(sa_session, user1, "local", model.Job.states.RUNNING)
+    __add_job(sa_session, user1, "cluster", model.Job.states.RESUBMITTED)
+    __add_job(sa_session, user2, "cluster", model.Job.states.RUNNING)
+    __add_job(sa_session, user2, "cluster", model.Job.states.OK)
+    __add_job(sa_session, user2, "cluster", model.Job.states.NEW)
+
+    job_counts = ActiveJobCounts(sa_session, 60)
+    job_counts.reconcile()
+    assert job_counts.get_user_job_count(user1.id) == 3
+    assert job_counts.get_user_job_count(user2.id) == 1
+    # Resubmitted jobs only count towards the user limit
+    assert job_counts.get_user_job_count_per_destination(user1.id) == {"local": 2}
+    assert job_counts.get_user_job_count_per_destination(user2.id) == {"cluster": 1}
+    assert job_counts.get_total_job_count_per_destination() == {"local": 2, "cluster": 1}
+
+
+def test_state_changes():
+    sa_session = __sa_session()
+    user1, user2 = __add_users(sa_session)
+    job_counts = ActiveJobCounts(sa_session, 60)
+    job_counts.reconcile()
+    assert job_counts.get_user_job_count(user1.id) == 0
+
+    job_counts.job_dispatched(1, user1.id, "local")
+    job_counts.job_dispatched(2, user1.id, "cluster")
+    job_counts.job_dispatched(3, user2.id, "cluster")
+    job_counts.job_state_changed(1, model.Job.states.RUNNING)
+    assert job_counts.get_user_job_count(user1.id) == 2
+    assert job_counts.get_user_job_count_per_destination(user1.id) == {"local": 1, "cluster": 1}
+    assert job_counts.get_total_job_count_per_destination() == {"local": 1, "cluster": 2}
+
+    job_counts.job_state_changed(2, model.Job.states.RESUBMITTED)
+    assert job_counts.get_user_job_count(user1.id) == 2
+    assert job_counts.get_user_job_count_per_destination(user1.id) == {"local": 1}
+    # Redispatching a resubmitted job replaces its previous destination
+    job_counts.job_dispatched(2, user1.id, "local")
+    assert job_counts.get_user_job_count(user1.id) == 2
+    assert job_counts.get_user_job_count_per_destination(user1.id) == {"local": 2}
+
+    job_counts.job_state_changed(1, model.Job.states.OK)
+    job_counts.job_state_changed(3, model.Job.states.ERROR)
+    # Unknown jobs are ignored
+    job_counts.job_state_changed(4, model.Job.states.RUNNING)
+    job_counts.job_state_changed(5, model.Job.states.OK)
+    assert job_counts.get_user_job_count(user1.id) == 1
+    assert job_counts.get_user_job_count(user2.id) == 0
+    assert job_counts.get_user_job_count_per_destination(user2.id) == {}
+    assert job_counts.get_total_job_count_per_destination() == {"local": 1}
+
+
+def __sa_session():
+    return mapping.init("/tmp", "sqlite:///:memory:", create_tables=True).context
+
+
+def __add_users(sa_session):
+    user1 = model.User(email="u1@example.com", password="pass1")
+    user2 = model.User(email="u2@example.com", password="pass2")
+    sa_session.add_all([user1, user2])
+    sa_session.flush()
+    return user1, user2
+
+
+def __add_job(sa_session, user, destination_id, state):
+    job = model.Job()
+    job.user = user
+    job.destination_id = destination_id
+    job.state = state
+    sa_session.add(job)
+    sa_session.flush()
+    return job
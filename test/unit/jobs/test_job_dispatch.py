@@ -0,0 +1,63 @@
+from galaxy.jobs.handler import (
+    DEFAULT_JOB_PUT_FAILURE_MESSAGE,
+    DefaultJobDispatcher,
+)
+from galaxy.jobs.runners import BaseJobRunner
+from galaxy.util import bunch
+
+
+class QueueingRunner(BaseJobRunner):
+
+    def __init__(self):
+        self.queued = []
+
+    def mark_as_queued(self, job_wrapper):
+        self.queued.append(job_wrapper)
+
+
+class PutRunner(QueueingRunner):
+
+    def put(self, job_wrapper):
+        self.queued.append(("put", job_wrapper))
+
+
+class MockJobWrapper(object):
+
+    def __init__(self, job_id, runner, enqueue_fails=False):
+        self.job_id = job_id
+        self.job_destination = bunch.Bunch(runner=runner)
+        self.enqueue_fails = enqueue_fails
+        self.failed = None
+
+    def can_split(self):
+        return False
+
+    def enqueue(self, flush=True):
+        assert not flush
+        if self.enqueue_fails:
+            raise Exception("enqueue failed")
+
+    def fail(self, message):
+        self.failed = message
+
+
+def test_put_batch():
+    flushes = []
+    dispatcher = DefaultJobDispatcher.__new__(DefaultJobDispatcher)
+    dispatcher.app = bunch.Bunch(model=bunch.Bunch(context=bunch.Bunch(flush=lambda: flushes.append(True))))
+    dispatcher.job_runners = {"local": QueueingRunner(), "custom": PutRunner()}
+    job_wrappers = [
+        MockJobWrapper(1, "local"),
+        MockJobWrapper(2, "local", enqueue_fails=True),
+        MockJobWrapper(3, "custom"),
+        MockJobWrapper(4, "missing"),
+    ]
+    dispatcher.put_batch(job_wrappers)
+    assert flushes == [True]
+    assert dispatcher.job_runners["local"].queued == [job_wrappers[0]]
+    # Runners overriding put still get their jobs through it
+    assert dispatcher.job_runners["custom"].queued == [("put", job_wrappers[2])]
+    # Jobs that couldn't be enqueued are failed rather than left queued
+    assert [job_wrapper.failed for job_wrapper in job_wrappers] == [
+        None, DEFAULT_JOB_PUT_FAILURE_MESSAGE, None, DEFAULT_JOB_PUT_FAILURE_MESSAGE
+    ]
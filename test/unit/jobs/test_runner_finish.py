@@ -0,0 +1,91 @@
+import os
+import tempfile
+
+from galaxy.jobs.runners import (
+    AsynchronousJobRunner,
+    AsynchronousJobState,
+)
+from galaxy.util import bunch
+
+
+class FinishRunner(AsynchronousJobRunner):
+    runner_name = "FinishRunner"
+
+    def __init__(self, **kwargs):
+        app = bunch.Bunch(
+            config=bunch.Bunch(redact_email_in_job_name=True, retry_job_output_collection=2),
+            model=bunch.Bunch(context=None),
+            application_stack=bunch.Bunch(register_postfork_function=lambda f: None),
+        )
+        super(FinishRunner, self).__init__(app, 1, **kwargs)
+        self._init_worker_threads()
+        self.finished = []
+        self.failed = []
+
+    def _finish_or_resubmit_job(self, job_state, stdout, stderr, **kwds):
+        self.finished.append((stdout, stderr))
+
+    def mark_as_failed(self, job_state):
+        self.failed.append(job_state.fail_message)
+
+
+def test_finish_queue_default():
+    runner = FinishRunner()
+    assert runner.finish_queue is runner.work_queue
+    assert runner.finish_threads == []
+
+
+def test_finish_workers():
+    runner = FinishRunner(finish_workers="3")
+    assert runner.finish_queue is not runner.work_queue
+    assert len(runner.finish_threads) == 3
+    job_state = __job_state(tempfile.mkdtemp())
+    runner.mark_as_finished(job_state)
+    assert runner.work_queue.empty()
+    assert runner.finish_queue.get_nowait() == (runner.finish_job, job_state)
+
+
+def test_finish_job_waits_for_output():
+    runner = FinishRunner()
+    directory = tempfile.mkdtemp()
+    job_state = __job_state(directory)
+    assert runner.finish_job(job_state) is False
+    # The job is handed back to the monitor instead of blocking the worker
+    assert runner.finished == []
+    retry_time, waiting_job_state = runner.output_wait_queue.get_nowait()
+    assert waiting_job_state is job_state
+    runner.output_wait_queue.put((0, job_state))
+    runner.check_waiting_for_output()
+    assert runner.waiting_for_output == []
+    assert runner.work_queue.get_nowait() == (runner.finish_job, job_state)
+    for name in ("stdout", "stderr"):
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(name)
+    assert runner.finish_job(job_state) is True
+    assert runner.finished == [("stdout", "stderr")]
+
+
+def test_finish_job_output_not_returned():
+    runner = FinishRunner()
+    job_state = __job_state(tempfile.mkdtemp())
+    for _ in range(3):
+        runner.finish_job(job_state)
+    assert runner.output_wait_queue.qsize() == 2
+    assert runner.failed == [job_state.runner_states.JOB_OUTPUT_NOT_RETURNED_FROM_CLUSTER]
+    assert runner.finished == []
+
+
+def __job_state(directory):
+    job_wrapper = bunch.Bunch(
+        app=bunch.Bunch(config=bunch.Bunch(redact_email_in_job_name=True)),
+        tool=bunch.Bunch(old_id=None),
+        user=None,
+        get_id_tag=lambda: "1",
+        reclaim_ownership=lambda: None,
+    )
+    return AsynchronousJobState(
+        job_wrapper=job_wrapper,
+        job_id="1",
+        output_file=os.path.join(directory, "stdout"),
+        error_file=os.path.join(directory, "stderr"),
+    )
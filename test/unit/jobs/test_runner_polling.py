@@ -0,0 +1,121 @@
+from galaxy.jobs.runners import (
+    AsynchronousJobRunner,
+    AsynchronousJobState,
+)
+from galaxy.jobs.runners import slurm
+from galaxy.util import bunch
+
+
+class BatchRunner(AsynchronousJobRunner):
+    runner_name = "BatchRunner"
+
+    def __init__(self, **kwargs):
+        app = bunch.Bunch(config=bunch.Bunch(redact_email_in_job_name=True), model=bunch.Bunch(context=None))
+        super(BatchRunner, self).__init__(app, 1, **kwargs)
+        self.batches = []
+        self.states = {}
+
+    def check_watched_items_batch(self, watched):
+        self.batches.append([ajs.job_id for ajs in watched])
+        new_watched = []
+        for ajs in watched:
+            state = self.states.get(ajs.job_id, "running")
+            if state != "ok":
+                ajs.old_state = state
+                new_watched.append(ajs)
+        return new_watched
+
+
+def test_batch_check():
+    runner = __runner()
+    runner.states["1"] = "ok"
+    runner.check_watched_items()
+    assert runner.batches == [["1", "2", "3"]]
+    assert [ajs.job_id for ajs in runner.watched] == ["2", "3"]
+
+
+def test_default_check_watched_items_batch():
+    checked = []
+
+    class ItemRunner(BatchRunner):
+
+        check_watched_items_batch = AsynchronousJobRunner.check_watched_items_batch
+
+        def check_watched_item(self, job_state):
+            checked.append(job_state.job_id)
+            if job_state.job_id != "2":
+                return job_state
+
+    runner = __runner(runner_class=ItemRunner)
+    runner.check_watched_items()
+    assert checked == ["1", "2", "3"]
+    assert [ajs.job_id for ajs in runner.watched] == ["1", "3"]
+
+
+def test_adaptive_polling():
+    runner = __runner(max_poll_interval="4")
+    for ajs in runner.watched:
+        assert ajs.poll_interval == 1
+    runner.check_watched_items()
+    # All jobs were new, so nothing backs off yet
+    for ajs in runner.watched:
+        assert ajs.poll_interval == 1
+        ajs.next_poll_time = 0
+    runner.check_watched_items()
+    for ajs in runner.watched:
+        assert ajs.poll_interval == 2
+        ajs.next_poll_time = 0
+    runner.states["2"] = "queued"
+    runner.check_watched_items()
+    assert [ajs.poll_interval for ajs in runner.watched] == [4, 1, 4]
+    for ajs in runner.watched:
+        ajs.next_poll_time = 0
+    runner.check_watched_items()
+    assert [ajs.poll_interval for ajs in runner.watched] == [4, 2, 4]
+    # Jobs not due for a check are not passed to the runner
+    runner.check_watched_items()
+    assert runner.batches[-1] == ["1", "2", "3"]
+    assert len(runner.batches) == 4
+
+
+def test_slurm_job_states(monkeypatch):
+    commands = []
+
+    def execute(cmd):
+        commands.append(cmd)
+        if "-M" in cmd:
+            return "CLUSTER: c2\n7 RUNNING\n"
+        return "1 PENDING\n2 RUNNING\n"
+
+    monkeypatch.setattr(slurm.commands, "execute", execute)
+    runner = slurm.SlurmJobRunner.__new__(slurm.SlurmJobRunner)
+    runner.drmaa_job_states = bunch.Bunch(
+        QUEUED_ACTIVE="queued", SYSTEM_ON_HOLD="held", RUNNING="running", SYSTEM_SUSPENDED="suspended"
+    )
+    watched = [AsynchronousJobState(job_id=job_id) for job_id in ["1", "2", "3", "7.c2"]]
+    assert runner._get_job_states(watched) == {"1": "queued", "2": "running", "7.c2": "running"}
+    # One squeue call per cluster, job 3 left the queue and is checked through DRMAA
+    assert len(commands) == 2
+    assert ["squeue", "-h", "-o", "%i %T", "-j", "1,2,3"] in commands
+    assert ["squeue", "-h", "-o", "%i %T", "-M", "c2", "-j", "7"] in commands
+
+
+def test_slurm_job_states_left_queue(monkeypatch):
+    def execute(cmd):
+        raise slurm.commands.CommandLineException(" ".join(cmd), "2 RUNNING\n", "slurm_load_jobs error: Invalid job id specified\n", 1)
+
+    monkeypatch.setattr(slurm.commands, "execute", execute)
+    runner = slurm.SlurmJobRunner.__new__(slurm.SlurmJobRunner)
+    runner.drmaa_job_states = bunch.Bunch(
+        QUEUED_ACTIVE="queued", SYSTEM_ON_HOLD="held", RUNNING="running", SYSTEM_SUSPENDED="suspended"
+    )
+    watched = [AsynchronousJobState(job_id=job_id) for job_id in ["1", "2"]]
+    # Jobs squeue didn't list are checked through DRMAA
+    assert runner._get_job_states(watched) == {"2": "running"}
+
+
+def __runner(runner_class=BatchRunner, **kwargs):
+    runner = runner_class(**kwargs)
+    for job_id in ["1", "2", "3"]:
+        runner.watched.append(AsynchronousJobState(job_id=job_id))
+    return runner
@@ -554,6 +554,54 @@ class MappingTests(unittest.TestCase):
 
         assert u1 != u2
 
+    def test_workflow_invocation_notifications(self):
+        model = self.model
+        user = model.User(email="testworkflownotifications@bx.psu.edu", password="password")
+        h1 = self.persist(model.History(name="WorkflowNotificationHistory", user=user))
+        subworkflow_step = model.WorkflowStep()
+        subworkflow_step.order_index = 0
+        subworkflow_step.type = "subworkflow"
+        subworkflow_step.subworkflow = model.Workflow()
+        workflow = model.Workflow()
+        workflow.steps = [subworkflow_step]
+        workflow.stored_workflow = model.StoredWorkflow()
+        workflow.stored_workflow.user = user
+        step_job, output_job, other_job = model.Job(), model.Job(), model.Job()
+        for job in (step_job, output_job, other_job):
+            job.user = user
+            job.history = h1
+            job.tool_id = "cat1"
+        output = self.new_hda(h1, name="output")
+        output_job.add_output_dataset("out_file1", output)
+
+        parent_invocation = model.WorkflowInvocation()
+        parent_invocation.history = h1
+        parent_invocation.workflow = workflow
+        subworkflow_invocation = model.WorkflowInvocation()
+        parent_invocation.attach_subworkflow_invocation_for_step(subworkflow_step, subworkflow_invocation)
+        invocation_step = model.WorkflowInvocationStep()
+        invocation_step.workflow_invocation = subworkflow_invocation
+        invocation_step.workflow_step = subworkflow_step
+        invocation_step.job = step_job
+        invocation_step.state = "new"
+        input_invocation = model.WorkflowInvocation()
+        input_invocation.history = h1
+        input_invocation.workflow = workflow
+        input_request = model.WorkflowRequestToInputDatasetAssociation()
+        input_request.workflow_invocation = input_invocation
+        input_request.workflow_step = subworkflow_step
+        input_request.dataset = output
+        self.persist(step_job, output_job, other_job, parent_invocation, input_invocation, input_request)
+
+        session = self.session()
+        # Parents of the invocations that created a job are woken too
+        assert model.WorkflowInvocation.poll_workflow_ids_for_job(session, step_job.id) == sorted([parent_invocation.id, subworkflow_invocation.id])
+        # As are invocations with an input produced by the job
+        assert model.WorkflowInvocation.poll_workflow_ids_for_job(session, output_job.id) == [input_invocation.id]
+        assert model.WorkflowInvocation.poll_workflow_ids_for_job(session, other_job.id) == []
+        assert model.WorkflowInvocation.scheduling_progress(session, subworkflow_invocation.id) == [(invocation_step.id, "new", 0)]
+        assert model.WorkflowInvocation.scheduling_progress(session, input_invocation.id) == []
+
     def new_hda(self, history, **kwds):
         return history.add_dataset(self.model.HistoryDatasetAssociation(create_dataset=True, sa_session=self.model.session, **kwds))
 
@@ -1,6 +1,8 @@
 """Unit tests for importing and exporting data from model stores."""
+import hashlib
 import json
 import os
+import tarfile
 from tempfile import mkdtemp, NamedTemporaryFile
 
 from galaxy import model
@@ -32,6 +34,27 @@ def test_import_export_history_failed_job():
     _assert_simple_cat_job_imported(imported_history, state='error')
 
 
+def test_export_tar_manifest():
+    """Test files streamed into a tar export are listed with their checksums."""
+    app = _mock_app()
+
+    u, h, d1, d2, j = _setup_simple_cat_job(app)
+
+    dest_export = os.path.join(mkdtemp(), "moo.tar")
+    with store.TarModelExportStore(dest_export, app=app, gzip=False, export_files="copy") as export_store:
+        export_store.export_history(h)
+
+    with tarfile.open(dest_export) as archive:
+        names = archive.getnames()
+        manifest = archive.extractfile(store.MANIFEST_FILENAME).read().decode("utf-8").splitlines()
+        assert len(manifest) == 2
+        for line in manifest:
+            checksum, arcname = line.split("  ", 1)
+            assert arcname.startswith("datasets/")
+            assert hashlib.sha256(archive.extractfile(arcname).read()).hexdigest() == checksum
+    assert store.ATTRS_FILENAME_HISTORY in names
+
+
 def test_import_export_bag_archive():
     """Test a simple job import/export using a BagIt archive."""
     dest_parent = mkdtemp()
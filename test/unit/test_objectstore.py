@@ -1,4 +1,6 @@
 import os
+import threading
+import time
 from contextlib import contextmanager
 from shutil import rmtree
 from string import Template
@@ -10,7 +12,12 @@ from six import StringIO
 
 from galaxy import objectstore
 from galaxy.exceptions import ObjectInvalid
+from galaxy.objectstore import s3, s3_multipart_upload
 from galaxy.objectstore.azure_blob import AzureBlobObjectStore
+from galaxy.objectstore.caching import (
+    CacheMonitor,
+    CachePulls,
+)
 from galaxy.objectstore.cloud import Cloud
 from galaxy.objectstore.pithos import PithosObjectStore
 from galaxy.objectstore.s3 import S3ObjectStore
@@ -289,6 +296,47 @@ def test_hierarchical_store():
             _assert_key_has_value(as_dict, "type", "hierarchical")
 
 
+def test_hierarchical_store_location_cache():
+    with TestConfig(HIERARCHICAL_TEST_CONFIG) as (directory, object_store):
+        probes = []
+        for backend in object_store.backends.values():
+            def exists(obj, _exists=backend.exists, **kwargs):
+                probes.append(obj.id)
+                return _exists(obj, **kwargs)
+            backend.exists = exists
+
+        directory.write("Hello World!", "files2/000/dataset_2.dat")
+        assert object_store.exists(MockDataset(2))
+        assert object_store.get_data(MockDataset(2)) == "Hello World!"
+        assert probes == [2, 2]
+        # Datasets found in no backend are cached too
+        assert not object_store.exists(MockDataset(1))
+        assert not object_store.exists(MockDataset(1))
+        assert probes == [2, 2, 1, 1]
+        # Datasets moved out of the cached backend are looked for again when
+        # an operation does not find them
+        directory.write("Hello World!", "files1/000/dataset_2.dat")
+        os.remove(os.path.join(directory.temp_directory, "files2/000/dataset_2.dat"))
+        del probes[:]
+        assert object_store.get_data(MockDataset(2)) == "Hello World!"
+        assert probes == [2]
+        # Updates don't trust the absence of datasets
+        directory.write("", "files2/000/dataset_1.dat")
+        object_store.update_from_file(MockDataset(1), file_name=os.path.join(directory.temp_directory, "files1/000/dataset_2.dat"))
+        assert object_store.get_data(MockDataset(1)) == "Hello World!"
+
+        # Creating and deleting a dataset update its location
+        object_store.location_cache.negative_ttl = 0
+        assert not object_store.exists(MockDataset(3))
+        object_store.create(MockDataset(3))
+        del probes[:]
+        assert object_store.exists(MockDataset(3))
+        assert not probes
+        object_store.delete(MockDataset(3))
+        assert not object_store.exists(MockDataset(3))
+        assert probes == [3, 3]
+
+
 def test_mixed_store_by():
     with TestConfig(MIXED_STORE_BY_HIERARCHICAL_TEST_CONFIG) as (directory, object_store):
         as_dict = object_store.to_dict()
@@ -497,6 +545,7 @@ def test_config_parse_s3():
             assert object_store.host is None
             assert object_store.port == 6000
             assert object_store.multipart is True
+            assert object_store.transfer_threads == 4
             assert object_store.is_secure is True
             assert object_store.conn_path == "/"
 
@@ -524,6 +573,7 @@ def test_config_parse_s3():
             _assert_key_has_value(connection_dict, "host", None)
             _assert_key_has_value(connection_dict, "port", 6000)
             _assert_key_has_value(connection_dict, "multipart", True)
+            _assert_key_has_value(connection_dict, "transfer_threads", 4)
             _assert_key_has_value(connection_dict, "is_secure", True)
 
             _assert_key_has_value(cache_dict, "size", 1000)
@@ -533,6 +583,185 @@ def test_config_parse_s3():
             assert len(extra_dirs) == 2
 
 
+class MockS3Key(object):
+    contents = b"0123456789"
+
+    def __init__(self, bucket, name):
+        self.name = name
+
+    def get_contents_as_string(self, headers=None):
+        start, end = headers["Range"][len("bytes="):].split("-")
+        return self.contents[int(start):int(end) + 1]
+
+
+def test_s3_ranged_get_data(monkeypatch):
+    monkeypatch.setattr(s3, "Key", MockS3Key)
+    with TestConfig(S3_TEST_CONFIG, clazz=UnitializeS3ObjectStore) as (directory, object_store):
+        object_store.staging_path = os.path.join(directory.temp_directory, "staging")
+        object_store._bucket = None
+
+        def pull_into_cache(rel_path):
+            raise AssertionError("Ranged reads shouldn't pull %s into the cache" % rel_path)
+
+        object_store._pull_into_cache = pull_into_cache
+        dataset = MockDataset(1)
+        assert object_store.get_data(dataset, start=2, count=3) == "234"
+        assert object_store.get_data(dataset, start=8, count=5) == "89"
+        assert not os.path.exists(object_store.staging_path)
+        # Cached reads return the same as the ranged ones
+        cache_path = object_store._get_cache_path(object_store._construct_path(dataset))
+        os.makedirs(os.path.dirname(cache_path))
+        with open(cache_path, "wb") as f:
+            f.write(MockS3Key.contents)
+        assert object_store.get_data(dataset, start=2, count=3) == "234"
+        assert object_store.get_data(dataset) == "0123456789"
+
+
+MULTIPART_S3SERVER = {'max_chunk_size': 250, 'use_rr': False, 'transfer_threads': 2}
+
+
+class MockMultiPartUpload(object):
+
+    def __init__(self, key_name, parts=None):
+        self.id = "upload_id"
+        self.key_name = key_name
+        self.bucket_name = "bucket"
+        self.parts = parts or {}
+        self.completed = False
+
+    def __iter__(self):
+        return iter(MockPart(part_number, etag) for part_number, etag in sorted(self.parts.items()))
+
+    def upload_part_from_file(self, fh, part_num, size):
+        self.parts[part_num] = s3_multipart_upload.hashlib.md5(fh.read(size)).hexdigest()
+
+    def complete_upload(self):
+        self.completed = True
+
+
+class MockPart(object):
+
+    def __init__(self, part_number, etag):
+        self.part_number = part_number
+        self.etag = '"%s"' % etag
+
+
+class MockMultipartBucket(object):
+    name = "bucket"
+
+    def __init__(self, uploads=None):
+        self.uploads = uploads or []
+
+    def get_all_multipart_uploads(self, prefix):
+        return self.uploads
+
+    def initiate_multipart_upload(self, key_name, reduced_redundancy):
+        upload = MockMultiPartUpload(key_name)
+        self.uploads.append(upload)
+        return upload
+
+
+def test_s3_multipart_upload_resumes(tmpdir, monkeypatch):
+    # Parts of 5 bytes
+    monkeypatch.setattr(s3_multipart_upload, "MB", 1)
+    source_file = tmpdir.join("source")
+    source_file.write(b"0123456789ab", mode="wb")
+    # An interrupted upload with a first part matching the file and a corrupted second part
+    upload = MockMultiPartUpload("key", {1: "bogus", 2: "bogus"})
+    upload.parts[1] = s3_multipart_upload.part_md5(str(source_file), 0, 5)
+    uploaded = []
+
+    def mp_from_ids(s3server, mp_id, mp_keyname, mp_bucketname):
+        assert mp_id == upload.id
+        uploaded.append(mp_keyname)
+        return upload
+
+    monkeypatch.setattr(s3_multipart_upload, "mp_from_ids", mp_from_ids)
+    s3_multipart_upload.multipart_upload(MULTIPART_S3SERVER, MockMultipartBucket([upload]), "key", str(source_file), 12)
+    assert upload.completed
+    assert len(uploaded) == 2
+    assert upload.parts[2] == s3_multipart_upload.part_md5(str(source_file), 5, 5)
+    assert upload.parts[3] == s3_multipart_upload.part_md5(str(source_file), 10, 2)
+
+
+class MockUnlistableMultipartBucket(MockMultipartBucket):
+
+    def get_all_multipart_uploads(self, prefix):
+        raise s3_multipart_upload.S3ResponseError(403, "Forbidden")
+
+
+def test_s3_multipart_upload_without_list_permission(tmpdir, monkeypatch):
+    monkeypatch.setattr(s3_multipart_upload, "MB", 1)
+    source_file = tmpdir.join("source")
+    source_file.write(b"0123456789ab", mode="wb")
+    bucket = MockUnlistableMultipartBucket()
+    monkeypatch.setattr(s3_multipart_upload, "mp_from_ids", lambda *args: bucket.uploads[0])
+    s3_multipart_upload.multipart_upload(MULTIPART_S3SERVER, bucket, "key", str(source_file), 12)
+    upload = bucket.uploads[0]
+    assert upload.completed
+    assert sorted(upload.parts) == [1, 2, 3]
+
+
+def test_s3_multipart_stops_at_failed_part(monkeypatch):
+    monkeypatch.setattr(s3_multipart_upload.log, "warning", lambda *args, **kwds: None)
+    transferred = []
+
+    def transfer(part_num):
+        transferred.append(part_num)
+        if part_num == 1:
+            raise IOError("Part %s failed" % part_num)
+        time.sleep(0.05)
+
+    try:
+        s3_multipart_upload._run_parallel(MULTIPART_S3SERVER, transfer, [(i,) for i in range(1, 21)])
+    except IOError:
+        pass
+    else:
+        raise AssertionError("Failed part not reported")
+    # Pending parts are cancelled instead of all being transferred
+    assert len(transferred) < 20
+
+
+class MockRangedS3Key(object):
+    contents = b"0123456789ab"
+
+    def __init__(self, bucket=None, name="key"):
+        self.bucket = bucket or MockMultipartBucket()
+        self.name = name
+        self.size = len(self.contents)
+        self.etag = '"%s"' % s3_multipart_upload.hashlib.md5(self.contents).hexdigest()
+
+    def get_file(self, fh, headers):
+        start, end = headers["Range"][len("bytes="):].split("-")
+        fh.write(self.contents[int(start):int(end) + 1])
+
+
+class MockS3Connection(object):
+
+    def get_bucket(self, bucket_name, validate):
+        return MockMultipartBucket()
+
+
+def test_s3_multipart_download(tmpdir, monkeypatch):
+    monkeypatch.setattr(s3_multipart_upload, "MB", 1)
+    monkeypatch.setattr(s3_multipart_upload, "Key", MockRangedS3Key)
+    monkeypatch.setattr(s3_multipart_upload, "connect", lambda s3server: MockS3Connection())
+    dest = tmpdir.join("dest")
+    s3_multipart_upload.multipart_download(MULTIPART_S3SERVER, MockRangedS3Key(), str(dest))
+    assert dest.read(mode="rb") == MockRangedS3Key.contents
+
+    # Corrupted downloads are detected and leave nothing behind
+    key = MockRangedS3Key()
+    key.etag = '"bogus"'
+    try:
+        s3_multipart_upload.multipart_download(MULTIPART_S3SERVER, key, str(tmpdir.join("corrupted")))
+    except IOError:
+        pass
+    else:
+        raise AssertionError("Checksum mismatch not detected")
+    assert tmpdir.listdir() == [dest]
+
+
 CLOUD_AWS_TEST_CONFIG = """<object_store type="cloud" provider="aws">
      <auth access_key="access_moo" secret_key="secret_cow" />
      <bucket name="unique_bucket_name_all_lowercase" use_reduced_redundancy="False" />
@@ -764,6 +993,144 @@ def test_config_parse_azure():
             assert len(extra_dirs) == 2
 
 
+def test_cache_monitor():
+    cache_path = mkdtemp()
+    try:
+        monitor = CacheMonitor(cache_path, 800)
+        paths = []
+        for i in range(4):
+            path = os.path.join(cache_path, "000", "dataset_%d.dat" % i)
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, "w") as f:
+                f.write("x" * 300)
+            # Files on disk appear accessed before the index records it
+            os.utime(path, (0, 0))
+            monitor.index.add(path)
+            paths.append(path)
+            time.sleep(0.01)
+        assert monitor.index.total_size == 1200
+        # Accessing the first dataset makes the next ones the least recently used
+        monitor.index.touch(paths[0])
+        monitor.check()
+        assert [os.path.exists(path) for path in paths] == [True, False, False, True]
+        assert monitor.index.total_size == 600
+
+        # The index is shared by the processes using the cache
+        other_monitor = CacheMonitor(cache_path, 800)
+        assert other_monitor.index.total_size == 600
+        other_monitor.index.remove(paths[0])
+        assert monitor.index.total_size == 300
+
+        monitor.index.remove(os.path.join(cache_path, "000"), recursive=True)
+        assert monitor.index.total_size == 0
+        monitor.index.reconcile()
+        assert monitor.index.total_size == 600
+        # The default index may be on a network file system, where the write-ahead log doesn't work
+        assert monitor.index._conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    finally:
+        rmtree(cache_path)
+
+
+def test_cache_monitor_local_index():
+    cache_path = mkdtemp()
+    index_dir = mkdtemp()
+    try:
+        index_path = os.path.join(index_dir, "host1", "index.sqlite")
+        monitor = CacheMonitor(cache_path, 800, index_path=index_path)
+        path = os.path.join(cache_path, "dataset_1.dat")
+        with open(path, "w") as f:
+            f.write("x" * 300)
+        monitor.index.add(path)
+        assert os.path.exists(index_path)
+        assert os.listdir(cache_path) == ["dataset_1.dat"]
+        assert monitor.index._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert CacheMonitor(cache_path, 800, index_path=index_path).index.total_size == 300
+    finally:
+        rmtree(cache_path)
+        rmtree(index_dir)
+
+
+def test_cache_monitor_without_index():
+    cache_path = mkdtemp()
+    try:
+        paths = []
+        for i in range(4):
+            path = os.path.join(cache_path, "dataset_%d.dat" % i)
+            with open(path, "w") as f:
+                f.write("x" * 300)
+            os.utime(path, (i, i))
+            paths.append(path)
+        # An index that can't be opened falls back to walking the cache
+        with open(os.path.join(cache_path, "not_an_index"), "w") as f:
+            f.write("x" * 200)
+        monitor = CacheMonitor(cache_path, 1300, index_path=os.path.join(cache_path, "not_an_index"))
+        assert monitor.index is None
+        monitor.check()
+        assert [os.path.exists(path) for path in paths] == [False, True, True, True]
+    finally:
+        rmtree(cache_path)
+
+
+def test_cache_pulls():
+    cache_path = mkdtemp()
+    try:
+        pulls = CachePulls()
+        path = os.path.join(cache_path, "dataset_1.dat")
+        results = []
+
+        def download(content):
+            assert pulls.in_progress(path)
+            time.sleep(0.1)
+            with open(path, "w") as f:
+                f.write(content)
+            return True
+
+        # Pulls by other processes sharing the cache wait too
+        other_pulls = CachePulls()
+        threads = [threading.Thread(target=lambda p=p: results.append(p.pull(path, download, "x"))) for p in [pulls] * 4 + [other_pulls] * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == [True] * 6
+        assert pulls.downloads + other_pulls.downloads == 1
+        assert pulls.deduplicated + other_pulls.deduplicated == 5
+        assert not pulls.in_progress(path)
+        assert os.listdir(cache_path) == ["dataset_1.dat"]
+
+        # Failed downloads don't leave partial files behind
+        failed_path = os.path.join(cache_path, "dataset_2.dat")
+
+        def failed_download():
+            with open(failed_path, "w") as f:
+                f.write("partial")
+            return False
+
+        assert not pulls.pull(failed_path, failed_download)
+        assert os.listdir(cache_path) == ["dataset_1.dat"]
+
+        # Files whose pull was interrupted by a dead process are pulled again
+        with open(failed_path, "w") as f:
+            f.write("partial")
+        with open(failed_path + ".lock", "w") as f:
+            f.write("12345")
+        assert pulls.in_progress(failed_path)
+
+        def download_again():
+            # The partial file was removed
+            assert not os.path.exists(failed_path)
+            with open(failed_path, "w") as f:
+                f.write("complete")
+            return True
+
+        assert pulls.pull(failed_path, download_again)
+        assert not pulls.in_progress(failed_path)
+        assert sorted(os.listdir(cache_path)) == ["dataset_1.dat", "dataset_2.dat"]
+    finally:
+        rmtree(cache_path)
+
+
 class TestConfig(object):
     def __init__(self, config_str=DISK_TEST_CONFIG, clazz=None, store_by="id"):
         self.temp_directory = mkdtemp()
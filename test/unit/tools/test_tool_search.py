@@ -0,0 +1,93 @@
+import threading
+
+from galaxy.tools.search import ToolBoxSearch
+
+SEARCH_ARGS = dict(
+    tool_name_boost=9,
+    tool_section_boost=3,
+    tool_description_boost=2,
+    tool_label_boost=1,
+    tool_stub_boost=5,
+    tool_help_boost=0.5,
+    tool_search_limit=20,
+    tool_ngram_minsize=3,
+    tool_ngram_maxsize=4,
+)
+
+
+class MockTool(object):
+    tool_type = 'default'
+    guid = None
+    labels = []
+    is_latest_version = True
+
+    def __init__(self, tool_id, name, description, raw_help=None):
+        self.id = tool_id
+        self.name = name
+        self.description = description
+        self.raw_help = raw_help
+
+    def get_panel_section(self):
+        return ('mapping', 'Mapping')
+
+
+class MockToolCache(object):
+
+    def __init__(self, tools):
+        self.tools = {tool.id: tool for tool in tools}
+        self._tool_paths_by_id = {tool.id: '%s.xml' % tool.id for tool in tools}
+        self._new_tool_ids = set(self.tools)
+        self._removed_tool_ids = set()
+
+    def get_tool_by_id(self, tool_id):
+        return self.tools.get(tool_id)
+
+
+def _search(toolbox_search, q, ngram=False):
+    return toolbox_search.search(q, tool_enable_ngram_search=ngram, **SEARCH_ARGS)
+
+
+def test_search(tmpdir):
+    toolbox_search = ToolBoxSearch(toolbox=None, index_dir=str(tmpdir))
+    toolbox_search.build_index(MockToolCache([
+        MockTool('bowtie2', 'Bowtie2', 'map reads against reference genome'),
+        MockTool('bwa', 'BWA', 'map short reads', raw_help='bowtie alternative'),
+        MockTool('cat1', 'Concatenate', 'datasets tail-to-head'),
+    ]))
+    assert _search(toolbox_search, 'bowtie')[0] == 'bowtie2'
+    assert _search(toolbox_search, 'bowtei', ngram=True)[0] == 'bowtie2'
+    assert _search(toolbox_search, 'concatenate') == ['cat1']
+    # Results are cached per query and boosts, and searchers are reused
+    assert len(toolbox_search._results) == 3
+    assert len(toolbox_search._searchers) == 1
+    assert _search(toolbox_search, 'concatenate') == ['cat1']
+    assert len(toolbox_search._results) == 3
+
+    # Rebuilding the index drops cached results
+    tool_cache = MockToolCache([MockTool('cat2', 'Concatenate multiple', 'datasets')])
+    tool_cache._removed_tool_ids = {'cat1'}
+    toolbox_search.build_index(tool_cache)
+    assert not toolbox_search._results
+    assert _search(toolbox_search, 'concatenate') == ['cat2']
+
+
+def test_concurrent_search(tmpdir):
+    toolbox_search = ToolBoxSearch(toolbox=None, index_dir=str(tmpdir))
+    toolbox_search.build_index(MockToolCache([
+        MockTool('bowtie2', 'Bowtie2', 'map reads against reference genome'),
+        MockTool('cat1', 'Concatenate', 'datasets tail-to-head'),
+    ]))
+    results = []
+
+    def search(q):
+        results.append((q, _search(toolbox_search, q)))
+
+    threads = [threading.Thread(target=search, args=(q,)) for q in ['bowtie', 'concatenate'] * 4]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [('bowtie', ['bowtie2'])] * 4 + [('concatenate', ['cat1'])] * 4
+    # Searchers used at the same time are all kept for reuse
+    searchers, = toolbox_search._searchers.values()
+    assert 1 <= len(searchers) <= 8
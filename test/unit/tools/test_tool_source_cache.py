@@ -0,0 +1,83 @@
+import json
+import os
+
+from galaxy.tool_util.parser import get_tool_source
+from galaxy.tools import cache
+from galaxy.tools.cache import create_cache_region
+from ..unittest_utils.sample_data import SIMPLE_MACRO, SIMPLE_TOOL_WITH_MACRO
+
+
+def _write(path, contents):
+    with open(path, 'w') as f:
+        f.write(contents)
+
+
+def _setup(tmpdir):
+    tool_path = str(tmpdir.join('tool_with_macro.xml'))
+    macro_path = str(tmpdir.join('external.xml'))
+    _write(tool_path, SIMPLE_TOOL_WITH_MACRO)
+    _write(macro_path, SIMPLE_MACRO.substitute(tool_version="2.0"))
+    return tool_path, macro_path
+
+
+def _get(region, tool_path, parsed):
+    def creator(config_file):
+        parsed.append(config_file)
+        return get_tool_source(config_file)
+    return region.get_or_create(tool_path, creator=creator, expiration_time=-1, creator_args=((tool_path,), {}))
+
+
+def test_cached_tool_source(tmpdir):
+    tool_path, macro_path = _setup(tmpdir)
+    cache_dir = str(tmpdir.join('cache'))
+    parsed = []
+    assert _get(create_cache_region(cache_dir), tool_path, parsed).parse_version() == "2.0"
+    region = create_cache_region(cache_dir)
+    region.backend.begin_sweep()
+    tool_source = _get(region, tool_path, parsed)
+    region.backend.end_sweep()
+    assert parsed == [tool_path]
+    assert tool_source.parse_version() == "2.0"
+    assert tool_source.macro_paths == [macro_path]
+    assert tool_source.source_path == tool_path
+
+
+def test_cached_tool_source_validation(tmpdir):
+    tool_path, macro_path = _setup(tmpdir)
+    cache_dir = str(tmpdir.join('cache'))
+    parsed = []
+    _get(create_cache_region(cache_dir), tool_path, parsed)
+    # A touched file with the same content doesn't invalidate the cache
+    os.utime(macro_path, (0, 0))
+    _get(create_cache_region(cache_dir), tool_path, parsed)
+    assert len(parsed) == 1
+    # A changed file with the same size does
+    _write(macro_path, SIMPLE_MACRO.substitute(tool_version="3.0"))
+    os.utime(macro_path, (1, 1))
+    assert _get(create_cache_region(cache_dir), tool_path, parsed).parse_version() == "3.0"
+    assert len(parsed) == 2
+
+
+def test_cached_tool_source_records(tmpdir, monkeypatch):
+    tool_path, macro_path = _setup(tmpdir)
+    cache_dir = str(tmpdir.join('cache'))
+    parsed = []
+    region = create_cache_region(cache_dir)
+    _get(region, tool_path, parsed)
+    # Records are plain JSON
+    with region.backend.proxied._dbm_file(False) as dbm:
+        record = json.loads(dbm[tool_path].decode('utf-8'))
+    assert record['files'][macro_path][0] == os.path.getmtime(macro_path)
+    # Touched files are hashed once, their new modification time is recorded
+    os.utime(macro_path, (0, 0))
+    hashed = []
+
+    def md5_hash_file(path, _md5_hash_file=cache.md5_hash_file):
+        hashed.append(path)
+        return _md5_hash_file(path)
+
+    monkeypatch.setattr(cache, "md5_hash_file", md5_hash_file)
+    _get(create_cache_region(cache_dir), tool_path, parsed)
+    _get(create_cache_region(cache_dir), tool_path, parsed)
+    assert hashed == [macro_path]
+    assert parsed == [tool_path]
@@ -1,15 +1,21 @@
 import collections
 import json
 import logging
+import multiprocessing
 import os
 import string
+import threading
 import time
 import unittest
+from unittest import skipIf
 
 import routes
 from six import string_types
 
-from galaxy import model
+from galaxy import (
+    model,
+    tools,
+)
 from galaxy.config_watchers import ConfigWatchers
 from galaxy.model import tool_shed_install
 from galaxy.model.tool_shed_install import mapping
@@ -254,6 +260,111 @@ class ToolBoxTestCase(BaseToolBoxTestCase):
 
         raise e
 
+    def test_parallel_tool_parsing(self):
+        for i in range(4):
+            self._init_tool(filename="tool_%d.xml" % i, tool_id="tool_%d" % i)
+        with open(self._tool_path("broken.xml"), "w") as f:
+            f.write("not a tool")
+        self._add_config("""<toolbox><tool file="tool_3.xml"/><section id="tid" name="TID"><tool file="tool_1.xml"/><tool file="broken.xml"/><tool file="tool_0.xml"/></section><tool file="tool_2.xml"/></toolbox>""")
+        self.app.config.tool_parsing_processes = 2
+        toolbox = self.toolbox
+        assert list(toolbox._tool_panel.keys()) == ["tool_tool_3", "tid", "tool_tool_2"]
+        assert list(toolbox._tool_panel["tid"].elems.keys()) == ["tool_tool_1", "tool_tool_0"]
+        assert toolbox._preloaded_tool_sources == {}
+
+    @skipIf(not hasattr(multiprocessing, 'get_context'), "requires multiprocessing contexts")
+    def test_parallel_tool_parsing_executable(self):
+        from multiprocessing import spawn
+        for i in range(2):
+            self._init_tool(filename="tool_%d.xml" % i, tool_id="tool_%d" % i)
+        self._add_config("""<toolbox><tool file="tool_1.xml"/><tool file="tool_0.xml"/></toolbox>""")
+        self.app.config.tool_parsing_processes = 2
+        executable = spawn.get_executable()
+        spawn.set_executable("/other/python")
+        try:
+            assert list(self.toolbox._tool_panel.keys()) == ["tool_tool_1", "tool_tool_0"]
+            # The executable of processes started by others is left alone
+            assert spawn.get_executable() == "/other/python"
+        finally:
+            spawn.set_executable(executable)
+
+    def test_parallel_tool_parsing_failure(self):
+        for i in range(2):
+            self._init_tool(filename="tool_%d.xml" % i, tool_id="tool_%d" % i)
+        self._add_config("""<toolbox><tool file="tool_1.xml"/><tool file="tool_0.xml"/></toolbox>""")
+        self.app.config.tool_parsing_processes = 2
+
+        def get_executable():
+            raise Exception("no python")
+
+        original_get_executable = tools.get_executable
+        tools.get_executable = get_executable
+        try:
+            # Tools are parsed one by one instead
+            assert list(self.toolbox._tool_panel.keys()) == ["tool_tool_1", "tool_tool_0"]
+        finally:
+            tools.get_executable = original_get_executable
+
+    def test_finalized_tool_cache(self):
+        for i in range(2):
+            self._init_tool(filename="tool_%d.xml" % i, tool_id="tool_%d" % i)
+        self._add_config("""<toolbox><tool file="tool_0.xml"/><tool file="tool_1.xml"/></toolbox>""")
+        self.app.config.delay_tool_initialization = True
+        self.app.config.finalized_tool_cache_size = 1
+        toolbox = self.toolbox
+        tool_0, tool_1 = toolbox.get_tool("tool_0"), toolbox.get_tool("tool_1")
+        assert not tool_0.finalized and not tool_1.finalized
+        assert "param1" in tool_0.inputs
+        assert tool_0.finalized
+        tool_1.outputs
+        # tool_0 was released to keep a single tool finalized
+        assert tool_1.finalized and not tool_0.finalized
+        assert "inputs" not in tool_0.__dict__ and "inputs_by_page" not in tool_0.__dict__
+        # Released pages are parsed again rather than seen empty
+        assert len(tool_0.inputs_by_page) == 1
+        assert list(tool_0.inputs.keys()) == ["param1"]
+        assert tool_0.finalized and not tool_1.finalized
+        assert toolbox.get_tool("tool_0") is tool_0
+        # Tools in use are not released
+        tool_0._use_count += 1
+        tool_1.inputs
+        assert tool_0.finalized and tool_1.finalized
+        assert not tool_0.release()
+        tool_0._use_count -= 1
+        toolbox.get_tool("tool_1")
+        assert tool_1.finalized and not tool_0.finalized
+
+    def test_release_tool_while_reading(self):
+        self._init_tool(filename="tool_0.xml", tool_id="tool_0")
+        self._add_config("""<toolbox><tool file="tool_0.xml"/></toolbox>""")
+        self.app.config.delay_tool_initialization = True
+        tool = self.toolbox.get_tool("tool_0")
+        tool.assert_finalized()
+        read, readers = [], []
+
+        def read_inputs():
+            try:
+                read.append(list(tool.inputs.keys()))
+            except Exception as e:
+                read.append(e)
+
+        parse_help = tool.parse_help
+
+        def parse_help_while_reading(tool_source):
+            # Read the dropped attributes from another thread in the middle of the release
+            reader = threading.Thread(target=read_inputs)
+            reader.start()
+            reader.join(0.2)
+            readers.append(reader)
+            parse_help(tool_source)
+
+        tool.parse_help = parse_help_while_reading
+        assert tool.release()
+        readers[0].join()
+        # The reader waited for the release and finalized the tool again
+        assert read[0] == ["param1"]
+        assert tool.finalized
+
     def test_enforce_tool_profile(self):
         self._init_tool(filename="old_tool.xml", version="1.0", profile="17.01", tool_id="test_old_tool_profile")
         self._init_tool(filename="new_tool.xml", version="2.0", profile="27.01", tool_id="test_new_tool_profile")
@@ -297,6 +408,48 @@ class ToolBoxTestCase(BaseToolBoxTestCase):
         as_dict = self.toolbox.to_dict(mock_trans(), in_panel=False)
         assert len(as_dict) == 0, as_dict
 
+    def test_to_json_cached(self):
+        self._init_tool_in_section()
+        mapper = routes.Mapper()
+        mapper.connect("tool_runner", "/test/tool_runner")
+        etag, panel_json = self.toolbox.to_json(mock_trans())
+        test_section = self._find_section(json.loads(panel_json), "t")
+        assert test_section["elems"][0]["id"] == "test_tool"
+        assert self.toolbox.to_json(mock_trans()) == (etag, panel_json)
+        assert len(self.toolbox._panel_json_cache) == 1
+        self.toolbox.to_json(mock_trans(has_user=False))
+        assert len(self.toolbox._panel_json_cache) == 2
+        # Panels restricted to trackster tools are cached separately
+        assert self.toolbox.to_json(mock_trans(), trackster=True)[0] != etag
+        assert len(self.toolbox._panel_json_cache) == 3
+
+        # Changing the panel invalidates the cached panels
+        self.toolbox.remove_tool_by_id("test_tool")
+        assert not self.toolbox._panel_json_cache
+        self.toolbox.to_json(mock_trans())
+        assert len(self.toolbox._panel_json_cache) == 1
+
+        # Panels filtered by filters that may depend on the request aren't cached
+        trans = mock_trans()
+        trans.user.preferences['toolbox_tool_filters'] = 'restrict_tool'
+        self.toolbox._filter_factory.build_filter_function = lambda name: lambda context, tool: True
+        self.toolbox.app.config.user_tool_filters = ['restrict_tool']
+        trans.app = self.toolbox.app
+        self.toolbox.to_json(trans)
+        assert len(self.toolbox._panel_json_cache) == 1
+
+        # Panels built while the panel changes aren't cached
+        self.toolbox._clear_panel_json_cache()
+        to_dict = self.toolbox.to_dict
+
+        def changing_to_dict(*args, **kwds):
+            self.toolbox._clear_panel_json_cache()
+            return to_dict(*args, **kwds)
+
+        self.toolbox.to_dict = changing_to_dict
+        self.toolbox.to_json(mock_trans())
+        assert not self.toolbox._panel_json_cache
+
     def _find_section(self, as_dict, section_id):
         for elem in as_dict:
             if elem.get("id") == section_id:
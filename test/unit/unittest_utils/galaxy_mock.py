@@ -172,6 +172,8 @@ class MockAppConfig(Bunch):
         self.root = root
         self.tool_cache_data_dir = os.path.join(root, 'tool_cache')
         self.delay_tool_initialization = True
+        self.finalized_tool_cache_size = 0
+        self.tool_parsing_processes = 1
 
         self.config_file = None
 
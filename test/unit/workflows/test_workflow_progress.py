@@ -1,3 +1,4 @@
+import time
 import unittest
 
 from galaxy import model
@@ -212,6 +213,23 @@ class WorkflowProgressTestCase(unittest.TestCase):
             step_dict,
         )
 
+    def test_scheduling_time_slice(self):
+        self._setup_workflow(TEST_SUBWORKFLOW_YAML)
+        self._set_previous_progress([
+            (100, {"output": model.HistoryDatasetAssociation()}),
+            (101, UNSCHEDULED_STEP),
+        ])
+        progress = self._new_workflow_progress()
+        assert not progress.scheduling_time_slice_used
+        progress.scheduling_deadline = time.time() - 1
+        assert progress.scheduling_time_slice_used
+        subworkflow_invocation = self.invocation.create_subworkflow_invocation_for_step(
+            self.invocation.workflow.step_by_index(1)
+        )
+        subworkflow_step = progress.remaining_steps()[0][0]
+        subworkflow_progress = progress.subworkflow_progress(subworkflow_invocation, subworkflow_step, {})
+        assert subworkflow_progress.scheduling_time_slice_used
+
 
 class MockModuleInjector(object):
 